@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import copy
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+# 執行位置假設在專案根目錄
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import dspy
+from src.config import config
+from src.office.office_manager import OfficeManager
+from src.utils.code_generator import CodeGenerator
+from src.utils.schema import FileSchema, FunctionSchema
+
+class StubLM:
+    """
+    離線用的假 LM：不連網、不計 token
+    OfficeManager 只用到 history / model / kwargs / copy，真正的回覆由 ScriptedAgent 依劇本給出
+    """
+
+    def __init__(self, temperature: float = 0.0):
+        self.model = "stub/offline"
+        self.kwargs = {"temperature": temperature}
+        self.history = []
+
+    def copy(self, **kwargs) -> "StubLM":
+        return StubLM(temperature=kwargs.get("temperature", self.kwargs["temperature"]))
+
+class ScriptedAgent:
+    """
+    取代 DSPy Agent：依序回傳劇本中的輸出 (用完就一直重複最後一個)
+    保留 signature，讓 OfficeManager 的快取 / 組 prompt 流程照常運作
+    """
+
+    def __init__(self, signature: type[dspy.Signature], outputs: list[dict]):
+        self.signature = signature
+        self.outputs = outputs
+        self.calls = 0
+
+    def __call__(self, **inputs) -> dspy.Prediction:
+        output = self.outputs[min(self.calls, len(self.outputs) - 1)]
+        self.calls += 1
+        # OfficeManager 會就地修改 schema (補 import)，每次都給一份新的
+        return dspy.Prediction(**copy.deepcopy(output))
+
+    async def acall(self, **inputs) -> dspy.Prediction:
+        return self(**inputs)
+
+# --- 劇本 (Scenario) ---
+SPEC = """
+# Technical Spec: calc.py
+- `add(a: int, b: int) -> int`: 回傳兩數之和
+"""
+
+ARCHITECT = {"technical_spec": SPEC, "p_filepath": "calc.py"}
+
+PRODUCT_SCHEMA = FileSchema(
+    filename="calc.py",
+    functions=[FunctionSchema(name="add", args=["a: int", "b: int"], return_type="int", docstring="回傳兩數之和")],
+)
+TEST_SCHEMA = FileSchema(
+    filename="test_calc.py",
+    imports=["from calc import add"],
+    functions=[FunctionSchema(name="test_add", args=[], docstring="測試 add")],
+)
+# 測試檔 import 了不存在的名稱 → 骨架驗證 ERROR
+BROKEN_TEST_SCHEMA = FileSchema(
+    filename="test_calc.py",
+    imports=["from calc import add, subtract"],
+    functions=[FunctionSchema(name="test_add", args=[], docstring="測試 add")],
+)
+
+QA_TESTS = """from calc import add
+
+def test_add():
+    assert add(2, 3) == 5
+
+def test_add_negative():
+    assert add(-1, 1) == 0
+"""
+
+GOOD_CODE = """def add(a: int, b: int) -> int:
+    return a + b
+"""
+
+BUGGY_CODE = """def add(a: int, b: int) -> int:
+    return a - b
+"""
+
+SCENARIOS = {
+    "green_first_try": {
+        "scaffolder": [{"product_structure": PRODUCT_SCHEMA, "test_structure": TEST_SCHEMA}],
+        "coder": [{"op_code": GOOD_CODE}],
+    },
+    "coder_repair": {
+        "scaffolder": [{"product_structure": PRODUCT_SCHEMA, "test_structure": TEST_SCHEMA}],
+        "coder": [{"op_code": BUGGY_CODE}, {"op_code": BUGGY_CODE.replace("a - b", "a * b")}, {"op_code": GOOD_CODE}],
+    },
+    "scaffold_retry": {
+        "scaffolder": [
+            {"product_structure": PRODUCT_SCHEMA, "test_structure": BROKEN_TEST_SCHEMA},
+            {"product_structure": PRODUCT_SCHEMA, "test_structure": TEST_SCHEMA},
+        ],
+        "coder": [{"op_code": GOOD_CODE}],
+    },
+    # 同上，但開著 LLM 快取 (同一個情境的每次執行共用快取目錄)：
+    # 被退回的骨架不能進快取，否則下一輪與之後的執行都會拿回同一份壞掉的骨架
+    "scaffold_retry_cached": {
+        "scaffolder": [
+            {"product_structure": PRODUCT_SCHEMA, "test_structure": BROKEN_TEST_SCHEMA},
+            {"product_structure": PRODUCT_SCHEMA, "test_structure": TEST_SCHEMA},
+        ],
+        "coder": [{"op_code": GOOD_CODE}],
+        "cache_agents": ["architect", "scaffolder"],
+    },
+}
+
+def _run_once(name: str, script: dict, work_dir: Path, mode: str) -> dict:
+    """跑一次劇本，回傳這次的 per-node 統計與結果"""
+    # 快取設定在 OfficeManager 建立時讀取
+    config.LLM_CACHE_AGENTS = script.get("cache_agents", [])
+    config.LLM_CACHE_DIR = str(work_dir / "llm_cache")
+    manager = OfficeManager(StubLM(), playground_dir=str(work_dir / name))
+    manager.architect = ScriptedAgent(manager.architect.signature, [ARCHITECT])
+    manager.scaffolder = ScriptedAgent(manager.scaffolder.signature, script["scaffolder"])
+    manager.qa = ScriptedAgent(manager.qa.signature, [{"ot_code": QA_TESTS}])
+    manager.coder = ScriptedAgent(manager.coder.signature, script["coder"])
+    graph = manager.compile_graph()
+
+    initial_state = {"requirement": "實作 add(a, b)", "qa_revision_count": 0, "coder_revision_count": 0}
+    started = time.perf_counter()
+    try:
+        if mode == "async":
+            final_state = asyncio.run(graph.ainvoke(initial_state))
+        else:
+            final_state = graph.invoke(initial_state)
+    finally:
+        manager.close()
+    wall = time.perf_counter() - started
+
+    return {
+        "wall_seconds": wall,
+        "ok": OfficeManager.succeeded(final_state),
+        "rounds": {
+            "scaffolder": final_state.get("scaffolder_revision_count", 0),
+            "qa": final_state.get("qa_revision_count", 0),
+            "coder": final_state.get("coder_revision_count", 0),
+        },
+        "nodes": {node: values for node, values in manager.metrics.summary().items() if node != "TOTAL"},
+    }
+
+def run_scenario(name: str, script: dict, iterations: int, mode: str, verbose: bool) -> dict:
+    walls, node_totals, runs = [], {}, []
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as tmp:
+        for i in range(iterations):
+            sink = sys.stdout if verbose else io.StringIO()
+            with redirect_stdout(sink):
+                result = _run_once(f"{name}_{i}", script, Path(tmp), mode)
+            runs.append(result)
+            walls.append(result["wall_seconds"])
+            for node, values in result["nodes"].items():
+                total = node_totals.setdefault(node, {"runs": 0, "wall_seconds": 0.0, "test_seconds": 0.0,
+                                                      "file_io_seconds": 0.0})
+                for key in total:
+                    total[key] += values[key]
+
+    walls.sort()
+    return {
+        "iterations": iterations,
+        "ok": all(r["ok"] for r in runs),
+        "rounds": runs[-1]["rounds"],
+        "wall_seconds": {
+            "mean": sum(walls) / len(walls),
+            "median": walls[len(walls) // 2],
+            "min": walls[0],
+            "max": walls[-1],
+        },
+        "throughput_runs_per_second": len(walls) / sum(walls),
+        # 每次執行的平均值 (node 可能在一次執行中跑好幾輪)
+        "nodes": {
+            node: {key: value / iterations for key, value in total.items()}
+            for node, total in node_totals.items()
+        },
+    }
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """跟之前存下的結果比較中位數耗時，回傳超過容許退化幅度的情境"""
+    regressions = []
+    print(f"\n📈 與 baseline ({baseline.get('commit')}) 比較 (median wall)")
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        old, new = before["wall_seconds"]["median"], current["wall_seconds"]["median"]
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"  {name:<20}{old:>9.3f}s → {new:>9.3f}s  ({change:+.1f}%)")
+        if change > max_regression:
+            regressions.append(f"{name} 變慢 {change:.1f}% (容許 {max_regression:.1f}%)")
+    return regressions
+
+def print_report(results: dict) -> None:
+    print(f"\n⏱️ 離線 benchmark (stub LM，{results['mode']} 模式)")
+    for name, scenario in results["scenarios"].items():
+        wall = scenario["wall_seconds"]
+        mark = "✅" if scenario["ok"] else "❌"
+        print(f"\n{mark} {name}: median {wall['median']:.3f}s, mean {wall['mean']:.3f}s, "
+              f"{scenario['throughput_runs_per_second']:.2f} runs/s, rounds {scenario['rounds']}")
+        print(f"  {'node':<12}{'runs':>6}{'wall_s':>10}{'test_s':>10}{'io_s':>10}")
+        for node, values in scenario["nodes"].items():
+            print(f"  {node:<12}{values['runs']:>6.1f}{values['wall_seconds']:>10.3f}"
+                  f"{values['test_seconds']:>10.3f}{values['file_io_seconds']:>10.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="不呼叫 LLM 的端到端 benchmark (量測 OfficeManager 本身的編排成本)")
+    parser.add_argument("-n", "--iterations", type=int, default=5, help="每個情境跑幾次")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="只跑指定情境 (可重複)")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync", help="graph.invoke 或 graph.ainvoke")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="結果輸出 JSON")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="與之前的結果比較")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="容許的 median 退化幅度 (%%)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="顯示 OfficeManager 的輸出")
+    args = parser.parse_args()
+
+    # 量測的是編排成本：除了指定開快取的情境之外都不用磁碟 LLM 快取，
+    # 開快取的情境也只寫進暫存目錄 (stub 回覆不該寫進共用快取)
+    # 骨架一律走 (劇本中的) Scaffolder，scaffold_retry 情境才重現得了
+    config.SCAFFOLD_FAST_PATH = False
+    # 劇本裡的 Coder 一律輸出整個檔案
+    config.CODER_PATCH_MODE = False
+
+    names = args.scenario or list(SCENARIOS)
+    results = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "mode": args.mode,
+        "scenarios": {
+            name: run_scenario(name, SCENARIOS[name], args.iterations, args.mode, args.verbose)
+            for name in names
+        },
+        "code_generator_cache": CodeGenerator.cache_stats(),
+    }
+
+    print_report(results)
+    Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 結果已存到 {args.output}")
+
+    failures = [f"{name} 沒有走到預期的結果" for name, s in results["scenarios"].items() if not s["ok"]]
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        failures += compare(results, baseline, args.max_regression)
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# 執行位置假設在專案根目錄 (main.py / batch.py 以 src 為 import 根目錄，office_manager 以專案根目錄為根)
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PYTHONPATH = os.pathsep.join([str(PROJECT_ROOT / "src"), str(PROJECT_ROOT)])
+
+# 啟動時不應該被載入的重量級套件 (只有真的建 LM / 建圖 / 排版時才載入)
+HEAVY_MODULES = ["dspy", "litellm", "langgraph", "langchain_core", "black"]
+
+# 要量測的啟動情境: (名稱, python 參數)
+SCENARIOS = [
+    ("import main", ["-c", "import main"]),
+    ("import batch", ["-c", "import batch"]),
+    ("main.py --help", [str(PROJECT_ROOT / "src" / "main.py"), "--help"]),
+    ("pytest worker module", ["-c", "import src.tools.pytest_pool"]),
+]
+
+def _env() -> dict:
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [PYTHONPATH, env.get("PYTHONPATH", "")] if p)
+    return env
+
+def time_scenario(args: list[str], repeat: int) -> float:
+    """執行 repeat 次，回傳耗時的中位數 (秒)；執行失敗時丟出 RuntimeError"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], env=_env(), cwd=PROJECT_ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        samples.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            last_line = (result.stderr.strip().splitlines() or ["(no output)"])[-1]
+            raise RuntimeError(last_line)
+    return statistics.median(samples)
+
+def heavy_modules_loaded(module: str) -> list[str] | None:
+    """import 指定模組後，哪些重量級套件已經在 sys.modules 裡 (import 失敗時為 None)"""
+    code = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], env=_env(), cwd=PROJECT_ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(module: str, top: int) -> list[tuple[int, str]]:
+    """用 -X importtime 找出最花時間的頂層 import (累計微秒)"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=_env(), cwd=PROJECT_ROOT, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 只看頂層 (沒有縮排的) 套件
+        if not name.startswith("  "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="量測 CLI 啟動時間，超過預算時以 exit code 1 結束")
+    parser.add_argument("--budget", type=float, default=1.0, help="每個情境的啟動時間上限 (秒)")
+    parser.add_argument("--repeat", type=int, default=5, help="每個情境執行幾次 (取中位數)")
+    parser.add_argument("--top", type=int, default=10, help="列出最慢的幾個 import")
+    args = parser.parse_args()
+
+    failures = []
+
+    print(f"⏱️ 啟動時間 (中位數，{args.repeat} 次，預算 {args.budget:.2f}s)")
+    for name, scenario_args in SCENARIOS:
+        try:
+            seconds = time_scenario(scenario_args, args.repeat)
+        except RuntimeError as e:
+            print(f"  💥 {name:<24}執行失敗: {e}")
+            failures.append(f"{name} 執行失敗: {e}")
+            continue
+        over = seconds > args.budget
+        print(f"  {'❌' if over else '✅'} {name:<24}{seconds:>8.3f}s")
+        if over:
+            failures.append(f"{name} 花了 {seconds:.3f}s (預算 {args.budget:.2f}s)")
+
+    for module in ("main", "batch"):
+        loaded = heavy_modules_loaded(module)
+        if loaded is None:
+            failures.append(f"import {module} 失敗 (相依套件是否已安裝？)")
+        elif loaded:
+            failures.append(f"import {module} 時就載入了 {', '.join(loaded)}")
+
+    print(f"\n🐢 import main 最慢的 {args.top} 個頂層 import (累計 ms)")
+    for cumulative, name in slowest_imports("main", args.top):
+        print(f"  {cumulative / 1000:>9.1f}  {name}")
+
+    if failures:
+        print("\n❌ 啟動時間退化：")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\n✅ 啟動時間在預算內")
+
+if __name__ == "__main__":
+    main()
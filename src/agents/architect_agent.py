@@ -1,4 +1,5 @@
 import dspy
+from src.utils.schema import ModuleSpec
 
 class ArchitectSignature(dspy.Signature):
     """
@@ -20,12 +21,54 @@ class ArchitectSignature(dspy.Signature):
     p_filepath = dspy.OutputField(desc="實作檔案名稱 (例如: 'order_service.py')")
 
 class ArchitectAgent(dspy.Module):
+    signature = ArchitectSignature
+
     def __init__(self):
         super().__init__()
         self.prog = dspy.ChainOfThought(ArchitectSignature)
     
-    def forward(self, requirement, augment_context):
-        return self.prog(
+    def _inputs(self, requirement, augment_context):
+        return dict(
+            requirement=requirement,
+            augment_context=augment_context or "無外部上下文，請根據需求自行設計架構。"
+        )
+
+    def forward(self, **kwargs):
+        return self.prog(**self._inputs(**kwargs))
+
+    async def aforward(self, **kwargs):
+        return await self.prog.acall(**self._inputs(**kwargs))
+
+class ProjectArchitectSignature(dspy.Signature):
+    """
+    [Role: Software Architect]
+    需求跨越多個模組時，把專案拆成數個 Python 模組，並標出模組之間的 import 相依關係。
+
+    原則：
+    1. 每個模組職責單一，可以單獨撰寫與測試
+    2. 相依關係不能有循環
+    3. 能獨立的模組就不要互相相依 (沒有相依的模組可以同時開發)
+    """
+    requirement = dspy.InputField(desc="用戶的功能需求")
+    augment_context = dspy.InputField(desc="來自外部工具 (Augment/Copilot) 的架構建議或 UML")
+
+    modules: list[ModuleSpec] = dspy.OutputField(desc="專案的模組清單與相依關係")
+
+class ProjectArchitectAgent(dspy.Module):
+    signature = ProjectArchitectSignature
+
+    def __init__(self):
+        super().__init__()
+        self.prog = dspy.ChainOfThought(ProjectArchitectSignature)
+
+    def _inputs(self, requirement, augment_context):
+        return dict(
             requirement=requirement,
             augment_context=augment_context or "無外部上下文，請根據需求自行設計架構。"
-        )
\ No newline at end of file
+        )
+
+    def forward(self, **kwargs):
+        return self.prog(**self._inputs(**kwargs))
+
+    async def aforward(self, **kwargs):
+        return await self.prog.acall(**self._inputs(**kwargs))
@@ -0,0 +1,41 @@
+import dspy
+
+class WriteBenchmarkSignature(dspy.Signature):
+    """
+    [Performance QA]
+    測試已經全綠，接著為產品程式碼撰寫 micro-benchmark，檢查執行時間隨輸入規模的成長。
+
+    格式 (必須遵守)：
+    - SIZES = [...]：由小到大至少 4 個輸入規模，每次加倍 (例如 [1000, 2000, 4000, 8000])
+    - EXPECTED_EXPONENT = {"bench_xxx": 1}：(可選) 規格書要求的複雜度次方，O(n) = 1、O(n^2) = 2
+    - def bench_xxx(n)：準備規模 n 的輸入 (不計時)，回傳一個要被計時的零參數函式 (例如 lambda)
+    只測主要的公開 API，最大規模的單次執行應在 1 秒內。
+    """
+    requirement = dspy.InputField(desc="功能需求")
+    technical_spec = dspy.InputField(desc="架構師制定的技術規格 (可能包含效能要求)")
+    ip_code = dspy.InputField(desc="目前產品程式碼")
+    error_feedback = dspy.InputField(desc="上次 benchmark 執行的錯誤訊息 (若無則為空)", default="")
+
+    # Outputs
+    ob_code = dspy.OutputField(desc="輸出的 benchmark 程式碼")
+
+class BenchmarkAgent(dspy.Module):
+    signature = WriteBenchmarkSignature
+
+    def __init__(self):
+        super().__init__()
+        self.prog = dspy.ChainOfThought(WriteBenchmarkSignature)
+
+    def _inputs(self, requirement, technical_spec, ip_code, error_feedback):
+        return dict(
+            requirement=requirement,
+            technical_spec=technical_spec if technical_spec else "無規格書，請自行發揮",
+            ip_code=ip_code,
+            error_feedback=error_feedback or "",
+        )
+
+    def forward(self, **kwargs):
+        return self.prog(**self._inputs(**kwargs))
+
+    async def aforward(self, **kwargs):
+        return await self.prog.acall(**self._inputs(**kwargs))
@@ -7,24 +7,64 @@ class WriteCodeSignature(dspy.Signature):
     technical_spec = dspy.InputField(desc="架構師制定的技術規格 (包含 Class/Method 定義)")
     feedback = dspy.InputField(desc="測試失敗的錯誤訊息 (如果是 None 代表是第一次寫)")
     ip_code = dspy.InputField(desc="目前的產品程式碼")
-    last_op_code = dspy.InputField(desc="上次生成的產品骨架代碼 (若有)", default="")
+    last_op_code = dspy.InputField(desc="上次生成的產品代碼 (若有；與目前代碼不同時以 unified diff 表示)", default="")
     it_code = dspy.InputField(desc="目前的測試程式碼")
 
     # Outputs
     op_code = dspy.OutputField(desc="輸出的產品程式碼")
 
 class CoderAgent(dspy.Module):
+    signature = WriteCodeSignature
+    # 串流模式下要邊生成邊檢查的輸出欄位
+    stream_field = "op_code"
+
     def __init__(self):
         super().__init__()
-        self.prog = dspy.ChainOfThought(WriteCodeSignature)
+        self.prog = dspy.ChainOfThought(self.signature)
     
-    def forward(self, requirement, technical_spec, feedback, ip_code,
+    def _inputs(self, requirement, technical_spec, feedback, ip_code,
                 last_op_code, it_code):
-        return self.prog(
+        return dict(
             requirement=requirement,
             technical_spec=technical_spec,
             feedback=feedback or "No feedback, this is the first draft.",
             ip_code=ip_code,
             last_op_code=last_op_code,
             it_code=it_code
-        )
\ No newline at end of file
+        )
+
+    def forward(self, **kwargs):
+        return self.prog(**self._inputs(**kwargs))
+
+    async def aforward(self, **kwargs):
+        # async 路徑 (串流 / ainvoke)：不佔用 thread，中止時 LLM 請求也會一起被取消
+        return await self.prog.acall(**self._inputs(**kwargs))
+
+class WritePatchSignature(dspy.Signature):
+    """
+    根據測試結果修正 Python 程式碼，只輸出要修改的地方 (不要重寫整個檔案)。
+
+    op_patch 使用 search / replace 區塊，可以有多個，依序套用：
+    <<<<<<< SEARCH
+    (從基準程式碼逐字複製要修改的連續幾行，包含足以唯一定位的前後文)
+    =======
+    (修改後的內容)
+    >>>>>>> REPLACE
+    """
+    # Inputs
+    requirement = dspy.InputField(desc="功能需求描述")
+    technical_spec = dspy.InputField(desc="架構師制定的技術規格 (包含 Class/Method 定義)")
+    feedback = dspy.InputField(desc="測試失敗的錯誤訊息")
+    ip_code = dspy.InputField(desc="目前的產品程式碼")
+    last_op_code = dspy.InputField(desc="上次生成 (被退回) 的完整產品代碼 (若有)", default="")
+    it_code = dspy.InputField(desc="目前的測試程式碼")
+
+    # Outputs
+    patch_base = dspy.OutputField(desc="patch 的基準：ip_code (目前的程式碼) 或 last_op_code (在上次生成的版本上繼續改)")
+    op_patch = dspy.OutputField(desc="search / replace 區塊")
+
+class PatchCoderAgent(CoderAgent):
+    """修正輪次用的 Coder：只輸出 patch，由 utils.patcher 在本地套用 (省下重寫整個檔案的輸出 token)"""
+    signature = WritePatchSignature
+    # patch 不是 Python 程式碼，不能交給 StreamGuard 檢查語法
+    stream_field = None
@@ -12,17 +12,21 @@ class WriteTestSignature(dspy.Signature):
     
     ip_code = dspy.InputField(desc="目前產品程式碼", default="")
     it_code = dspy.InputField(desc="目前測試程式碼", default="")
-    last_ot_code = dspy.InputField(desc="上次生成的測試骨架代碼 (若有)", default="")
+    last_ot_code = dspy.InputField(desc="上次生成的測試代碼 (若有；與目前代碼不同時以 unified diff 表示)", default="")
 
     # Outputs
     ot_code = dspy.OutputField(desc="輸出的測試程式碼")
 
 class QAAgent(dspy.Module):
+    signature = WriteTestSignature
+    # 串流模式下要邊生成邊檢查的輸出欄位
+    stream_field = "ot_code"
+
     def __init__(self):
         super().__init__()
         self.prog = dspy.ChainOfThought(WriteTestSignature)
     
-    def forward(self, requirement, technical_spec, error_feedback, ip_code,
+    def _inputs(self, requirement, technical_spec, error_feedback, ip_code,
                 it_code, last_ot_code):
         
         safe_spec = technical_spec if technical_spec else "無規格書，請自行發揮"
@@ -30,7 +34,7 @@ class QAAgent(dspy.Module):
         it_code = it_code if it_code else "尚無實作"
         last_ot_code = last_ot_code if last_ot_code else "無上次測試代碼"
 
-        result = self.prog(
+        return dict(
             requirement=requirement,
             technical_spec=safe_spec,
             error_feedback=error_feedback,
@@ -38,5 +42,10 @@ class QAAgent(dspy.Module):
             it_code=it_code,
             last_ot_code=last_ot_code,
         )
-        
-        return result
\ No newline at end of file
+
+    def forward(self, **kwargs):
+        return self.prog(**self._inputs(**kwargs))
+
+    async def aforward(self, **kwargs):
+        # async 路徑 (串流 / ainvoke)：不佔用 thread，中止時 LLM 請求也會一起被取消
+        return await self.prog.acall(**self._inputs(**kwargs))
@@ -22,6 +22,8 @@ class ScaffolderSignature(dspy.Signature):
     test_structure: FileSchema = dspy.OutputField(desc="測試程式碼的結構定義")
 
 class ScaffolderAgent(dspy.Module):
+    signature = ScaffolderSignature
+
     def __init__(self):
         super().__init__()
         # DSPy 支援 Typed output
@@ -31,4 +33,10 @@ class ScaffolderAgent(dspy.Module):
         return self.prog(
             requirement=requirement,
             technical_spec=technical_spec
+        )
+
+    async def aforward(self, requirement, technical_spec):
+        return await self.prog.acall(
+            requirement=requirement,
+            technical_spec=technical_spec
         )
\ No newline at end of file
@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import time
+import traceback
+import warnings
+from datetime import datetime
+from pathlib import Path
+from config import config
+
+# 過濾掉 Pydantic 的序列化警告 (眼不見為淨)
+warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
+
+def load_jobs(jobs_path: str) -> list[dict]:
+    """
+    讀取 JSONL 工作清單，每行一個 job：
+    {"requirement": "...", "augment_context": "..."}  (可選 "id")
+    """
+    jobs = []
+    with open(jobs_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            if not job.get("requirement"):
+                raise ValueError(f"❌ 第 {line_no} 行缺少 requirement")
+            job.setdefault("id", f"job{line_no:04d}")
+            jobs.append(job)
+    return jobs
+
+async def run_job(lm, job: dict, batch_dir: Path) -> dict:
+    """在獨立的 playground 目錄中跑完一個 job，回傳結果摘要 (graph 以 ainvoke 執行，與其他 job 共用 event loop)"""
+    started = time.perf_counter()
+    playground_dir = batch_dir / job["id"]
+    record = {
+        "id": job["id"],
+        "requirement": job["requirement"],
+        "playground_dir": str(playground_dir),
+    }
+
+    # dspy / langgraph 等到真的要跑 job 才載入
+    from office.office_manager import OfficeManager
+
+    try:
+        # 每個 job 使用自己的 LM 副本 (history 與設定互不干擾)
+        manager = OfficeManager(lm.copy(), playground_dir=str(playground_dir))
+        salary_partners = manager.compile_graph()
+
+        try:
+            final_state = await salary_partners.ainvoke({
+                "requirement": job["requirement"],
+                "augment_context": job.get("augment_context"),
+                "qa_revision_count": 0,
+                "coder_revision_count": 0
+            })
+        finally:
+            manager.close()
+
+        record.update({
+            "ok": OfficeManager.succeeded(final_state),
+            "phase": final_state.get("phase"),
+            "test_result_status": final_state.get("test_result_status"),
+            "p_filepath": final_state.get("p_filepath"),
+            "t_filepath": final_state.get("t_filepath"),
+            "scaffolder_revision_count": final_state.get("scaffolder_revision_count", 0),
+            "qa_revision_count": final_state.get("qa_revision_count", 0),
+            "coder_revision_count": final_state.get("coder_revision_count", 0),
+            "metrics": manager.metrics.summary()["TOTAL"],
+        })
+    except Exception as e:
+        record.update({
+            "ok": False,
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+        })
+
+    record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+async def run_batch(jobs_path: str, output_path: str, workers: int) -> None:
+    jobs = load_jobs(jobs_path)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    batch_dir = Path(f"playground/batch_{timestamp}")
+    batch_dir.mkdir(parents=True, exist_ok=True)
+
+    lm = config.initialize_dspy()
+
+    print(f"🚀 批次模式：{len(jobs)} 個 job，{workers} 個 worker，輸出到 {output_path}")
+    started = time.perf_counter()
+    passed = 0
+
+    # 所有 job 都在同一個 event loop 上，等 LLM / pytest 時互相讓出；semaphore 控制同時進行的數量
+    semaphore = asyncio.Semaphore(workers)
+
+    async def limited(job: dict) -> dict:
+        async with semaphore:
+            return await run_job(lm, job, batch_dir)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        # 誰先做完就先寫誰 (串流輸出，中途中斷也保得住已完成的結果)
+        for future in asyncio.as_completed([limited(job) for job in jobs]):
+            record = await future
+            passed += int(record["ok"])
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            mark = "✅" if record["ok"] else "❌"
+            print(f"{mark} [{record['id']}] 完成 ({record['elapsed_seconds']}s)")
+
+    elapsed = time.perf_counter() - started
+    print("\n" + "="*30)
+    print(f"🎉 批次完成：{passed}/{len(jobs)} 通過，總耗時 {elapsed:.1f}s")
+    print(f"LLM 額度統計：{config.llm_governor().stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="SalaryPartners 批次模式")
+    parser.add_argument("jobs", help="JSONL 工作清單 (每行 {requirement, augment_context})")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="結果輸出 JSONL")
+    parser.add_argument("-w", "--workers", type=int, default=config.BATCH_WORKERS, help="同時執行的 job 數")
+    args = parser.parse_args()
+
+    asyncio.run(run_batch(args.jobs, args.output, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
-import dspy
 import os
+from typing import TYPE_CHECKING
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
+if TYPE_CHECKING:
+    import dspy
+    from src.utils.rate_limiter import LLMGovernor
+
 class Config(BaseSettings):
     """
     全域設定檔 (Singleton 概念)
@@ -15,13 +19,130 @@ class Config(BaseSettings):
     GOOGLE_API_KEY: str | None = None
     
     # DSPy 參數
+    LLM_MODEL: str = "gemini/gemini-3-flash-preview"
     DSPY_MAX_TOKENS: int = 8192
-    
+    # 各 agent 的 LM profile (覆寫 model / temperature / max_tokens 等 dspy.LM 參數，沒列的 agent 用 LLM_MODEL)
+    # <agent>_fix 用在修自己上一輪的語法 / import 錯誤。例如把機械性的工作交給便宜快速的 model：
+    #   {"scaffolder": {"model": "gemini/gemini-2.5-flash-lite"}, "qa_fix": {"model": "gemini/gemini-2.5-flash-lite"}}
+    LLM_AGENT_PROFILES: dict[str, dict] = {}
+    # 同一個 agent 連續被退回 LLM_ESCALATE_AFTER 輪後改用的 LM profile ({} = 不升級)
+    # 例如：{"model": "gemini/gemini-3-pro-preview"}
+    LLM_ESCALATION_PROFILE: dict = {}
+    LLM_ESCALATE_AFTER: int = 2
+    # lm.history 最多保留幾筆 (用量已由 MetricsCollector 記錄，history 不需要無限成長)
+    LM_HISTORY_LIMIT: int = 20
+
+    # 用量統計：每百萬 token 的價格 (USD)，伺服器沒回傳 cost 時用來估算
+    LLM_INPUT_PRICE_PER_M: float = 0.5
+    LLM_OUTPUT_PRICE_PER_M: float = 3.0
+    # MetricsCollector 在記憶體中保留的紀錄筆數 (完整紀錄在 playground/<run>/metrics.jsonl)
+    METRICS_HISTORY_LIMIT: int = 200
+
+    # LLM 回應快取 (磁碟 / 跨 process)
+    # 只有列在 LLM_CACHE_AGENTS 裡的 agent 會使用快取 (可選: architect, scaffolder, qa, coder)
+    LLM_CACHE_AGENTS: list[str] = ["architect", "scaffolder"]
+    LLM_CACHE_DIR: str = ".cache/llm"
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # 串流生成：邊生成邊檢查程式碼，第一個 code block 完成就收工；語法錯誤或輸出失控時提早中止並重試
+    LLM_STREAM_AGENTS: list[str] = ["qa", "coder"]
+    LLM_STREAM_MAX_CHARS: int = 24000
+    LLM_STREAM_RETRIES: int = 1
+    # 重試時改用的溫度 (同樣的輸入在 temperature=0 下多半會再寫出一樣的東西)
+    LLM_STREAM_RETRY_TEMPERATURE: float = 0.7
+
+    # LLM 呼叫的全域額度 (同一個 process 內所有辦公室共用同一把 API key；0 = 不限制)
+    LLM_RATE_RPM: int = 0
+    LLM_RATE_TPM: int = 0
+    LLM_MAX_IN_FLIGHT: int = 8
+    # 額度不夠時的排隊順序 (數字小的先)：先把進行中的 Coder / QA 修完，再開新的 Architect
+    LLM_PRIORITIES: dict[str, int] = {"coder": 0, "qa": 1, "scaffolder": 2, "bench": 2, "architect": 3}
+    # 429 / 5xx 等暫時性錯誤：在呼叫層退避重試，不消耗 check_results 的修正輪數
+    LLM_RETRY_MAX: int = 4
+    LLM_RETRY_BACKOFF_SECONDS: float = 2.0
+    LLM_RETRY_BACKOFF_MAX_SECONDS: float = 60.0
+
+    # Scaffolder 快速路徑：規格書 / augment_context 已有完整簽章或 Class Diagram 時，第一輪不呼叫 LLM
+    SCAFFOLD_FAST_PATH: bool = True
+
+    # 批次模式 (batch.py) 同時執行的 job 數，實際上受 LLM 併發上限約束
+    BATCH_WORKERS: int = 4
+
+    # 多模組專案 (project_manager.py) 同時開發的模組數；沒有相依關係的模組才會同時進行
+    PROJECT_MAX_PARALLEL_MODULES: int = 4
+
+    # FileOps 後端："disk" (每次都直接寫入 playground) 或 "memory" (記憶體中操作，結束時批次寫回)
+    # 注意：開著 CHECKPOINT_ENABLED 時，每個 node 完成後都會先批次寫回一次 (checkpoint 才能指向已落地的檔案)，
+    # memory 模式省下的只剩 node 內的重複寫入；要完全只在結束時寫回，需關掉 checkpoint
+    FILE_OPS_BACKEND: str = "disk"
+
+    # 每個 node 完成後存 checkpoint (playground/checkpoints.sqlite3)，可用 --resume <run_id> 接續中斷的執行
+    CHECKPOINT_ENABLED: bool = True
+    # 每個 run 在 DB 中保留的 checkpoint 筆數 (接續只用到最後一筆)
+    CHECKPOINT_KEEP_PER_RUN: int = 3
+
+    # TestRunner：使用預熱的 pytest worker pool (POSIX 限定，其他平台自動退回冷啟動)
+    TEST_RUNNER_WARM_POOL: bool = True
+    TEST_RUNNER_POOL_SIZE: int = 4
+    TEST_RUNNER_TIMEOUT: float = 30
+    # 同一份測試檔上一輪有失敗時，先只重跑失敗的測試 (仍失敗就提早結束)
+    TEST_RUNNER_FAILING_FIRST: bool = True
+    # 啟動 pytest 前先做 in-process 的靜態檢查 (語法、import 解析、測試檔 import 的名稱是否存在)
+    TEST_RUNNER_PREFLIGHT: bool = True
+    # 測試數量 >= SHARD_MIN_TESTS 時，把測試檔拆成 SHARDS 個 pytest 平行執行 (1 = 不拆；timeout 以 shard 為單位)
+    TEST_RUNNER_SHARDS: int = 2
+    TEST_RUNNER_SHARD_MIN_TESTS: int = 8
+    # pytest 子行程的資源上限 (0 = 不限制；POSIX 限定)：CPU 秒數、記憶體 (address space)、額外行程數、單一測試逾時
+    TEST_RUNNER_CPU_SECONDS: int = 60
+    TEST_RUNNER_MEMORY_MB: int = 2048
+    TEST_RUNNER_MAX_PROCESSES: int = 64
+    TEST_RUNNER_PER_TEST_TIMEOUT: float = 10
+    # 可寫入的 cgroup v2 目錄 (例如 systemd 委派給使用者的 slice)；有設定時另外用 cgroup 限制記憶體與行程數
+    # (行程數只靠 cgroup 的 pids.max 限制)
+    TEST_RUNNER_CGROUP_ROOT: str = ""
+    # 沒有 cgroup 時改用 RLIMIT_NPROC 限制行程數 (每次執行都要掃 /proc 計算使用者既有的 task 數，預設關閉)
+    TEST_RUNNER_NPROC_RLIMIT: bool = False
+
+    # 效能關卡：測試全綠後寫 micro-benchmark，執行時間隨輸入規模成長太快 (次方超過預算) 就退回 Coder
+    PERF_GATE: bool = False
+    PERF_MAX_EXPONENT: float = 1.5
+    # benchmark 有宣告預期次方時，允許超出的幅度
+    PERF_EXPONENT_TOLERANCE: float = 0.4
+    PERF_REPEATS: int = 5
+    # 最大規模仍比這個快 (秒) 的 benchmark 不判定
+    PERF_MIN_SECONDS: float = 1e-4
+    PERF_TIMEOUT: float = 60
+    PERF_MAX_ROUNDS: int = 3
+
+    # QA / Coder 每次呼叫的 prompt token 預算 (0 = 不限制)，以及每個失敗測試保留的輸出行數
+    PROMPT_TOKEN_BUDGET: int = 12000
+    PROMPT_FEEDBACK_MAX_LINES: int = 40
+
+    # 重試迴圈偵測：同一個 worker 的產出或失敗訊號與之前重複時，下一輪提高溫度並要求換個做法；
+    # 連續重複 LOOP_MAX_REPEATS 次就不再浪費剩下的重試次數
+    LOOP_DETECTION: bool = True
+    LOOP_MAX_REPEATS: int = 2
+    LOOP_RETRY_TEMPERATURE: float = 0.8
+
+    # Coder Best-of-N：每輪平行生成 N 個候選版本 (1 = 關閉)，溫度依序輪替
+    CODER_CANDIDATES: int = 1
+    CODER_CANDIDATE_TEMPERATURES: list[float] = [0.0, 0.4, 0.7, 1.0]
+
+    # Coder patch 模式：修正輪次只輸出 search / replace 區塊，在本地套用 (套不上時改為整檔重寫)
+    # Best-of-N (CODER_CANDIDATES > 1) 時不使用
+    CODER_PATCH_MODE: bool = False
+    # 逐字比對不到時，相似度達到這個門檻的位置也算符合
+    CODER_PATCH_FUZZY_THRESHOLD: float = 0.85
+
     # 載入 .env
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
-    def initialize_dspy(self) -> dspy.LM:
+    def initialize_dspy(self) -> "dspy.LM":
         """根據設定初始化 DSPy (取代原本的 init_dspy 函式)"""
+        # dspy (連帶 litellm) 載入要好幾秒，等到真的要建 LM 時才 import
+        import dspy
+
         lm = None
         if self.LLM_PROVIDER == "gemini":
             print("✨ SalaryPartners running on Google Gemini")
@@ -29,7 +150,7 @@ class Config(BaseSettings):
                 raise ValueError("❌ 找不到 GOOGLE_API_KEY，請檢查 .env")
             
             lm = dspy.LM(
-                model='gemini/gemini-3-flash-preview', 
+                model=self.LLM_MODEL,
                 api_key=self.GOOGLE_API_KEY,
                 max_tokens=self.DSPY_MAX_TOKENS,
                 temperature=0.0,
@@ -42,6 +163,19 @@ class Config(BaseSettings):
         dspy.configure(lm=lm)
         return lm
 
+    def llm_governor(self) -> "LLMGovernor":
+        """process 內共用的 LLM 呼叫排程器 (第一次呼叫時依目前設定建立)"""
+        from src.utils.rate_limiter import LLMGovernor
+
+        return LLMGovernor.shared(
+            rpm=self.LLM_RATE_RPM,
+            tpm=self.LLM_RATE_TPM,
+            max_in_flight=self.LLM_MAX_IN_FLIGHT,
+            max_retries=self.LLM_RETRY_MAX,
+            backoff_base=self.LLM_RETRY_BACKOFF_SECONDS,
+            backoff_max=self.LLM_RETRY_BACKOFF_MAX_SECONDS
+        )
+
 # 為了方便其他模組使用，這裡可以直接實例化一個單例
 # 但如果你希望 main.py 擁有完全控制權，也可以不在這裡實例化
 # 這裡遵循 Python 常見模式：
@@ -1,16 +1,33 @@
-from config import config
-from office.office_manager import OfficeManager
+from pathlib import Path
+import argparse
+import asyncio
 import warnings
 
 # 過濾掉 Pydantic 的序列化警告 (眼不見為淨)
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
-lm = config.initialize_dspy()
-
 def main():
-    manager = OfficeManager(lm)
-    salary_partners = manager.compile_graph()
-    
+    parser = argparse.ArgumentParser(description="SalaryPartners")
+    parser.add_argument("--resume", metavar="RUN_ID", help="接續中斷的執行 (playground/<run_id>)")
+    parser.add_argument("--project", action="store_true", help="多模組專案：先拆模組，再依相依關係平行開發")
+    args = parser.parse_args()
+    if args.project and args.resume:
+        parser.error("--project 不支援 --resume")
+
+    playground_dir = None
+    if args.resume:
+        playground_dir = f"playground/{args.resume}"
+        if not Path(playground_dir).is_dir():
+            raise SystemExit(f"❌ 找不到 {playground_dir}，無法接續")
+
+    # 參數檢查完才載入 dspy / langgraph 並建立 LM (--help、參數錯誤不必等好幾秒)
+    from config import config
+    from office.office_manager import OfficeManager
+    # 與 OfficeManager 同一個模組 (快取是 class 層級的)
+    from src.utils.code_generator import CodeGenerator
+
+    lm = config.initialize_dspy()
+
     user_req = "實作一個購物車折扣計算器，支援滿千送百和 VIP 9折"
     augment_context = """
     [Augment Suggestion]
@@ -25,6 +42,13 @@ def main():
     Filename: discount_system.py
     """
 
+    if args.project:
+        run_project(lm, user_req, augment_context)
+        return
+
+    manager = OfficeManager(lm, playground_dir=playground_dir)
+    salary_partners = manager.compile_graph()
+
     initial_state = {
         "requirement": user_req,
         "augment_context": augment_context, # ✅ 注入外部智慧
@@ -32,13 +56,43 @@ def main():
         "coder_revision_count": 0
     }
 
-    print("🚀 SalaryPartners 辦公室啟動中...")
-    final_state = salary_partners.invoke(initial_state)
+    if args.resume:
+        initial_state = manager.load_checkpoint()
+        if initial_state is None:
+            raise SystemExit(f"❌ run {args.resume} 沒有 checkpoint 可以接續")
+
+    print(f"🚀 SalaryPartners 辦公室啟動中... (run id: {manager.run_id})")
+    try:
+        final_state = salary_partners.invoke(initial_state)
+    finally:
+        manager.close()
 
     print("\n" + "="*30)
     print("🎉 最終交付成果：")
     print(f"檔案：{final_state.get('file_name')}")
     print("程式碼已寫入 playground/")
 
+    manager.metrics.print_summary()
+    if manager.llm_cache:
+        print(f"LLM 快取統計：{manager.llm_cache.stats()}")
+    print(f"程式碼生成快取統計：{CodeGenerator.cache_stats()}")
+    print(f"LLM 額度統計：{manager.governor.stats()}")
+
+def run_project(lm, requirement: str, augment_context: str) -> None:
+    from config import config
+    from office.project_manager import ProjectManager
+
+    project = ProjectManager(lm)
+    print(f"🚀 SalaryPartners 專案模式啟動中... ({project.project_dir})")
+    records = asyncio.run(project.arun(requirement, augment_context))
+
+    print("\n" + "="*30)
+    print(f"🎉 專案完成：{sum(r['ok'] for r in records)}/{len(records)} 個模組通過")
+    for record in records:
+        mark = "✅" if record["ok"] else ("⏭️" if record.get("skipped") else "❌")
+        print(f"{mark} {record['filepath']} ({record.get('elapsed_seconds', 0)}s)")
+    print(f"成品已寫入 {project.project_dir}/")
+    print(f"LLM 額度統計：{config.llm_governor().stats()}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
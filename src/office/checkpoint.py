@@ -0,0 +1,70 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+class CheckpointStore:
+    """
+    Graph 執行的 Checkpoint (SQLite)
+    每個 node 完成後存一筆 (run_id, node, state)，process 中途掛掉時，
+    可以從最後一個完成的 node 接續，不必重跑 Architect / Scaffolder 的 LLM 呼叫。
+    """
+
+    def __init__(self, db_path: str, keep_per_run: int = 3):
+        self.db_path = Path(db_path)
+        # 每個 run 只保留最近幾筆 (接續只需要最後一筆，其餘留著方便 debug)
+        self.keep_per_run = keep_per_run
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    run_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    node TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, seq)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作開新連線 (批次模式多個辦公室共用同一個 DB)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, run_id: str, node: str, state: dict) -> None:
+        """記錄 node 完成後的完整 state，並刪掉這個 run 較舊的紀錄"""
+        with self._connect() as conn:
+            (last_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM checkpoints WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO checkpoints (run_id, seq, node, state, created_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, last_seq + 1, node, json.dumps(state, ensure_ascii=False), time.time())
+            )
+            conn.execute(
+                "DELETE FROM checkpoints WHERE run_id = ? AND seq <= ?",
+                (run_id, last_seq + 1 - max(self.keep_per_run, 1))
+            )
+
+    def latest(self, run_id: str) -> tuple[str, dict] | None:
+        """最後一個完成的 node 與當時的 state；沒有紀錄時回傳 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT node, state FROM checkpoints WHERE run_id = ? ORDER BY seq DESC LIMIT 1",
+                (run_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        node, state = row
+        return node, json.loads(state)
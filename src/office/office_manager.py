@@ -1,67 +1,355 @@
+import asyncio
+import contextvars
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from langgraph.graph import StateGraph, END
+from typing import TYPE_CHECKING
 import dspy
 from src.agents.scaffolder_agent import ScaffolderAgent
 from src.agents.qa_agent import QAAgent
-from src.agents.code_agent import CoderAgent
+from src.agents.code_agent import CoderAgent, PatchCoderAgent
 from src.agents.architect_agent import ArchitectAgent
+from src.agents.bench_agent import BenchmarkAgent
+from src.config import config
+from src.office.checkpoint import CheckpointStore
 from src.office.state import OfficeState
-from src.tools.file_ops import FileOps
-from src.tools.test_runner import TestRunner
+from src.tools.file_ops import FileOps, MemoryFileOps
+from src.tools.pytest_pool import PytestWorkerPool
+from src.tools.sandbox import ResourceLimits
+from src.tools.test_runner import TestRunner, TestRunResult
 from src.utils.code_generator import CodeGenerator
+from src.utils.fingerprint import code_fingerprint, failure_fingerprint
+from src.utils.llm_cache import LLMCache, dump_prediction, load_prediction
+from src.utils.metrics import MetricsCollector, NodeMetrics, new_history_entries
+from src.utils.parsers import clean_code_block
+from src.utils.patcher import PatchError, apply_patch
+from src.utils.prompt_context import ContextAssembler
+from src.utils.schema_extractor import SchemaExtractor
+from src.utils.stream_guard import StreamGuard, astream_prediction, stream_prediction
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableLambda
 
 class OfficeManager:
-    def __init__(self, lm: dspy.LM):
+    def __init__(self, lm: dspy.LM, playground_dir: str | None = None):
         """
         辦公室初始化：在這裡聘用員工 (Agents) 與採購工具 (Tools)
+        playground_dir: 指定工作目錄 (批次模式每個 job 各自一個)，預設為 playground/<timestamp>
+                        目錄名稱同時是 run id (用來接續中斷的執行)
         """
         self.lm = lm
-        self.input_pricing_per_m_token = 0.5
-        self.output_pricing_per_m_token = 3
         print("🏢 SalaryPartners 辦公室正在開張...")
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
+        # 各 agent 的 LM (config.LLM_AGENT_PROFILES：簡單的工作用便宜快速的 model)，
+        # 以及連續失敗後升級用的 LM (沒有設定的 agent 用辦公室預設的 LM)
+        self.agent_lms = {name: lm.copy(**profile) for name, profile in config.LLM_AGENT_PROFILES.items()}
+        self.escalation_lm = lm.copy(**config.LLM_ESCALATION_PROFILE) if config.LLM_ESCALATION_PROFILE else None
+
         # 聘用員工 (DSPy Modules)
         self.scaffolder = ScaffolderAgent()
         self.qa = QAAgent()
         self.coder = CoderAgent()
+        self.patch_coder = PatchCoderAgent()
         self.architect = ArchitectAgent()
+        self.bench = BenchmarkAgent()
         
         # 實例化工具
-        playground_dir = f"playground/{timestamp}"
+        if playground_dir is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            playground_dir = f"playground/{timestamp}"
+        self.playground_dir = playground_dir
+        self.run_id = Path(playground_dir).name
         Path(playground_dir).mkdir(parents=True, exist_ok=True)
-        self.file_ops = FileOps(base_dir=playground_dir)
-        self.runner = TestRunner(playground_dir=playground_dir)
-
-    def print_last_asking(self):
-        last_call = self.lm.history[-1]
-        print(last_call.keys())
-        cost_from_server = last_call['cost']
-        input_token = last_call['usage']['prompt_tokens']
-        input_cost = input_token * self.input_pricing_per_m_token / 1000000
-        output_token = last_call['usage']['completion_tokens']
-        output_cost = output_token * self.output_pricing_per_m_token / 1000000
-        total_token = last_call['usage']['total_tokens']
-        total_cost = input_cost + output_cost
-        print(f"    Cost from server: {cost_from_server}")
-        print(f"    Input Tokens: {input_token}(NT$ {input_cost:.4f})")
-        print(f"    Output Tokens: {output_token}(NT$ {output_cost:.4f})")
-        print(f"    Total Tokens: {total_token}(NT$ {total_cost:.4f})")
+        # 記憶體模式：檔案留在記憶體，結束時一次寫回 playground
+        file_ops_cls = MemoryFileOps if config.FILE_OPS_BACKEND == "memory" else FileOps
+        self.file_ops = file_ops_cls(base_dir=playground_dir)
+        pool = PytestWorkerPool.shared(config.TEST_RUNNER_POOL_SIZE) if config.TEST_RUNNER_WARM_POOL else None
+        self.runner = TestRunner(
+            playground_dir=str(self.file_ops.workdir),
+            pool=pool,
+            timeout=config.TEST_RUNNER_TIMEOUT,
+            failing_first=config.TEST_RUNNER_FAILING_FIRST,
+            preflight=config.TEST_RUNNER_PREFLIGHT,
+            shards=config.TEST_RUNNER_SHARDS,
+            shard_min_tests=config.TEST_RUNNER_SHARD_MIN_TESTS,
+            limits=ResourceLimits(
+                cpu_seconds=config.TEST_RUNNER_CPU_SECONDS,
+                memory_mb=config.TEST_RUNNER_MEMORY_MB,
+                max_processes=config.TEST_RUNNER_MAX_PROCESSES,
+                test_timeout=config.TEST_RUNNER_PER_TEST_TIMEOUT,
+                cgroup_root=config.TEST_RUNNER_CGROUP_ROOT,
+                nproc_rlimit=config.TEST_RUNNER_NPROC_RLIMIT
+            )
+        )
+
+        # 所有 LLM 呼叫共用的額度與排隊 (批次 / 多模組時多間辦公室共用同一個)
+        self.governor = config.llm_governor()
+
+        # 每個 node / round 的用量與耗時紀錄
+        self.metrics = MetricsCollector(
+            output_path=str(Path(playground_dir) / "metrics.jsonl"),
+            input_price_per_m=config.LLM_INPUT_PRICE_PER_M,
+            output_price_per_m=config.LLM_OUTPUT_PRICE_PER_M,
+            history_limit=config.METRICS_HISTORY_LIMIT
+        )
+
+        # QA / Coder 的 prompt 組裝 (token 預算)
+        self.context = ContextAssembler(
+            token_budget=config.PROMPT_TOKEN_BUDGET,
+            feedback_max_lines=config.PROMPT_FEEDBACK_MAX_LINES
+        )
+
+        # LLM 回應快取 (只對 config.LLM_CACHE_AGENTS 開啟)
+        self.llm_cache = None
+        # 等待驗收的快取紀錄 {agent: (key, 要寫入的結果；None = 這次是命中舊的紀錄)}
+        self._cache_pending: dict[str, tuple[str, dict | None]] = {}
+        if config.LLM_CACHE_AGENTS:
+            self.llm_cache = LLMCache(
+                cache_dir=config.LLM_CACHE_DIR,
+                ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+                max_bytes=config.LLM_CACHE_MAX_BYTES
+            )
+
+        # 每個 node 完成後存 checkpoint (同一層的 run 共用一個 DB，以 run id 區分)
+        self.checkpoints = None
+        if config.CHECKPOINT_ENABLED:
+            self.checkpoints = CheckpointStore(
+                str(Path(playground_dir).parent / "checkpoints.sqlite3"),
+                keep_per_run=config.CHECKPOINT_KEEP_PER_RUN
+            )
+        # 接續執行時，上次最後完成的 node (None = 從頭開始)
+        self.resume_after = None
+
+    def close(self):
+        """收工：把記憶體中的檔案寫回 playground"""
+        self.file_ops.close()
 
+    @staticmethod
+    def succeeded(state: OfficeState) -> bool:
+        """最終 state 是否成功交付：實作的測試全綠 (有開效能關卡時還要通過效能關卡)"""
+        return state.get("test_result_status") == "PASS" and state.get("phase") in ("coding", "perf")
+
+    def load_checkpoint(self) -> OfficeState | None:
+        """
+        讀取這個 run 最後的 checkpoint，之後的 invoke 會從下一個 node 接續
+        Returns: 當時的 state (拿來當 invoke 的輸入)；沒有 checkpoint 時回傳 None
+        """
+        checkpoint = self.checkpoints.latest(self.run_id) if self.checkpoints else None
+        if checkpoint is None:
+            return None
+        self.resume_after, state = checkpoint
+        print(f"♻️ 從 checkpoint 接續 run {self.run_id} (最後完成的 node: {self.resume_after})")
+        return state
+
+    def _cache_lookup(self, name: str, agent: dspy.Module, lm: dspy.LM,
+                      inputs: dict) -> tuple[str | None, dspy.Prediction | None]:
+        """Returns: (快取 key (此 agent 不用快取時為 None), 命中的結果)"""
+        if self.llm_cache is None or name not in config.LLM_CACHE_AGENTS:
+            return None, None
+        model_id = f"{lm.model}@temperature={lm.kwargs.get('temperature')}"
+        key = LLMCache.make_key(model_id, agent.signature, inputs)
+        cached = self.llm_cache.get(key)
+        if cached is None:
+            return key, None
+        print(f"    ⚡ [Cache] {name} 命中快取，略過 LLM 呼叫")
+        self.metrics.record_cache_hit()
+        self._cache_pending[name] = (key, None)
+        return key, load_prediction(agent.signature, cached)
+
+    def _settle_cache(self, name: str, accepted: bool) -> None:
+        """
+        agent 的產出驗收後才寫入快取；被退回時連同命中的舊紀錄一起刪掉，
+        否則下一輪 (以及之後同樣需求的 run) 會一直拿到同一份被退回的結果
+        """
+        if self.llm_cache is None:
+            return
+        pending = self._cache_pending.pop(name, None)
+        if pending is None:
+            return
+        key, value = pending
+        if not accepted:
+            self.llm_cache.delete(key)
+        elif value is not None:
+            self.llm_cache.put(key, name, value)
+
+    @staticmethod
+    def _streams(name: str, agent: dspy.Module) -> bool:
+        return name in config.LLM_STREAM_AGENTS and getattr(agent, "stream_field", None) is not None
+
+    def _call_agent(self, name: str, agent: dspy.Module, lm: dspy.LM | None = None,
+                    use_cache: bool = True, **inputs) -> dspy.Prediction:
+        """
+        所有 Agent 的 LLM 呼叫都走這裡 (統一處理快取與用量紀錄)
+        lm: 指定這次呼叫使用的 LM (例如 Best-of-N 的不同溫度)，預設為這個 agent 的 LM
+        use_cache: False 時不查也不登記快取 (Best-of-N 的候選，分不出哪一版會被採用)
+        """
+        lm = lm or self.agent_lms.get(name, self.lm)
+        key, cached = self._cache_lookup(name, agent, lm, inputs) if use_cache else (None, None)
+        if cached is not None:
+            return cached
+
+        aborted = False
+        if self._streams(name, agent):
+            result, aborted = self._stream_agent(name, agent, lm, inputs)
+        else:
+            result = self._timed_call(name, lm, lambda: agent(**inputs), inputs)
+
+        # 串流被中止的半成品不進快取；其餘等這一輪的產出通過驗收才寫入 (_settle_cache)
+        if key is not None and not aborted:
+            self._cache_pending[name] = (key, dump_prediction(result))
+        return result
+
+    async def _acall_agent(self, name: str, agent: dspy.Module, lm: dspy.LM | None = None,
+                           use_cache: bool = True, **inputs) -> dspy.Prediction:
+        """_call_agent 的 async 版本 (ainvoke 用)：等待 LLM 時不佔用 event loop"""
+        lm = lm or self.agent_lms.get(name, self.lm)
+        key, cached = self._cache_lookup(name, agent, lm, inputs) if use_cache else (None, None)
+        if cached is not None:
+            return cached
+
+        aborted = False
+        if self._streams(name, agent):
+            result, aborted = await self._astream_agent(name, agent, lm, inputs)
+        else:
+            result = await self._atimed_call(name, lm, lambda: agent.acall(**inputs), inputs)
+
+        if key is not None and not aborted:
+            self._cache_pending[name] = (key, dump_prediction(result))
+        return result
+
+    def _timed_call(self, name: str, lm: dspy.LM, call, inputs: dict):
+        """
+        在指定的 LM 下執行一次 LLM 呼叫，並記錄用量與耗時
+        呼叫前先向 governor 排隊取得額度 (RPM / TPM / 同時請求數)，暫時性錯誤由 governor 退避重試
+        """
+        last_seen = lm.history[-1] if lm.history else None
+        started = time.perf_counter()
+
+        def run():
+            # 用 dspy.context 綁定這間辦公室自己的 LM (多個辦公室並行時互不干擾)
+            with dspy.context(lm=lm):
+                return call()
+
+        result, queued, retries = self.governor.call(
+            run, priority=self._priority(name), tokens=self._estimate_tokens(inputs),
+            usage=lambda: self._history_tokens(lm, last_seen)
+        )
+        self._record_usage(lm, last_seen, time.perf_counter() - started, queued, retries)
+        return result
+
+    async def _atimed_call(self, name: str, lm: dspy.LM, call, inputs: dict):
+        """_timed_call 的 async 版本 (call 回傳 coroutine)"""
+        last_seen = lm.history[-1] if lm.history else None
+        started = time.perf_counter()
+
+        async def run():
+            # dspy.context 以 contextvars 實作，每個 task 各自獨立
+            with dspy.context(lm=lm):
+                return await call()
+
+        result, queued, retries = await self.governor.acall(
+            run, priority=self._priority(name), tokens=self._estimate_tokens(inputs),
+            usage=lambda: self._history_tokens(lm, last_seen)
+        )
+        self._record_usage(lm, last_seen, time.perf_counter() - started, queued, retries)
+        return result
+
+    @staticmethod
+    def _priority(name: str) -> int:
+        return config.LLM_PRIORITIES.get(name, max(config.LLM_PRIORITIES.values(), default=0))
+
+    @staticmethod
+    def _estimate_tokens(inputs: dict) -> int:
+        """送出前預估的 prompt token 數 (給 TPM 排隊用，呼叫完成後以實際用量校正)"""
+        return sum(ContextAssembler.estimate_tokens(str(value)) for value in inputs.values() if value)
+
+    @staticmethod
+    def _history_tokens(lm: dspy.LM, last_seen) -> int:
+        total = 0
+        for entry in new_history_entries(lm.history, last_seen):
+            usage = entry.get("usage") or {}
+            total += (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+        return total
+
+    def _record_usage(self, lm: dspy.LM, last_seen, elapsed: float, queued: float = 0.0, retries: int = 0) -> None:
+        # llm_seconds 只算真正等 LLM 的時間，排隊 / 退避另外記
+        usage = self.metrics.record_llm_call(new_history_entries(lm.history, last_seen), elapsed - queued)
+        self.metrics.record_llm_queue(queued, retries)
+        waited = f", queued {queued:.1f}s" if queued >= 0.1 else ""
+        print(f"    [{lm.model}] Tokens: in {usage['prompt_tokens']} / out {usage['completion_tokens']}, "
+              f"cost ${usage['server_cost'] or usage['estimated_cost']:.4f}, {elapsed - queued:.1f}s{waited}")
+
+        # lm.history 只需要保留最近幾筆，避免長時間執行時無限成長
+        if len(lm.history) > config.LM_HISTORY_LIMIT:
+            del lm.history[:-config.LM_HISTORY_LIMIT]
+
+    def _stream_agent(self, name: str, agent: dspy.Module, lm: dspy.LM,
+                      inputs: dict) -> tuple[dspy.Prediction, bool]:
+        """
+        串流生成：StreamGuard 邊收邊檢查程式碼，第一個 code block 完成就收工；
+        語法錯誤或輸出失控時立刻中止，改用較高的溫度重試 (最多 LLM_STREAM_RETRIES 次)
+        Returns: (結果, 是否為中止後的半成品)
+        """
+        attempt_lm = lm
+        for _ in range(config.LLM_STREAM_RETRIES + 1):
+            guard = StreamGuard(max_chars=config.LLM_STREAM_MAX_CHARS)
+            result = self._timed_call(name, attempt_lm, lambda: stream_prediction(agent, inputs, guard), inputs)
+            if self._stream_finished(name, guard, result):
+                return result, False
+            attempt_lm = lm.copy(temperature=config.LLM_STREAM_RETRY_TEMPERATURE)
+
+        # 重試用完：交出半成品，讓測試結果帶著錯誤訊息走原本的退回流程
+        return dspy.Prediction(**{agent.stream_field: guard.text}), True
+
+    async def _astream_agent(self, name: str, agent: dspy.Module, lm: dspy.LM,
+                             inputs: dict) -> tuple[dspy.Prediction, bool]:
+        """_stream_agent 的 async 版本"""
+        attempt_lm = lm
+        for _ in range(config.LLM_STREAM_RETRIES + 1):
+            guard = StreamGuard(max_chars=config.LLM_STREAM_MAX_CHARS)
+            result = await self._atimed_call(name, attempt_lm, lambda: astream_prediction(agent, inputs, guard), inputs)
+            if self._stream_finished(name, guard, result):
+                return result, False
+            attempt_lm = lm.copy(temperature=config.LLM_STREAM_RETRY_TEMPERATURE)
+
+        return dspy.Prediction(**{agent.stream_field: guard.text}), True
+
+    def _stream_finished(self, name: str, guard: StreamGuard, result: dspy.Prediction | None) -> bool:
+        """一次串流的結果：拿到可用的輸出回傳 True；被 guard 中止則記錄下來並回傳 False"""
+        if result is not None:
+            if guard.complete:
+                print(f"    ✂️ [Stream] {name} {guard.reason}，提早結束生成")
+            return True
+        self.metrics.record_stream_abort()
+        print(f"    🛑 [Stream] {name} 中止生成：{guard.reason}")
+        return False
 
     # --- 節點方法 (Node Methods) ---
+    # 每個 node 都有同步 (invoke) 與 async (ainvoke) 兩個入口，
+    # 只有 LLM 呼叫 / 測試執行不同，前後的檔案處理共用 _xxx_inputs / _xxx_done
     def architect_work(self, state: OfficeState):
         """[Step 0] 架構師分析需求與外部 Context"""
+        result = self._call_agent("architect", self.architect, **self._architect_inputs(state))
+        return self._architect_done(state, result)
+
+    async def aarchitect_work(self, state: OfficeState):
+        result = await self._acall_agent("architect", self.architect, **self._architect_inputs(state))
+        return self._architect_done(state, result)
+
+    def _architect_inputs(self, state: OfficeState) -> dict:
         print("\n🏗️ Architect 正在分析架構 (Analyzing Context)...")
-        
-        result = self.architect(
+        return dict(
             requirement=state['requirement'],
             augment_context=state.get('augment_context')
         )
-        
-        p_filepath = Path(result.p_filepath)
+
+    def _architect_done(self, state: OfficeState, result: dspy.Prediction):
+        # 多模組專案中檔名由 ProjectManager 事先決定 (相依模組要 import 得到)
+        p_filepath = Path(state.get('p_filepath') or result.p_filepath)
         spec_filepath = p_filepath.name + ".spec"
         print(f"    -> 規格書存放在: {spec_filepath}")
         self.file_ops.save(spec_filepath, result.technical_spec)
@@ -73,8 +361,8 @@ class OfficeManager:
         t_filepath_scaffolder = "test_" + p_filepath.stem + ".scaffolder" + p_filepath.suffix
         t_filepath_qa = "test_" + p_filepath.stem + ".qa" + p_filepath.suffix
         p_filepath_coder = p_filepath.stem + ".coder" + p_filepath.suffix
+        b_filepath = "bench_" + p_filepath.name
         print("    -> 規格書已生成。")
-        self.print_last_asking()
         
         return {
             "technical_spec": result.technical_spec,
@@ -84,20 +372,53 @@ class OfficeManager:
             "t_filepath_scaffolder": t_filepath_scaffolder,
             "t_filepath_qa": t_filepath_qa,
             "p_filepath_coder": p_filepath_coder,
+            "b_filepath": b_filepath,
             "last_worker": "architect",
             "phase": "init"
         }
 
     # --- Node 2: 鷹架工 (Scaffolder) ---
     def scaffolder_work(self, state: OfficeState):
+        inputs = self._scaffolder_inputs(state)
+        # 1. AI 思考結構 (取得 Pydantic 物件)；設計已經夠結構化時直接用規則萃取
+        result = self._scaffold_fast_path(state)
+        if result is None:
+            result = self._call_agent("scaffolder", self.scaffolder, lm=self._worker_lm(state, "scaffolder"), **inputs)
+        return self._scaffolder_done(state, result)
+
+    async def ascaffolder_work(self, state: OfficeState):
+        inputs = self._scaffolder_inputs(state)
+        result = self._scaffold_fast_path(state)
+        if result is None:
+            result = await self._acall_agent("scaffolder", self.scaffolder, lm=self._worker_lm(state, "scaffolder"), **inputs)
+        return self._scaffolder_done(state, result)
+
+    def _scaffold_fast_path(self, state: OfficeState) -> dspy.Prediction | None:
+        """
+        規格書 / augment_context 已有完整的簽章或 Class Diagram 時，不呼叫 Scaffolder LLM
+        只用在第一輪：規則萃取的骨架驗證失敗時，重試一律交給 LLM
+        """
+        if not config.SCAFFOLD_FAST_PATH or state.get('scaffolder_revision_count', 0) > 0:
+            return None
+        schemas = SchemaExtractor.extract(
+            state['p_filepath'], state.get('technical_spec'), state.get('augment_context')
+        )
+        if schemas is None:
+            print("    (Fast Path) 設計不夠完整，交給 Scaffolder LLM")
+            return None
+        print("    ⚡ (Fast Path) 直接從規格 / Class Diagram 萃取結構，略過 LLM 呼叫")
+        return dspy.Prediction(product_structure=schemas[0], test_structure=schemas[1])
+
+    def _scaffolder_inputs(self, state: OfficeState) -> dict:
         current_round = state.get('scaffolder_revision_count', 0) + 1
         print(f"\n🏗️ Scaffolder 正在規劃結構 (JSON Mode) (第 {current_round} 次嘗試)...")
-        
-        # 1. AI 思考結構 (取得 Pydantic 物件)
-        result = self.scaffolder(
+        return dict(
             requirement=state['requirement'],
             technical_spec=state['technical_spec']
         )
+
+    def _scaffolder_done(self, state: OfficeState, result: dspy.Prediction):
+        current_round = state.get('scaffolder_revision_count', 0) + 1
         prod_schema = result.product_structure
         test_schema = result.test_structure
         
@@ -151,7 +472,6 @@ class OfficeManager:
         self.file_ops.save(t_filepath_scaffolder + f".{current_round}", test_code)
         
         print("    -> 鷹架已生成。")
-        self.print_last_asking()
 
         state["scaffolder_revision_count"] = current_round
         state["last_worker"] = "scaffolder"
@@ -162,6 +482,14 @@ class OfficeManager:
     # --- Node 3: QA (填入真實斷言) ---
     def qa_work(self, state: OfficeState):
         """[Phase: Red] 把 assert True 改成真的測試"""
+        result = self._call_agent("qa", self.qa, lm=self._worker_lm(state, "qa"), **self._qa_inputs(state))
+        return self._qa_done(state, result)
+
+    async def aqa_work(self, state: OfficeState):
+        result = await self._acall_agent("qa", self.qa, lm=self._worker_lm(state, "qa"), **self._qa_inputs(state))
+        return self._qa_done(state, result)
+
+    def _qa_inputs(self, state: OfficeState) -> dict:
         current_round = state.get('qa_revision_count', 0) + 1
         print(f"\n🕵️‍♀️ QA 正在實作測試斷言 (第 {current_round} 次嘗試) (Red Phase)...")
 
@@ -176,15 +504,25 @@ class OfficeManager:
         error_feedback = state.get('test_message') \
             if state.get('test_result_status') == "ERROR" else ""
         
-        # 傳入目前的骨架
-        result = self.qa(
-            requirement=state['requirement'],
-            technical_spec=state['technical_spec'],
-            error_feedback=error_feedback,
-            ip_code=ip_code,
-            it_code=it_code,
-            last_ot_code=last_ot_code
+        # 傳入目前的骨架 (上次的嘗試改成 diff、錯誤訊息只留重點，控制 prompt 大小)
+        inputs = self.context.assemble(
+            dict(
+                requirement=state['requirement'],
+                technical_spec=state['technical_spec'],
+                error_feedback=error_feedback,
+                ip_code=ip_code,
+                it_code=it_code,
+                last_ot_code=last_ot_code
+            ),
+            previous={"last_ot_code": "it_code"},
+            feedback=["error_feedback"],
+            trim_order=["last_ot_code", "ip_code", "error_feedback", "it_code", "technical_spec"]
         )
+        return self._with_loop_hint(state, "qa", inputs, "error_feedback")
+
+    def _qa_done(self, state: OfficeState, result: dspy.Prediction):
+        current_round = state.get('qa_revision_count', 0) + 1
+        t_filepath_qa = state.get('t_filepath_qa')
 
         # 存檔
         self.file_ops.save(t_filepath_qa, result.ot_code)
@@ -192,7 +530,6 @@ class OfficeManager:
         self.file_ops.save(t_filepath_qa + f".{current_round}", result.ot_code)
 
         print("    -> 測試碼已生成。")
-        self.print_last_asking()
 
         state["qa_revision_count"] = current_round
         state["last_worker"] = "qa"
@@ -202,6 +539,39 @@ class OfficeManager:
 
     def coder_work(self, state: OfficeState):
         """[Step 3] Coder 根據失敗結果寫程式 (Green Phase)"""
+        patching = self._patching(state)
+        inputs = self._coder_inputs(state, patching)
+        if config.CODER_CANDIDATES > 1:
+            op_code = self._best_of_n_coder(state, inputs)
+        else:
+            lm = self._worker_lm(state, "coder")
+            op_code = None
+            if patching:
+                op_code = self._apply_patch(state, self._call_agent("coder", self.patch_coder, lm=lm, **inputs))
+            if op_code is None:
+                op_code = self._call_agent("coder", self.coder, lm=lm, **inputs).op_code
+        return self._coder_done(state, op_code)
+
+    async def acoder_work(self, state: OfficeState):
+        patching = self._patching(state)
+        inputs = self._coder_inputs(state, patching)
+        if config.CODER_CANDIDATES > 1:
+            # Best-of-N 本身就是 thread 並行 (候選各自跑沙盒測試)，整段交給 thread 等
+            op_code = await asyncio.to_thread(self._best_of_n_coder, state, inputs)
+        else:
+            lm = self._worker_lm(state, "coder")
+            op_code = None
+            if patching:
+                op_code = self._apply_patch(state, await self._acall_agent("coder", self.patch_coder, lm=lm, **inputs))
+            if op_code is None:
+                op_code = (await self._acall_agent("coder", self.coder, lm=lm, **inputs)).op_code
+        return self._coder_done(state, op_code)
+
+    def _coder_inputs(self, state: OfficeState, patching: bool = False) -> dict:
+        """
+        patching: 這一輪要求輸出 patch。SEARCH 要從程式碼逐字複製，
+                  所以 ip_code / last_op_code 都給完整原文 (不改成 diff、超過預算也不截斷)
+        """
         current_round = state.get('coder_revision_count', 0) + 1
         print(f"\n👨‍💻 Coder 正在實作... (第 {current_round} 次嘗試)")
 
@@ -212,23 +582,70 @@ class OfficeManager:
         t_filepath = state.get('t_filepath')
         it_code = self.file_ops.read(t_filepath) if p_filepath else ""
 
-        # 呼叫 Coder，給予錯誤訊息回饋
-        result = self.coder(
-            requirement=state['requirement'],
-            technical_spec=state['technical_spec'],
-            feedback=state.get('test_message'),
-            ip_code=ip_code,
-            last_op_code=last_op_code,
-            it_code=it_code
+        # 呼叫 Coder，給予錯誤訊息回饋 (上次的嘗試改成 diff、錯誤訊息只留失敗的測試)
+        inputs = self.context.assemble(
+            dict(
+                requirement=state['requirement'],
+                technical_spec=state['technical_spec'],
+                feedback=state.get('test_message'),
+                ip_code=ip_code,
+                last_op_code=last_op_code,
+                it_code=it_code
+            ),
+            previous=None if patching else {"last_op_code": "ip_code"},
+            feedback=["feedback"],
+            trim_order=["it_code", "feedback", "technical_spec"] if patching else
+                       ["last_op_code", "it_code", "feedback", "ip_code", "technical_spec"]
         )
-        
+        return self._with_loop_hint(state, "coder", inputs, "feedback")
+
+    @staticmethod
+    def _patching(state: OfficeState) -> bool:
+        """修正輪次 (已經寫過至少一版) 改成只輸出 patch；第一版本來就要從頭寫，Best-of-N 也一律整檔輸出"""
+        return config.CODER_PATCH_MODE and config.CODER_CANDIDATES <= 1 and state.get('coder_revision_count', 0) > 0
+
+    def _apply_patch(self, state: OfficeState, result: dspy.Prediction) -> str | None:
+        """
+        在本地套用 Coder 的 patch (以 patch_base 指定的版本為基準，套不上時再試另一個版本)
+        Returns: 修改後的程式碼；套不上或改壞語法時回傳 None (改為整檔重寫)
+        """
+        p_filepath, p_filepath_coder = state.get('p_filepath'), state.get('p_filepath_coder')
+        bases = {
+            "ip_code": self.file_ops.read(p_filepath) if p_filepath else "",
+            "last_op_code": self.file_ops.read(p_filepath_coder) if p_filepath_coder else "",
+        }
+        preferred = "last_op_code" if "last_op_code" in (result.patch_base or "") else "ip_code"
+        order = [preferred] + [name for name in bases if name != preferred]
+
+        error = None
+        for name in order:
+            base = clean_code_block(bases[name])
+            if not base:
+                continue
+            try:
+                code = apply_patch(base, result.op_patch or "", config.CODER_PATCH_FUZZY_THRESHOLD)
+                compile(code, p_filepath or "<patch>", "exec")
+            except (PatchError, SyntaxError) as e:
+                error = error or e
+                continue
+            print(f"    🩹 [Patch] 已套用 Coder 的修改 (基準：{name})")
+            self.metrics.record_patch(applied=True)
+            return code
+
+        print(f"    🩹 [Patch] 無法套用 ({error})，改為整檔重寫")
+        self.metrics.record_patch(applied=False)
+        return None
+
+    def _coder_done(self, state: OfficeState, op_code: str):
+        current_round = state.get('coder_revision_count', 0) + 1
+        p_filepath_coder = state.get('p_filepath_coder')
+
         # 存檔
-        self.file_ops.save(p_filepath_coder, result.op_code)
+        self.file_ops.save(p_filepath_coder, op_code)
         # 備份 (for debug)
-        self.file_ops.save(p_filepath_coder + f".{current_round}", result.op_code)
+        self.file_ops.save(p_filepath_coder + f".{current_round}", op_code)
 
         print("    -> 程式碼已生成。")
-        self.print_last_asking()
 
         state["coder_revision_count"] = current_round
         state["last_worker"] = "coder"
@@ -236,70 +653,337 @@ class OfficeManager:
         
         return state
 
+    def _best_of_n_coder(self, state: OfficeState, inputs: dict) -> str:
+        """
+        Best-of-N：同時請 N 位 Coder (不同溫度) 各寫一版，
+        每一版在自己的沙盒目錄平行跑測試，第一個 PASS 的勝出，其餘取消。
+        全部沒過時，優先挑 FAIL (至少能跑) 的版本，再來才是第一版。
+        """
+        n = config.CODER_CANDIDATES
+        temperatures = config.CODER_CANDIDATE_TEMPERATURES
+        print(f"    🎲 Best-of-{n}：平行生成 {n} 個候選版本...")
+        coder_lm = self._worker_lm(state, "coder")
+
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="coder-candidate")
+        # 每個候選各自複製一份 context，才能把用量記到目前的 node 上
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run, self._try_candidate, i, coder_lm.copy(temperature=temperatures[i % len(temperatures)]),
+                state, inputs, stop
+            )
+            for i in range(n)
+        ]
+
+        results = {}
+        winner = None
+        try:
+            for future in as_completed(futures):
+                index, op_code, status = future.result()
+                results[index] = (op_code, status)
+                print(f"    🎲 候選 #{index}: {status}")
+                if status == "PASS":
+                    winner = index
+                    break
+        finally:
+            # 通知其他候選不必再跑測試；尚未開始的直接取消 (進行中的 LLM 呼叫無法中斷，結果會被丟棄)
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if winner is None:
+            # 生成失敗 (LLM 錯誤) 的候選沒有程式碼可用
+            usable = [i for i, (op_code, _) in sorted(results.items()) if op_code is not None]
+            if not usable:
+                raise RuntimeError("❌ Best-of-N：所有候選版本都生成失敗")
+            failed = [i for i in usable if results[i][1] == "FAIL"]
+            winner = failed[0] if failed else usable[0]
+        print(f"    🏆 採用候選 #{winner}")
+        return results[winner][0]
+
+    def _try_candidate(self, index: int, lm: dspy.LM, state: OfficeState, inputs: dict,
+                       stop: threading.Event) -> tuple[int, str, str]:
+        """
+        生成一個候選版本，並在獨立的 playground 副本中測試
+        一個候選出錯 (LLM / 測試執行) 只算這個候選 ERROR，不影響其他候選
+        用量先記在候選自己的紀錄，勝負揭曉前完成的部分才併回目前 node
+        (勝負揭曉後 node 可能已經寫出，進行中的 LLM 呼叫無法中斷，其用量不計)
+        Returns: (編號, 程式碼 (生成失敗時為 None), 測試結果)
+        """
+        op_code = None
+        try:
+            with self.metrics.isolated(discard=stop):
+                op_code = self._call_agent("coder", self.coder, lm=lm, use_cache=False, **inputs).op_code
+            if stop.is_set():
+                return index, op_code, "CANCELLED"
+            with self.metrics.isolated(discard=stop):
+                return index, op_code, self._test_candidate(index, state, op_code)
+        except Exception as e:
+            print(f"    🎲 候選 #{index} 發生錯誤：{type(e).__name__}: {e}")
+            return index, op_code, "ERROR"
+
+    def _test_candidate(self, index: int, state: OfficeState, op_code: str) -> str:
+        p_filepath = state.get('p_filepath')
+        t_filepath = state.get('t_filepath')
+        # playground 中所有可 import 的 module (測試檔、相依模組、conftest 等) 都要帶進沙盒
+        workdir = self.file_ops.sync()
+        with tempfile.TemporaryDirectory(prefix=f"candidate{index}_") as sandbox_dir:
+            sandbox = Path(sandbox_dir)
+            for module in workdir.glob("*.py"):
+                if module.stem.isidentifier() and module.name != p_filepath:
+                    shutil.copyfile(module, sandbox / module.name)
+            (sandbox / p_filepath).write_text(clean_code_block(op_code), encoding="utf-8")
+
+            runner = TestRunner(
+                playground_dir=sandbox_dir,
+                pool=self.runner.pool,
+                timeout=self.runner.timeout,
+                preflight=self.runner.preflight is not None,
+                shards=self.runner.shards,
+                shard_min_tests=self.runner.shard_min_tests,
+                limits=self.runner.limits
+            )
+            with self.metrics.timed("test_seconds", count_field="test_runs"):
+                status, _ = runner.run(t_filepath)
+            self.metrics.record_test_usage(runner.last_result.usage)
+        return status
+
     def run_tests(self, state: OfficeState):
+        staged = self._stage_tests(state)
+        t_filepath = state.get('t_filepath')
+        if not t_filepath:
+            return {"test_result_status": "ERROR", "test_message": "No Test File"}
+
+        # ✅ 取得 status 和 message
+        with self.metrics.timed("test_seconds", count_field="test_runs"):
+            status, message = self.runner.run(t_filepath)
+        self.metrics.record_test_usage(self.runner.last_result.usage)
+        return self._tests_done(state, staged, status, message)
+
+    async def arun_tests(self, state: OfficeState):
+        staged = self._stage_tests(state)
+        t_filepath = state.get('t_filepath')
+        if not t_filepath:
+            return {"test_result_status": "ERROR", "test_message": "No Test File"}
+
+        with self.metrics.timed("test_seconds", count_field="test_runs"):
+            status, message = await self.runner.arun(t_filepath)
+        self.metrics.record_test_usage(self.runner.last_result.usage)
+        return self._tests_done(state, staged, status, message)
+
+    def _stage_tests(self, state: OfficeState) -> dict[str, bool]:
+        """
+        把本輪的新版本換上正式檔名
+        Returns: {檔名: 是否有備份} (測試結果出來後用來決定保留或還原)
+        """
         print("\n🏃 正在執行測試...")
         phase = state.get('phase')
         p_filepath = state.get('p_filepath')
         t_filepath = state.get('t_filepath')
-        is_p_filepath_bak = False
-        is_t_filepath_bak = False
+        # 本輪換上新版本的檔案: {檔名: 是否有備份}
+        staged = {}
+
+        def stage(src: str, dst: str):
+            staged[dst] = self.file_ops.stage(src, dst)
+
         if phase == "scaffold":
-            if self.file_ops.exists(p_filepath):
-                self.file_ops.backup(p_filepath)
-                is_p_filepath_bak = True
-            if self.file_ops.exists(t_filepath):
-                self.file_ops.backup(t_filepath)
-                is_t_filepath_bak = True
-
-            p_filepath_new = state.get('p_filepath_scaffolder')
-            t_filepath_new = state.get('t_filepath_scaffolder')
-            self.file_ops.copy(p_filepath_new, p_filepath)
-            self.file_ops.copy(t_filepath_new, t_filepath)
+            stage(state.get('p_filepath_scaffolder'), p_filepath)
+            stage(state.get('t_filepath_scaffolder'), t_filepath)
         elif phase == "qa_assertion":
-            if self.file_ops.exists(t_filepath):
-                self.file_ops.backup(t_filepath)
-                is_t_filepath_bak = True
-
-            t_filepath_new = state.get('t_filepath_qa')
-            self.file_ops.copy(t_filepath_new, t_filepath)
+            stage(state.get('t_filepath_qa'), t_filepath)
         elif phase == "coding":
-            if self.file_ops.exists(p_filepath):
-                self.file_ops.backup(p_filepath)
-                is_p_filepath_bak = True
+            stage(state.get('p_filepath_coder'), p_filepath)
 
-            p_filepath_new = state.get('p_filepath_coder')
-            self.file_ops.copy(p_filepath_new, p_filepath)
+        if t_filepath:
+            # 只把 pytest 需要的檔案落地 (記憶體模式下才有實際動作)
+            self.file_ops.sync()
+        return staged
 
-        if not t_filepath:
-            return {"test_result_status": "ERROR", "test_result": "No Test File"}
+    def _tests_done(self, state: OfficeState, staged: dict[str, bool], status: str, message: str):
+        phase = state.get('phase')
+        # 這一輪的產出是否被接受 (QA 階段要的是紅燈，FAIL 才是正確結果)
+        accepted = status == "PASS" or (phase == "qa_assertion" and status == "FAIL")
+        # 還原之前先記下這一輪產出的指紋
+        self._track_attempt(state, staged, status, message, accepted)
+        self._track_failures(state, accepted)
+        self._settle_cache(state.get('last_worker'), accepted)
+        if accepted and state.get('last_worker') == "scaffolder":
+            # 規格書能產出可用的骨架，才算通過驗收
+            self._settle_cache("architect", True)
+        for filename, has_backup in staged.items():
+            self.file_ops.settle(filename, has_backup, accepted)
 
-        # ✅ 取得 status 和 message
-        status, message = self.runner.run(t_filepath)
-        
         if status == "PASS":
             print("✅ 測試通過 (Green)!")
+        elif status == "FAIL":
+            print("🔴 測試斷言失敗")
+            print(message)
         else:
-            if is_p_filepath_bak:
-                self.file_ops.restore(p_filepath + ".bak")
-            else:
-                self.file_ops.unlink(p_filepath)
-            if is_t_filepath_bak:
-                self.file_ops.restore(t_filepath + ".bak")
-            else:
-                self.file_ops.unlink(t_filepath)
-
-            if status == "FAIL":
-                print("🔴 測試斷言失敗")
-                print(message)
-            else:
-                print("💥 測試執行錯誤 (Syntax/Import Error)")
-                print(message)
+            print("💥 測試執行錯誤 (Syntax/Import Error)")
+            print(message)
 
         state["test_result_status"] = status
-        state["test_result_message"] = message
+        state["test_message"] = message
+
+        return state
+
+    # --- Node 5: 效能關卡 (Perf Gate) ---
+    def perf_work(self, state: OfficeState):
+        """[Step 4] 測試全綠後量測效能，輸入規模一大就變很慢的實作退回 Coder (config.PERF_GATE)"""
+        inputs = self._bench_inputs(state)
+        if inputs is not None:
+            self._bench_written(state, self._call_agent("bench", self.bench, **inputs).ob_code)
+        self.file_ops.sync()
+        with self.metrics.timed("test_seconds", count_field="test_runs"):
+            result = self.runner.run_perf(self._b_filepath(state), **self._perf_options())
+        return self._perf_done(state, result)
+
+    async def aperf_work(self, state: OfficeState):
+        inputs = self._bench_inputs(state)
+        if inputs is not None:
+            self._bench_written(state, (await self._acall_agent("bench", self.bench, **inputs)).ob_code)
+        self.file_ops.sync()
+        with self.metrics.timed("test_seconds", count_field="test_runs"):
+            result = await self.runner.arun_perf(self._b_filepath(state), **self._perf_options())
+        return self._perf_done(state, result)
+
+    @staticmethod
+    def _b_filepath(state: OfficeState) -> str:
+        # 舊的 checkpoint 沒有 b_filepath
+        return state.get('b_filepath') or "bench_" + state['p_filepath']
+
+    @staticmethod
+    def _perf_options() -> dict:
+        return dict(
+            repeats=config.PERF_REPEATS,
+            max_exponent=config.PERF_MAX_EXPONENT,
+            tolerance=config.PERF_EXPONENT_TOLERANCE,
+            min_seconds=config.PERF_MIN_SECONDS,
+            timeout=config.PERF_TIMEOUT
+        )
+
+    def _bench_inputs(self, state: OfficeState) -> dict | None:
+        """需要 (重新) 撰寫 benchmark 時回傳 BenchmarkAgent 的輸入；沿用現有的 benchmark 時為 None"""
+        # 上一輪 benchmark 本身跑不起來，帶著錯誤訊息重寫
+        broken = state.get('last_worker') == "perf" and state.get('test_result_status') == "ERROR"
+        if self.file_ops.exists(self._b_filepath(state)) and not broken:
+            return None
+        print(f"\n⏱️ Perf QA 正在撰寫 benchmark... (第 {state.get('bench_revision_count', 0) + 1} 次嘗試)")
+        return dict(
+            requirement=state['requirement'],
+            technical_spec=state['technical_spec'],
+            ip_code=self.file_ops.read(state['p_filepath']),
+            error_feedback=state.get('test_message') if broken else ""
+        )
+
+    def _bench_written(self, state: OfficeState, ob_code: str) -> None:
+        current_round = state.get('bench_revision_count', 0) + 1
+        b_filepath = self._b_filepath(state)
+        self.file_ops.save(b_filepath, ob_code)
+        # 備份 (for debug)
+        self.file_ops.save(b_filepath + f".{current_round}", ob_code)
+        print("    -> Benchmark 已生成。")
+        state["bench_revision_count"] = current_round
+
+    def _perf_done(self, state: OfficeState, result: TestRunResult):
+        # benchmark 檔能跑 (不論效能是否達標) 才算通過驗收
+        self._settle_cache("bench", result.status != "ERROR")
+        if result.status == "PASS":
+            print("⚡ 效能在預算內!")
+        elif result.status == "FAIL":
+            print("🐢 效能未達標")
+        else:
+            print("💥 Benchmark 執行錯誤")
+        print(result.message)
 
+        state["perf_revision_count"] = state.get('perf_revision_count', 0) + 1
+        state["last_worker"] = "perf"
+        state["phase"] = "perf"
+        state["test_result_status"] = result.status
+        state["test_message"] = result.message
         return state
 
+    # --- 重試迴圈偵測 (Loop Detection) ---
+    LOOP_HINTS = {
+        "same_output": "⚠️ 你上一輪交出的程式碼與之前某一輪完全相同，而那一版已經被退回。請換一個不同的做法，不要重複同樣的寫法。",
+        "same_failure": "⚠️ 連續兩輪出現完全相同的錯誤，上一輪的修改沒有解決問題。請重新檢查錯誤的根本原因，換一個不同的做法。",
+    }
+
+    def _track_attempt(self, state: OfficeState, staged: dict[str, bool], status: str,
+                       message: str, accepted: bool) -> None:
+        """記錄這一輪產出 / 失敗訊號的指紋，並判斷是否與同一個 worker 之前的輪次重複"""
+        worker, phase = state.get('last_worker'), state.get('phase')
+        attempt = {
+            "worker": worker,
+            "phase": phase,
+            "output": code_fingerprint("\n".join(self.file_ops.read(f) for f in sorted(staged))),
+            "failure": failure_fingerprint(status, message),
+        }
+        attempts = list(state.get('attempt_fingerprints') or [])
+        previous = [a for a in attempts if a["worker"] == worker and a["phase"] == phase]
+        attempts.append(attempt)
+        state["attempt_fingerprints"] = attempts
+
+        repeat = None
+        if not accepted:
+            if any(a["output"] == attempt["output"] for a in previous):
+                repeat = "same_output"
+            elif previous and previous[-1]["failure"] == attempt["failure"]:
+                repeat = "same_failure"
+        state["repeat_kind"] = repeat
+        state["repeat_streak"] = state.get('repeat_streak', 0) + 1 if repeat else 0
+        if repeat:
+            print(f"    🔁 [Loop] {worker} 這一輪與之前重複 ({repeat}，連續 {state['repeat_streak']} 次)")
+
+    @staticmethod
+    def _repeating(state: OfficeState, worker: str) -> bool:
+        """這一輪是否是在重做上一輪重複的工作 (同一個 worker 被退回，且上一輪判定為重複)"""
+        return config.LOOP_DETECTION and bool(state.get('repeat_kind')) and state.get('last_worker') == worker
+
+    @staticmethod
+    def _track_failures(state: OfficeState, accepted: bool) -> None:
+        """記錄每個 worker 連續被退回的輪數 (通過就歸零)"""
+        worker = state.get('last_worker')
+        streaks = dict(state.get('failure_streaks') or {})
+        streaks[worker] = 0 if accepted else streaks.get(worker, 0) + 1
+        state["failure_streaks"] = streaks
+
+    def _worker_lm(self, state: OfficeState, worker: str) -> dspy.LM:
+        """
+        這一輪 worker 要用的 LM：
+        - 連續被退回 LLM_ESCALATE_AFTER 輪：升級到 LLM_ESCALATION_PROFILE 的 model
+        - 修自己上一輪的語法 / import 錯誤：有設定 <worker>_fix profile 時用它 (例如 qa_fix)
+        - 其他：這個 worker 的 profile (沒有設定時為辦公室預設的 LM)
+        - 重複時再改用較高溫度，避免同樣的輸入再生成同樣的東西
+        """
+        fixing = state.get('last_worker') == worker and state.get('test_result_status') == "ERROR"
+        streak = (state.get('failure_streaks') or {}).get(worker, 0)
+        if self.escalation_lm is not None and streak >= config.LLM_ESCALATE_AFTER:
+            lm = self.escalation_lm
+            print(f"    ⬆️ [Route] {worker} 連續 {streak} 輪被退回，升級到 {lm.model}")
+        elif fixing and f"{worker}_fix" in self.agent_lms:
+            lm = self.agent_lms[f"{worker}_fix"]
+        else:
+            lm = self.agent_lms.get(worker, self.lm)
+
+        if not self._repeating(state, worker):
+            return lm
+        print(f"    🔁 [Loop] 改用 temperature={config.LOOP_RETRY_TEMPERATURE} 並要求換個做法")
+        return lm.copy(temperature=config.LOOP_RETRY_TEMPERATURE)
+
+    def _with_loop_hint(self, state: OfficeState, worker: str, inputs: dict, feedback_key: str) -> dict:
+        """重複時在錯誤回饋最前面加上「換個做法」的提示"""
+        if self._repeating(state, worker):
+            hint = self.LOOP_HINTS[state['repeat_kind']]
+            inputs[feedback_key] = f"{hint}\n\n{inputs.get(feedback_key) or ''}".strip()
+        return inputs
+
+    def _stuck(self, state: OfficeState) -> bool:
+        """連續重複達上限：剩下的重試次數多半也是白費，提早結束"""
+        if not config.LOOP_DETECTION or state.get('repeat_streak', 0) < config.LOOP_MAX_REPEATS:
+            return False
+        print(f"🔁 連續 {state['repeat_streak']} 輪產出 / 錯誤重複 ({state.get('repeat_kind')})，停止重試。")
+        return True
+
     # --- 流程邏輯 (Router) ---
     def check_results(self, state: OfficeState):
         status = state.get('test_result_status')
@@ -316,6 +1000,8 @@ class OfficeManager:
                 if scaffolder_revision >= 2:
                     print("⚠️ 達到最大重試次數，停止工作。")
                     return "end"
+                if self._stuck(state):
+                    return "end"
                 print("💥 骨架驗證失敗 (Import/Syntax Error)！退回重搭。")
                 return "to_scaffolder"
             print("🔵 骨架驗證通過！交給 QA 寫斷言。")
@@ -339,12 +1025,34 @@ class OfficeManager:
                 if qa_revision >= 5:
                     print("⚠️ 達到最大重試次數，停止工作。")
                     return "end"
+                if self._stuck(state):
+                    return "end"
                 print("💥 測試碼語法錯誤！退回 QA。")
                 return "to_qa"
 
             print("🔴 測試如預期失敗 (Red Light)！交給 Coder 實作。")
             return "to_coder"
 
+        # ------------------------------------------------
+        # ⏱️ Phase 4: Perf (效能驗收，config.PERF_GATE)
+        # 目標：PASS。FAIL 代表太慢，把量測數字交給 Coder 優化；ERROR 代表 benchmark 本身寫錯。
+        # ------------------------------------------------
+        if phase == "perf":
+            if status == "PASS":
+                return "end"
+            if status == "ERROR":
+                if state.get('bench_revision_count', 0) >= 2:
+                    print("⚠️ Benchmark 無法執行，停止工作。")
+                    return "end"
+                print("💥 Benchmark 本身有錯！退回重寫。")
+                return "to_perf"
+            if state.get('perf_revision_count', 0) >= config.PERF_MAX_ROUNDS or \
+                    state.get('coder_revision_count', 0) >= 5:
+                print("⚠️ 達到最大重試次數，停止工作。")
+                return "end"
+            print("🐢 效能未達標，退回給 Coder 優化。")
+            return "to_coder"
+
         # ------------------------------------------------
         # 🟢 Phase 3: Coding (實作驗收)
         # 目標：必須 PASS。
@@ -355,24 +1063,97 @@ class OfficeManager:
                 if code_revision >= 5:
                     print("⚠️ 達到最大重試次數，停止工作。")
                     return "end"
+                if self._stuck(state):
+                    return "end"
                 print("🟠 實作失敗，退回給 Coder 修正。")
                 return "to_coder" # 繼續修
+            if config.PERF_GATE:
+                print("🟢 測試全綠！進入效能關卡。")
+                return "to_perf"
             return "end"
 
         raise NotImplementedError(f"Unknown phase: {phase}")
 
+    # --- 量測 (Metrics) ---
+    # 每個 node 對應的 round 計數欄位 (runner 的 round 跟著剛交件的 worker)
+    ROUND_KEYS = {
+        "scaffolder": "scaffolder_revision_count",
+        "qa": "qa_revision_count",
+        "coder": "coder_revision_count",
+        "perf": "perf_revision_count",
+    }
+
+    def _instrument(self, node: str, fn, afn) -> "RunnableLambda":
+        """
+        包裝 node method，記錄該 node 在這一輪的 token、成本與耗時，並在完成後存 checkpoint
+        fn / afn: 同一個 node 的同步與 async 版本 (graph.invoke 用 fn，graph.ainvoke 用 afn)
+        """
+        def wrapper(state: OfficeState):
+            with self.metrics.node(node) as record:
+                result = fn(state)
+                self._finish_node(node, result, record)
+            return self._checkpoint(node, state, result)
+
+        async def awrapper(state: OfficeState):
+            with self.metrics.node(node) as record:
+                result = await afn(state)
+                self._finish_node(node, result, record)
+            return self._checkpoint(node, state, result)
+
+        from langchain_core.runnables import RunnableLambda
+        return RunnableLambda(wrapper, afunc=awrapper, name=node)
+
+    def _finish_node(self, node: str, result: dict, record: NodeMetrics) -> None:
+        round_key = self.ROUND_KEYS.get(node if node != "runner" else result.get("last_worker"))
+        record.round = result.get(round_key, 0) if round_key else 1
+
+    def _checkpoint(self, node: str, state: OfficeState, result: dict) -> dict:
+        if self.checkpoints:
+            # 先讓 playground 跟上 (記憶體模式)，checkpoint 才不會指向還沒寫回的檔案
+            self.file_ops.flush()
+            self.checkpoints.save(self.run_id, node, {**state, **result})
+        return result
+
+    # --- 接續執行 (Resume) ---
+    def route_entry(self, state: OfficeState):
+        """Graph 入口：全新執行從 Architect 開始；接續執行則走最後完成的 node 原本的下一步"""
+        if self.resume_after is None:
+            return "to_architect"
+        if self.resume_after == "architect":
+            return "to_scaffolder"
+        if self.resume_after in ("runner", "perf"):
+            return self.check_results(state)
+        # scaffolder / qa / coder 交件後都是跑測試
+        return "to_runner"
+
     # --- 建構圖表 (Graph Builder) ---
     def compile_graph(self):
+        """編譯 graph；同一個 graph 可以用 invoke (同步) 或 ainvoke (async，單一 event loop 可同時跑多個 run)"""
+        # langgraph 只有建圖時才需要 (不跑 graph 的指令不必付這個 import 成本)
+        from langgraph.graph import StateGraph, END
+
         workflow = StateGraph(OfficeState)
         
-        workflow.add_node("architect", self.architect_work)
-        workflow.add_node("scaffolder", self.scaffolder_work)
-        workflow.add_node("qa", self.qa_work)
-        workflow.add_node("coder", self.coder_work)
+        workflow.add_node("architect", self._instrument("architect", self.architect_work, self.aarchitect_work))
+        workflow.add_node("scaffolder", self._instrument("scaffolder", self.scaffolder_work, self.ascaffolder_work))
+        workflow.add_node("qa", self._instrument("qa", self.qa_work, self.aqa_work))
+        workflow.add_node("coder", self._instrument("coder", self.coder_work, self.acoder_work))
 
-        workflow.add_node("runner", self.run_tests)
+        workflow.add_node("runner", self._instrument("runner", self.run_tests, self.arun_tests))
+        workflow.add_node("perf", self._instrument("perf", self.perf_work, self.aperf_work))
         
-        workflow.set_entry_point("architect")
+        workflow.set_conditional_entry_point(
+            self.route_entry,
+            {
+                "to_architect": "architect",
+                "to_scaffolder": "scaffolder",
+                "to_runner": "runner",
+                "to_qa": "qa",
+                "to_coder": "coder",
+                "to_perf": "perf",
+                "end": END
+            }
+        )
 
         workflow.add_edge("architect", "scaffolder")
         workflow.add_edge("scaffolder", "runner")
@@ -384,6 +1165,17 @@ class OfficeManager:
                 "to_scaffolder": "scaffolder", # 骨架壞掉
                 "to_qa": "qa",                 # 骨架好了，去寫測試
                 "to_coder": "coder",           # 測試紅燈，去寫Code
+                "to_perf": "perf",             # 測試全綠，量效能
+                "end": END
+            }
+        )
+
+        workflow.add_conditional_edges(
+            "perf",
+            self.check_results,
+            {
+                "to_coder": "coder",           # 太慢，退回優化
+                "to_perf": "perf",             # benchmark 本身壞掉，重寫
                 "end": END
             }
         )
@@ -0,0 +1,186 @@
+import ast
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+import dspy
+from src.agents.architect_agent import ProjectArchitectAgent
+from src.config import config
+from src.office.office_manager import OfficeManager
+from src.utils.schema import ModuleSpec
+
+class ProjectManager:
+    """
+    多模組專案：Architect 先把需求拆成模組相依圖，
+    每個模組各自交給一間 OfficeManager 跑完 scaffold → QA → coder，
+    相依的模組都完成後才開工，彼此獨立的模組同時進行 (總耗時取決於相依圖的深度，而非模組數)。
+    """
+
+    def __init__(self, lm: dspy.LM, playground_dir: str | None = None):
+        self.lm = lm
+        self.architect = ProjectArchitectAgent()
+        if playground_dir is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            playground_dir = f"playground/project_{timestamp}"
+        # 專案根目錄放最終交付的模組，每個模組的工作目錄在 <root>/<module>/
+        self.project_dir = Path(playground_dir)
+        self.project_dir.mkdir(parents=True, exist_ok=True)
+
+    async def aplan(self, requirement: str, augment_context: str | None) -> list[ModuleSpec]:
+        print("\n🗺️ Architect 正在拆分模組...")
+
+        async def run():
+            with dspy.context(lm=self.lm):
+                return await self.architect.acall(requirement=requirement, augment_context=augment_context)
+
+        # 跟各模組的辦公室共用同一份 LLM 額度
+        result, _, _ = await config.llm_governor().acall(run, priority=config.LLM_PRIORITIES.get("architect", 0))
+        return self.normalize(result.modules)
+
+    @staticmethod
+    def normalize(modules: list[ModuleSpec]) -> list[ModuleSpec]:
+        """統一檔名 (只留檔名、補 .py)，去掉專案外 / 自己對自己的相依"""
+        def filename(path: str) -> str:
+            name = Path(path.strip()).name
+            return name if name.endswith(".py") else f"{name}.py"
+
+        known = {filename(m.filepath) for m in modules}
+        if len(known) != len(modules):
+            raise ValueError("❌ 模組檔名重複")
+        normalized = []
+        for module in modules:
+            name = filename(module.filepath)
+            depends_on = []
+            for dep in module.depends_on:
+                dep = filename(dep)
+                if dep == name or dep in depends_on:
+                    continue
+                if dep not in known:
+                    # 第三方 / 標準函式庫，不歸這個專案管
+                    print(f"    (略過) {name} 相依的 {dep} 不是專案內的模組")
+                    continue
+                depends_on.append(dep)
+            normalized.append(module.model_copy(update={"filepath": name, "depends_on": depends_on}))
+        return normalized
+
+    @staticmethod
+    def topological_levels(modules: list[ModuleSpec]) -> list[list[str]]:
+        """
+        依相依關係分層：第 0 層沒有相依，第 k 層只相依前 k-1 層
+        同一層的模組彼此獨立，可以同時開發；有循環相依時丟出 ValueError
+        """
+        remaining = {m.filepath: set(m.depends_on) for m in modules}
+        levels, done = [], set()
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if deps <= done)
+            if not ready:
+                raise ValueError(f"❌ 模組之間有循環相依：{', '.join(sorted(remaining))}")
+            levels.append(ready)
+            done.update(ready)
+            for name in ready:
+                del remaining[name]
+        return levels
+
+    @staticmethod
+    def interface(code: str) -> str:
+        """只留下簽章與 docstring (給相依它的模組看，省 token)"""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return code
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                docstring = ast.get_docstring(node)
+                node.body = [ast.Expr(ast.Constant(docstring))] if docstring else []
+                node.body.append(ast.Expr(ast.Constant(...)))
+        return ast.unparse(ast.fix_missing_locations(tree))
+
+    async def arun(self, requirement: str, augment_context: str | None = None) -> list[dict]:
+        """
+        拆模組並依相依順序開發，回傳每個模組的結果摘要
+        相依的模組失敗時，下游的模組不會開工 (標記為 skipped)
+        """
+        modules = await self.aplan(requirement, augment_context)
+        levels = self.topological_levels(modules)
+        print(f"🗺️ 共 {len(modules)} 個模組，相依深度 {len(levels)}：")
+        for depth, names in enumerate(levels):
+            print(f"    L{depth}: {', '.join(names)}")
+
+        specs = {m.filepath: m for m in modules}
+        semaphore = asyncio.Semaphore(config.PROJECT_MAX_PARALLEL_MODULES)
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def develop(module: ModuleSpec) -> dict:
+            # 等所有相依的模組完成 (不必等整層，上游一好就開工)
+            deps = [await tasks[dep] for dep in module.depends_on]
+            failed = [dep["filepath"] for dep in deps if not dep["ok"]]
+            if failed:
+                print(f"⏭️ [{module.filepath}] 相依的 {', '.join(failed)} 沒有完成，略過")
+                return {"filepath": module.filepath, "ok": False, "skipped": True, "blocked_by": failed}
+            async with semaphore:
+                return await self._run_module(module, requirement, augment_context, deps)
+
+        # 依拓撲順序建立 task，上游的 task 一定先存在
+        for names in levels:
+            for name in names:
+                tasks[name] = asyncio.create_task(develop(specs[name]))
+        return [await tasks[name] for names in levels for name in names]
+
+    async def _run_module(self, module: ModuleSpec, requirement: str, augment_context: str | None,
+                          deps: list[dict]) -> dict:
+        started = time.perf_counter()
+        record = {"filepath": module.filepath, "depends_on": module.depends_on}
+        print(f"\n📦 [{module.filepath}] 開工")
+        files = {name: code for dep in deps for name, code in dep["files"].items()}
+
+        try:
+            # 每個模組使用自己的 LM 副本 (history 與設定互不干擾)
+            manager = OfficeManager(self.lm.copy(), playground_dir=str(self.project_dir / Path(module.filepath).stem))
+            # 相依模組 (含間接相依) 的成品放進工作目錄，測試與實作都 import 得到
+            for filename, dep_code in files.items():
+                manager.file_ops.save(filename, dep_code)
+            graph = manager.compile_graph()
+
+            try:
+                final_state = await graph.ainvoke({
+                    "requirement": self._module_requirement(module, requirement, deps),
+                    "augment_context": augment_context,
+                    "p_filepath": module.filepath,
+                    "qa_revision_count": 0,
+                    "coder_revision_count": 0
+                })
+                ok = OfficeManager.succeeded(final_state)
+                code = manager.file_ops.read(module.filepath) if ok else ""
+            finally:
+                manager.close()
+
+            if ok:
+                (self.project_dir / module.filepath).write_text(code, encoding="utf-8")
+            record.update({
+                "ok": ok,
+                "code": code,
+                # 下游模組需要的所有檔案 (自己 + 自己的相依)
+                "files": {**files, module.filepath: code},
+                "phase": final_state.get("phase"),
+                "test_result_status": final_state.get("test_result_status"),
+                "coder_revision_count": final_state.get("coder_revision_count", 0),
+                "metrics": manager.metrics.summary()["TOTAL"],
+            })
+        except Exception as e:
+            # 一個模組出錯不影響其他獨立的模組 (下游會被標記為 skipped)
+            record.update({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+        record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        print(f"{'✅' if record['ok'] else '❌'} [{module.filepath}] 完成 ({record['elapsed_seconds']}s)")
+        return record
+
+    def _module_requirement(self, module: ModuleSpec, requirement: str, deps: list[dict]) -> str:
+        parts = [
+            f"請實作模組 {module.filepath}：{module.requirement}",
+            f"(整體專案需求：{requirement})",
+        ]
+        if deps:
+            parts.append("可直接 import 的相依模組 (已完成並通過測試，不要重新實作)：")
+            for dep in deps:
+                parts.append(f"```python\n# {dep['filepath']}\n{self.interface(dep['code'])}\n```")
+        return "\n\n".join(parts)
@@ -16,13 +16,26 @@ class OfficeState(TypedDict):
     t_filepath_scaffolder: Optional[str]
     t_filepath_qa: Optional[str]
     p_filepath_coder: Optional[str]
+    # 效能關卡 (config.PERF_GATE) 的 benchmark 檔
+    b_filepath: Optional[str]
 
     scaffolder_revision_count: int
     qa_revision_count: int
     coder_revision_count: int
+    # 效能關卡：benchmark 執行次數、benchmark 檔重寫次數
+    perf_revision_count: int
+    bench_revision_count: int
+    # 每個 worker 連續被退回的輪數 (達 config.LLM_ESCALATE_AFTER 後改用較強的 model)
+    failure_streaks: dict[str, int]
 
     test_result_status: Optional[str] # "PASS" | "FAIL" | "ERROR"
     test_message: Optional[str]
 
     next_step: str
-    last_worker: str
\ No newline at end of file
+    last_worker: str
+
+    # 重試迴圈偵測：每一輪產出與失敗訊號的指紋 ({worker, phase, output, failure})，
+    # 以及這一輪是否與之前重複 ("same_output" | "same_failure") 與連續重複的次數
+    attempt_fingerprints: list[dict]
+    repeat_kind: Optional[str]
+    repeat_streak: int
\ No newline at end of file
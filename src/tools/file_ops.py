@@ -1,7 +1,27 @@
+from functools import wraps
 from pathlib import Path
+import atexit
+import os
 import shutil
+import tempfile
+import threading
+import time
+from src.utils.metrics import MetricsCollector
 from src.utils.parsers import clean_code_block
 
+def _timed_io(method):
+    """把檔案 I/O 耗時累加到目前 node 的 metrics 紀錄"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            record = MetricsCollector.current()
+            if record is not None:
+                record.add(file_io_seconds=time.perf_counter() - started)
+    return wrapper
+
 class FileOps:
     """
     檔案操作工具
@@ -13,6 +33,22 @@ class FileOps:
         # 確保目錄存在
         self.base_dir.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def workdir(self) -> Path:
+        """pytest 實際執行的目錄 (磁碟模式就是 playground 本身)"""
+        return self.base_dir
+
+    def sync(self, filenames: list[str] | None = None) -> Path:
+        """確保 pytest 需要的檔案已在 workdir (磁碟模式下檔案本來就在，不需動作)"""
+        return self.workdir
+
+    def flush(self) -> None:
+        """把尚未落地的檔案寫回 playground (磁碟模式下不需動作)"""
+
+    def close(self) -> None:
+        self.flush()
+
+    @_timed_io
     def save(self, filename: str, content: str) -> str:
         # ✅ 自動清洗 Markdown 標記
         clean_content = clean_code_block(content)
@@ -31,6 +67,7 @@ class FileOps:
         print(f"💾 [System] 檔案已儲存: {file_path}")
         return str(file_path)
 
+    @_timed_io
     def read(self, filename: str) -> str:
         """讀取檔案內容"""
         file_path = self.base_dir / filename
@@ -41,6 +78,7 @@ class FileOps:
         with open(file_path, "r", encoding="utf-8") as f:
             return f.read()
         
+    @_timed_io
     def rename(self, src: str, dst: str) -> None:
         """重新命名檔案"""
         src_path = self.base_dir / src
@@ -52,14 +90,16 @@ class FileOps:
         src_path.rename(dst_path)
         print(f"RENAMED {src_path} -> {dst_path}")
 
+    @_timed_io
     def backup(self, filename: str) -> None:
-        """備份檔案 (副檔名改為 .bak)"""
+        """備份檔案 (檔名加上 .bak，例如 calc.py -> calc.py.bak，與 restore 對應)"""
         file_path = self.base_dir / filename
         if not file_path.exists():
             return
         
-        file_path.replace(file_path.with_suffix(".bak"))
+        file_path.replace(file_path.with_name(file_path.name + ".bak"))
     
+    @_timed_io
     def restore(self, filename: str) -> None:
         """恢復檔案 (副檔名改回原來的)"""
         file_path = self.base_dir / filename
@@ -68,11 +108,13 @@ class FileOps:
         
         file_path.replace(file_path.with_suffix(""))
 
+    @_timed_io
     def exists(self, filename: str) -> bool:
         """檢查檔案是否存在"""
         file_path = self.base_dir / filename
         return file_path.exists()
     
+    @_timed_io
     def copy(self, src: str, dst: str) -> None:
         """複製檔案"""
         src_path = self.base_dir / src
@@ -84,6 +126,32 @@ class FileOps:
         shutil.copy(src_path, dst_path)
         print(f"Copied {src_path} -> {dst_path}")
 
+    def stage(self, src: str, dst: str) -> bool:
+        """
+        把 src 換上 dst，原本的 dst 備份成 .bak (測試結果出來後交給 settle 保留或還原)
+        .bak 已存在代表上次換上後還沒驗收就中斷了 (例如接續執行)：.bak 才是驗收過的版本，
+        現在的 dst 是沒驗收的半成品，不能拿它蓋掉 .bak
+        Returns: 是否有備份
+        """
+        if self.exists(dst + ".bak"):
+            self.copy(src, dst)
+            return True
+        has_backup = self.exists(dst)
+        if has_backup:
+            self.backup(dst)
+        self.copy(src, dst)
+        return has_backup
+
+    def settle(self, dst: str, has_backup: bool, accepted: bool) -> None:
+        """stage 的收尾：接受就刪掉備份，否則換回備份 (沒有備份就刪掉新版本)"""
+        if accepted:
+            self.unlink(dst + ".bak")
+        elif has_backup:
+            self.restore(dst + ".bak")
+        else:
+            self.unlink(dst)
+
+    @_timed_io
     def unlink(self, filename: str) -> None:
         """刪除檔案"""
         file_path = self.base_dir / filename
@@ -91,4 +159,183 @@ class FileOps:
             return
         
         file_path.unlink(missing_ok=True)
-        print(f"Deleted {file_path}")
\ No newline at end of file
+        print(f"Deleted {file_path}")
+
+class MemoryFileOps(FileOps):
+    """
+    記憶體版的 FileOps
+    playground 的檔案都放在記憶體，跑測試前只把 pytest 需要的 module 寫到暫存目錄 (workdir)，
+    debug 用的備份 (.N / .json / .spec) 等到結束時 (或程式異常結束時) 一次批次寫回 playground，
+    避免每一輪大量的小檔案寫入、rename 與刪除。
+    """
+
+    def __init__(self, base_dir: str = "playground"):
+        super().__init__(base_dir)
+        self._files: dict[str, str] = {}
+        # 自上次 flush 以來被修改 / 刪除的檔案
+        self._dirty: set[str] = set()
+        self._deleted: set[str] = set()
+        # 已寫到 workdir 的內容，內容沒變就不重寫
+        self._materialized: dict[str, str] = {}
+        self._scratch = Path(tempfile.mkdtemp(prefix="playground_"))
+        self._lock = threading.RLock()
+        # 程式異常結束時也要把成果寫回
+        atexit.register(self.close)
+
+    @property
+    def workdir(self) -> Path:
+        return self._scratch
+
+    def _load(self, filename: str) -> str | None:
+        """記憶體中沒有時，從 playground 讀進來 (例如接續先前的執行)"""
+        if filename in self._files:
+            return self._files[filename]
+        if filename in self._deleted:
+            return None
+        file_path = self.base_dir / filename
+        if not file_path.is_file():
+            return None
+        self._files[filename] = file_path.read_text(encoding="utf-8")
+        return self._files[filename]
+
+    def _put(self, filename: str, content: str) -> None:
+        self._files[filename] = content
+        self._dirty.add(filename)
+        self._deleted.discard(filename)
+
+    def _drop(self, filename: str) -> None:
+        self._files.pop(filename, None)
+        self._dirty.discard(filename)
+        self._deleted.add(filename)
+
+    @_timed_io
+    def save(self, filename: str, content: str) -> str:
+        clean_content = clean_code_block(content)
+
+        if not filename:
+            print("⚠️ [FileOps] 警告：檔名為空，跳過存檔")
+            return ""
+
+        with self._lock:
+            self._put(filename, clean_content)
+        print(f"💾 [Memory] 檔案已暫存: {filename}")
+        return str(self.base_dir / filename)
+
+    @_timed_io
+    def read(self, filename: str) -> str:
+        with self._lock:
+            return self._load(filename) or ""
+
+    @_timed_io
+    def rename(self, src: str, dst: str) -> None:
+        with self._lock:
+            content = self._load(src)
+            if content is None:
+                return
+            self._put(dst, content)
+            self._drop(src)
+
+    @_timed_io
+    def backup(self, filename: str) -> None:
+        with self._lock:
+            content = self._load(filename)
+            if content is None:
+                return
+            self._put(filename + ".bak", content)
+            self._drop(filename)
+
+    @_timed_io
+    def restore(self, filename: str) -> None:
+        with self._lock:
+            content = self._load(filename)
+            if content is None:
+                return
+            self._put(str(Path(filename).with_suffix("")), content)
+            self._drop(filename)
+
+    @_timed_io
+    def exists(self, filename: str) -> bool:
+        with self._lock:
+            return self._load(filename) is not None
+
+    @_timed_io
+    def copy(self, src: str, dst: str) -> None:
+        with self._lock:
+            content = self._load(src)
+            if content is None:
+                return
+            self._put(dst, content)
+
+    @_timed_io
+    def unlink(self, filename: str) -> None:
+        with self._lock:
+            if self._load(filename) is None:
+                return
+            self._drop(filename)
+
+    @_timed_io
+    def sync(self, filenames: list[str] | None = None) -> Path:
+        """
+        把 pytest 需要的檔案寫到 workdir
+        filenames 為 None 時，寫入所有可被 import 的 module (檔名是合法識別字的 .py，
+        不含 .coder.py / .bak / .N 等備份)，包含還沒讀進記憶體的 playground 檔案 (例如接續執行)；
+        workdir 中已不存在的檔案會被移除。
+        """
+        with self._lock:
+            if filenames is None:
+                on_disk = {path.name for path in self.base_dir.glob("*.py")} - self._deleted
+                filenames = sorted(name for name in set(self._files) | on_disk
+                                   if name.endswith(".py") and Path(name).stem.isidentifier())
+                stale = set(self._materialized) - set(filenames)
+            else:
+                stale = {name for name in filenames if self._load(name) is None}
+
+            for name in stale:
+                (self._scratch / name).unlink(missing_ok=True)
+                self._materialized.pop(name, None)
+
+            for name in filenames:
+                content = self._load(name)
+                if content is None or self._materialized.get(name) == content:
+                    continue
+                target = self._scratch / name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_text(content, encoding="utf-8")
+                self._materialized[name] = content
+        return self._scratch
+
+    @_timed_io
+    def flush(self) -> None:
+        """
+        一次批次寫回 playground：先把所有變更寫進暫存目錄，再逐一 os.replace 到定位
+        (每個檔案的替換都是 atomic，不會留下寫到一半的檔案)
+        """
+        with self._lock:
+            if not self._dirty and not self._deleted:
+                return
+
+            staging = Path(tempfile.mkdtemp(prefix=".flush_", dir=self.base_dir))
+            try:
+                for name in self._dirty:
+                    staged = staging / name
+                    staged.parent.mkdir(parents=True, exist_ok=True)
+                    staged.write_text(self._files[name], encoding="utf-8")
+
+                for name in self._dirty:
+                    target = self.base_dir / name
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(staging / name, target)
+                for name in self._deleted:
+                    (self.base_dir / name).unlink(missing_ok=True)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+            print(f"💾 [Memory] 已批次寫回 {len(self._dirty)} 個檔案到 {self.base_dir}")
+            self._dirty.clear()
+            self._deleted.clear()
+
+    def close(self) -> None:
+        # 已經正常收工就不必等程式結束再做一次 (也讓這個實例可以被回收)
+        atexit.unregister(self.close)
+        self.flush()
+        shutil.rmtree(self._scratch, ignore_errors=True)
@@ -0,0 +1,145 @@
+import importlib
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# benchmark 檔的格式 (由 BenchmarkAgent 產生):
+#   SIZES = [1000, 2000, 4000, 8000]            # 輸入規模，由小到大
+#   EXPECTED_EXPONENT = {"bench_sort": 1}       # (可選) 預期的複雜度次方，O(n) = 1、O(n^2) = 2
+#   def bench_sort(n):                          # 準備規模 n 的輸入 (不計時)，回傳要計時的零參數函式
+#       data = list(range(n, 0, -1))
+#       return lambda: sort_items(data)
+
+@dataclass
+class BenchmarkResult:
+    """一個 benchmark 在各輸入規模下的計時 (每次呼叫的秒數，重複 repeats 次)"""
+    name: str
+    sizes: list[int]
+    samples: list[list[float]]
+    expected_exponent: float | None = None
+
+    @property
+    def medians(self) -> list[float]:
+        return [statistics.median(s) for s in self.samples]
+
+    @property
+    def exponent(self) -> float:
+        """log(時間) 對 log(n) 的斜率：1 ≈ 線性、2 ≈ 平方 (以中位數計算)"""
+        return _slope(self.sizes, self.medians)
+
+    @property
+    def best_case_exponent(self) -> float:
+        """以每個規模的最快一次計算的斜率 (較不受雜訊影響)"""
+        return _slope(self.sizes, [min(s) for s in self.samples])
+
+    def describe(self) -> str:
+        points = ", ".join(f"n={n}: {_format_seconds(t)}" for n, t in zip(self.sizes, self.medians))
+        return f"{self.name}: 成長次方 ≈ {self.exponent:.2f} (最快一次 {self.best_case_exponent:.2f}) [{points}]"
+
+@dataclass
+class PerfReport:
+    """一次 benchmark 執行的結果"""
+    benchmarks: list[BenchmarkResult] = field(default_factory=list)
+
+    def regressions(self, max_exponent: float, tolerance: float, min_seconds: float) -> list[BenchmarkResult]:
+        """
+        超出預算的 benchmark：中位數與最快一次算出的次方都超過預算才算 (避免單次雜訊誤判)
+        預算 = benchmark 宣告的預期次方 + tolerance (沒宣告時為 max_exponent)；
+        最大規模仍快於 min_seconds 的不判定 (太快，量不準也不重要)
+        """
+        slow = []
+        for bench in self.benchmarks:
+            budget = bench.expected_exponent + tolerance if bench.expected_exponent is not None else max_exponent
+            if bench.medians[-1] < min_seconds:
+                continue
+            if bench.exponent > budget and bench.best_case_exponent > budget:
+                slow.append(bench)
+        return slow
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PerfReport":
+        return cls([BenchmarkResult(**b) for b in data["benchmarks"]])
+
+def _slope(sizes: list[int], seconds: list[float]) -> float:
+    """最小平方法擬合 log-log 直線的斜率"""
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(max(t, 1e-12)) for t in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    if denominator == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / denominator
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}µs"
+
+# ---------------------------------------------------------
+# 子行程端 (python perf.py <limits JSON> <輸出檔> <benchmark 模組> <repeats>)
+# ---------------------------------------------------------
+
+def _time_call(fn, repeats: int, min_batch_seconds: float = 0.02) -> list[float]:
+    """先校準一批要呼叫幾次 (太快的函式單次計時量不準)，再重複 repeats 批，回傳每次呼叫的秒數"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_batch_seconds or number >= 1_000_000:
+            break
+        number *= 10
+
+    samples = [elapsed / number]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+def run_benchmarks(module_name: str, repeats: int) -> dict:
+    module = importlib.import_module(module_name)
+    sizes = sorted(int(n) for n in getattr(module, "SIZES"))
+    if len(sizes) < 2:
+        raise ValueError("SIZES 至少要有兩個不同的輸入規模")
+    expected = getattr(module, "EXPECTED_EXPONENT", {}) or {}
+
+    benchmarks = []
+    for name in sorted(dir(module)):
+        bench = getattr(module, name)
+        if not name.startswith("bench_") or not callable(bench):
+            continue
+        samples = [_time_call(bench(n), repeats) for n in sizes]
+        benchmarks.append({
+            "name": name,
+            "sizes": sizes,
+            "samples": samples,
+            "expected_exponent": expected.get(name),
+        })
+    if not benchmarks:
+        raise ValueError("找不到任何 bench_ 開頭的函式")
+    return {"benchmarks": benchmarks}
+
+def main() -> None:
+    limits_json, output_path, module_name, repeats = sys.argv[1:5]
+    # 以檔案路徑執行時 sys.path[0] 是本目錄：先借用它載入 sandbox 套用資源上限，
+    # 再換成 cwd (playground)，之後 import 的都是生成的程式碼
+    import sandbox
+    sandbox.apply_limits(sandbox.ResourceLimits(**json.loads(limits_json)))
+    sys.path[0] = os.getcwd()
+    sys.modules.pop("sandbox", None)
+
+    result = run_benchmarks(module_name, int(repeats))
+    Path(output_path).write_text(json.dumps(result), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import ast
+import importlib.util
+from pathlib import Path
+
+class PreflightChecker:
+    """
+    啟動 pytest 前的靜態檢查 (in-process，毫秒等級)
+    只抓「pytest 一定會在收集階段就 ERROR」的情況：
+    - 測試檔或它 import 的本地模組有語法錯誤
+    - 模組層級 import 的套件 / 模組找不到
+    - from 本地模組 import 的名稱在該模組中不存在
+    判斷不了的情況一律放行，交給 pytest 決定。
+    """
+
+    def __init__(self, search_paths: list[Path]):
+        # 本地模組的搜尋順序 (與 pytest 子行程的 PYTHONPATH 一致)
+        self.search_paths = [Path(p) for p in search_paths]
+
+    def check(self, test_filename: str) -> str | None:
+        """Returns: 錯誤說明 (格式仿照 Python 的例外訊息)；沒發現問題時為 None"""
+        test_path = self.search_paths[0] / test_filename
+        return self._check_module(test_path, test_filename, visited=set())
+
+    def _check_module(self, path: Path, display_name: str, visited: set[Path]) -> str | None:
+        if path in visited:
+            return None
+        visited.add(path)
+
+        tree, error = self._parse(path, display_name)
+        if error:
+            return error
+
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    error = self._check_import(alias.name, None, display_name, visited)
+                    if error:
+                        return error
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [alias.name for alias in node.names if alias.name != "*"]
+                error = self._check_import(node.module, names, display_name, visited)
+                if error:
+                    return error
+        return None
+
+    def _check_import(self, module: str, names: list[str] | None, importer: str,
+                      visited: set[Path]) -> str | None:
+        local = self._find_local(module)
+        if local is None:
+            top = module.split(".")[0]
+            if self._find_local(top) is not None:
+                return f"{importer}: ModuleNotFoundError: No module named '{module}'"
+            # namespace package (沒有 __init__.py 的目錄) 靜態判斷不準，放行
+            if any((base / top).is_dir() for base in self.search_paths):
+                return None
+            if top == "__future__" or self._find_installed(top):
+                return None
+            return f"{importer}: ModuleNotFoundError: No module named '{top}'"
+
+        error = self._check_module(local, local.name, visited)
+        if error or not names:
+            return error
+
+        tree, _ = self._parse(local, local.name)
+        defined = self._top_level_names(tree)
+        if defined is None:
+            return None
+        for name in names:
+            # from package import submodule
+            if name in defined or self._find_local(f"{module}.{name}") is not None:
+                continue
+            return f"{importer}: ImportError: cannot import name '{name}' from '{module}' ({local})"
+        return None
+
+    def _find_local(self, module: str) -> Path | None:
+        """在 playground / source 目錄中找模組檔案 (package 回傳 __init__.py)"""
+        parts = module.split(".")
+        for base in self.search_paths:
+            candidate = base.joinpath(*parts)
+            if candidate.with_suffix(".py").is_file():
+                return candidate.with_suffix(".py")
+            if (candidate / "__init__.py").is_file():
+                return candidate / "__init__.py"
+        return None
+
+    @staticmethod
+    def _find_installed(top: str) -> bool:
+        try:
+            return importlib.util.find_spec(top) is not None
+        except (ImportError, ValueError):
+            # 判斷不了就放行
+            return True
+
+    @staticmethod
+    def _parse(path: Path, display_name: str) -> tuple[ast.Module | None, str | None]:
+        try:
+            source = path.read_text(encoding="utf-8")
+        except OSError as e:
+            return None, f"{display_name}: {type(e).__name__}: {e}"
+        try:
+            return ast.parse(source, filename=str(path)), None
+        except SyntaxError as e:
+            line = (e.text or "").rstrip()
+            location = f"{display_name}, line {e.lineno}"
+            return None, f"{location}: SyntaxError: {e.msg}" + (f"\n    {line.strip()}" if line else "")
+
+    @staticmethod
+    def _top_level_names(tree: ast.Module) -> set[str] | None:
+        """
+        模組層級定義的名稱 (含 if / try / with 區塊裡的)
+        有 `from x import *` 或模組層級 __getattr__ 時無法靜態判斷，回傳 None
+        """
+        names = set()
+        pending = list(tree.body)
+        while pending:
+            node = pending.pop()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if node.name == "__getattr__":
+                    return None
+                names.add(node.name)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    if alias.name == "*":
+                        return None
+                    names.add(alias.asname or alias.name.split(".")[0])
+            elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    names.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+            elif isinstance(node, ast.TypeAlias):
+                names.add(node.name.id)
+            elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)):
+                if isinstance(node, ast.For):
+                    targets = [node.target]
+                elif isinstance(node, ast.With):
+                    targets = [item.optional_vars for item in node.items if item.optional_vars]
+                else:
+                    targets = []
+                for target in targets:
+                    names.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+                for field in ("body", "orelse", "finalbody"):
+                    pending.extend(getattr(node, field, []))
+                for handler in getattr(node, "handlers", []):
+                    pending.extend(handler.body)
+        return names
@@ -0,0 +1,276 @@
+import atexit
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from src.tools.sandbox import ResourceLimits, ResourceUsage, release_cgroup, run_pytest
+
+# 專案根目錄 (讓 worker 可以用 `python -m src.tools.pytest_pool` 啟動)
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+class WorkerUnavailable(RuntimeError):
+    """Worker 掛掉或沒有回應，呼叫端應改走冷啟動 subprocess"""
+
+class _Worker:
+    """
+    一個預熱好的 pytest worker (zygote)
+    本身只 import pytest，不碰任何生成的程式碼；每次執行都 fork 一個子行程，
+    所以 sys.modules / sys.path 的污染會隨子行程結束一起消失。
+    """
+
+    def __init__(self):
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(
+            p for p in [str(PROJECT_ROOT), env.get("PYTHONPATH", "")] if p
+        )
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "src.tools.pytest_pool"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            env=env,
+            cwd=str(PROJECT_ROOT)
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, args: list[str], pythonpath: str, cwd: str, timeout: float,
+            limits: ResourceLimits | None = None) -> dict:
+        request = {"args": args, "pythonpath": pythonpath, "cwd": cwd, "timeout": timeout,
+                   "limits": limits.to_dict() if limits else None}
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerUnavailable(f"worker stdin 關閉: {e}")
+
+        # 子行程的逾時由 worker 自己處理，這裡多留一點緩衝避免 worker 本身卡死
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout + 10)
+        if not ready:
+            self.close()
+            raise WorkerUnavailable("worker 沒有回應")
+
+        line = self.proc.stdout.readline()
+        if not line:
+            raise WorkerUnavailable("worker 已結束")
+        return json.loads(line)
+
+    def close(self) -> None:
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+
+class PytestWorkerPool:
+    """
+    預熱的 pytest worker pool
+    省掉每一輪測試的直譯器啟動與 pytest/plugin 載入成本，
+    並用 fork 保留原本「每次都是乾淨 process」的隔離性。
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, size: int = 2):
+        self.size = size
+        self._idle: list[_Worker] = []
+        self._started = 0
+        # 閒置 worker 與已啟動數量共用一個 Condition：worker 歸還或壞掉空出名額時都要叫醒等待的 thread
+        self._lock = threading.Condition()
+        self._workers: list[_Worker] = []
+
+    @staticmethod
+    def supported() -> bool:
+        """fork 只在 POSIX 上可用 (Windows 會退回冷啟動 subprocess)"""
+        return hasattr(os, "fork")
+
+    @classmethod
+    def shared(cls, size: int = 2) -> "PytestWorkerPool":
+        """整個 process 共用一個 pool (批次模式下多個辦公室共享)"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(size=size)
+                atexit.register(cls._shared.shutdown)
+            return cls._shared
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    # 先佔名額，啟動 worker (要等 zygote 載入 pytest) 時不必持有 lock
+                    self._started += 1
+                    break
+                self._lock.wait()
+
+        try:
+            worker = _Worker()
+        except BaseException:
+            with self._lock:
+                self._started -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _release(self, worker: _Worker) -> None:
+        with self._lock:
+            if worker.alive():
+                self._idle.append(worker)
+            else:
+                # 壞掉的 worker 丟掉並空出名額，被叫醒的 thread 會自己啟動一個新的
+                self._workers.remove(worker)
+                self._started -= 1
+                worker.close()
+            self._lock.notify()
+
+    def run(self, args: list[str], pythonpath: str, cwd: str, timeout: float,
+            limits: ResourceLimits | None = None) -> tuple[int | None, str, str, ResourceUsage | None]:
+        """
+        在預熱的 worker 中執行 pytest
+        Args:
+            args: pytest 參數 (等同 `python -m pytest <args>`)
+            pythonpath: 子行程的 PYTHONPATH (os.pathsep 分隔)
+            limits: 子行程的資源上限 (None = 不限制)
+        Returns:
+            returncode: pytest exit code，逾時則為 None
+            stdout / stderr
+            usage: 子行程的 CPU 時間與 peak RSS
+        """
+        worker = self._acquire()
+        try:
+            response = worker.run(args, pythonpath, cwd, timeout, limits)
+        finally:
+            self._release(worker)
+
+        usage = ResourceUsage(**response["usage"]) if response.get("usage") else None
+        if response.get("timed_out"):
+            return None, response.get("stdout", ""), response.get("stderr", ""), usage
+        return response["returncode"], response.get("stdout", ""), response.get("stderr", ""), usage
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers.clear()
+            self._idle.clear()
+            self._started = 0
+
+# ---------------------------------------------------------
+# Worker 端 (python -m src.tools.pytest_pool)
+# ---------------------------------------------------------
+
+def _warm_up() -> None:
+    """預先載入 pytest 與所有內建/第三方 plugin，fork 出來的子行程直接繼承"""
+    import importlib
+    from importlib.metadata import entry_points
+    import pytest  # noqa: F401
+    from _pytest.config import default_plugins
+
+    for name in default_plugins:
+        try:
+            importlib.import_module(f"_pytest.{name}")
+        except ImportError:
+            pass
+
+    for ep in entry_points(group="pytest11"):
+        try:
+            ep.load()
+        except Exception:
+            pass
+
+def _run_child(request: dict, stdout_path: str, stderr_path: str) -> None:
+    """fork 出來的子行程：設定路徑後執行 pytest，結束時直接 _exit"""
+    code = 3
+    try:
+        # 自成一個 process group，逾時時可以連同孫行程一起砍掉
+        os.setpgrp()
+
+        out_fd = os.open(stdout_path, os.O_WRONLY)
+        err_fd = os.open(stderr_path, os.O_WRONLY)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+
+        # 還原成跟 `python -m pytest` 冷啟動一樣的路徑：cwd + PYTHONPATH + 標準路徑
+        # (zygote 自己為了 import 本模組而加的專案根目錄要拿掉)
+        pythonpath = [p for p in request["pythonpath"].split(os.pathsep) if p]
+        site_paths = [p for p in sys.path[1:] if p != str(PROJECT_ROOT) and p not in pythonpath]
+        os.environ["PYTHONPATH"] = request["pythonpath"]
+        os.chdir(request["cwd"])
+        sys.path[:] = [request["cwd"]] + pythonpath + site_paths
+
+        # 第三方 plugin 已在 zygote 預載，無法再做 assert rewrite (只影響 plugin 本身)，不需警告
+        args = ["-W", "ignore::pytest.PytestAssertRewriteWarning", *request["args"]]
+        code = run_pytest(args, ResourceLimits(**(request.get("limits") or {})))
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+def _handle(request: dict) -> dict:
+    with tempfile.NamedTemporaryFile(delete=False) as out_f, \
+            tempfile.NamedTemporaryFile(delete=False) as err_f:
+        stdout_path, stderr_path = out_f.name, err_f.name
+
+    try:
+        pid = os.fork()
+        if pid == 0:
+            _run_child(request, stdout_path, stderr_path)
+
+        deadline = time.monotonic() + request["timeout"]
+        timed_out = False
+        while True:
+            # wait4：順便取得子行程的 CPU 時間與 peak RSS
+            waited_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+            if waited_pid:
+                break
+            if time.monotonic() > deadline:
+                timed_out = True
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                _, status, rusage = os.wait4(pid, 0)
+                break
+            time.sleep(0.005)
+
+        usage = ResourceUsage.from_rusage(rusage)
+        peak = release_cgroup(ResourceLimits(**(request.get("limits") or {})), pid)
+        if peak:
+            usage.peak_rss_bytes = max(usage.peak_rss_bytes, peak)
+
+        with open(stdout_path, encoding="utf-8", errors="replace") as f:
+            stdout = f.read()
+        with open(stderr_path, encoding="utf-8", errors="replace") as f:
+            stderr = f.read()
+    finally:
+        os.unlink(stdout_path)
+        os.unlink(stderr_path)
+
+    if timed_out:
+        return {"timed_out": True, "stdout": stdout, "stderr": stderr, "usage": usage.to_dict()}
+    return {"returncode": os.waitstatus_to_exitcode(status), "stdout": stdout, "stderr": stderr,
+            "usage": usage.to_dict()}
+
+def _serve() -> None:
+    _warm_up()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        response = _handle(json.loads(line))
+        sys.stdout.write(json.dumps(response) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    _serve()
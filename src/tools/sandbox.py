@@ -0,0 +1,204 @@
+import json
+import os
+import signal
+import sys
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows：沒有 rlimit，只剩 TestRunner 的整體 timeout
+    resource = None
+
+@dataclass
+class ResourceLimits:
+    """一次 pytest 執行的資源上限 (0 / 空字串 = 不限制)"""
+    cpu_seconds: int = 0
+    memory_mb: int = 0
+    # 最多能開幾個行程 / thread (擋 fork bomb)：用 cgroup 的 pids.max 限制 (需要 cgroup_root)
+    max_processes: int = 0
+    # 沒有 cgroup 時改用 RLIMIT_NPROC：它算的是整個使用者的 task 數 (含 thread)，
+    # 要掃 /proc 加上既有的數量，掃描期間其他行程仍可能增加，所以預設不開
+    nproc_rlimit: bool = False
+    # 單一測試的時間上限 (秒)，超過就讓該測試失敗，其他測試照跑
+    test_timeout: float = 0
+    # 可寫入的 cgroup v2 目錄 (有的話另外用 memory.max / pids.max 限制，並讀取 memory.peak)
+    cgroup_root: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+@dataclass
+class ResourceUsage:
+    """一次 pytest 執行實際用掉的資源"""
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+
+    def describe(self) -> str:
+        return f"CPU {self.cpu_seconds:.2f}s, peak RSS {self.peak_rss_bytes / 2**20:.1f} MB"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @staticmethod
+    def from_rusage(*usages) -> "ResourceUsage":
+        """合併 getrusage / wait4 的結果 (ru_maxrss 在 Linux 是 KB，macOS 是 bytes)"""
+        scale = 1 if sys.platform == "darwin" else 1024
+        return ResourceUsage(
+            cpu_seconds=sum(u.ru_utime + u.ru_stime for u in usages),
+            peak_rss_bytes=max(u.ru_maxrss for u in usages) * scale,
+        )
+
+    @staticmethod
+    def merge(usages: list["ResourceUsage | None"]) -> "ResourceUsage | None":
+        """多個 shard 的用量：CPU 相加，peak RSS 取最大"""
+        usages = [u for u in usages if u is not None]
+        if not usages:
+            return None
+        return ResourceUsage(
+            cpu_seconds=sum(u.cpu_seconds for u in usages),
+            peak_rss_bytes=max(u.peak_rss_bytes for u in usages),
+        )
+
+def supported() -> bool:
+    return resource is not None
+
+def apply_limits(limits: ResourceLimits) -> None:
+    """在 pytest 子行程中 (執行任何生成的程式碼之前) 套用資源上限"""
+    if limits.cgroup_root:
+        _enter_cgroup(limits)
+    if resource is None:
+        return
+    if limits.cpu_seconds:
+        # 超過 soft limit 收到 SIGXCPU，再多 1 秒直接 SIGKILL
+        _set_limit(resource.RLIMIT_CPU, limits.cpu_seconds, limits.cpu_seconds + 1)
+    if limits.memory_mb:
+        size = limits.memory_mb * 2**20
+        _set_limit(resource.RLIMIT_AS, size, size)
+    if limits.max_processes and limits.nproc_rlimit:
+        # RLIMIT_NPROC 算的是整個使用者的 task 數，要加上既有的 (無法計算時不設)
+        existing = _user_task_count()
+        if existing is not None:
+            _set_limit(resource.RLIMIT_NPROC, existing + limits.max_processes, existing + limits.max_processes)
+
+def _set_limit(kind: int, soft: int, hard: int) -> None:
+    """只能調低，不能超過目前的 hard limit"""
+    _, current_hard = resource.getrlimit(kind)
+    if current_hard != resource.RLIM_INFINITY:
+        soft, hard = min(soft, current_hard), min(hard, current_hard)
+    try:
+        resource.setrlimit(kind, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+def _user_task_count() -> int | None:
+    """目前使用者的 task 數：/proc 只列出 thread group leader，thread 數要從 status 的 Threads: 讀"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    uid = os.getuid()
+    count = 0
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            if entry.stat().st_uid != uid:
+                continue
+            status = (entry / "status").read_text()
+        except OSError:
+            continue
+        threads = next((line.split()[1] for line in status.splitlines() if line.startswith("Threads:")), "1")
+        count += int(threads)
+    return count
+
+def _cgroup_dir(limits: ResourceLimits, pid: int) -> Path:
+    return Path(limits.cgroup_root) / f"salary_partners_{pid}"
+
+def _enter_cgroup(limits: ResourceLimits) -> None:
+    """建立這次執行專屬的 cgroup 並把自己移進去；沒有權限就算了 (還有 rlimit)"""
+    path = _cgroup_dir(limits, os.getpid())
+    try:
+        path.mkdir(exist_ok=True)
+        if limits.memory_mb:
+            (path / "memory.max").write_text(str(limits.memory_mb * 2**20))
+            (path / "memory.swap.max").write_text("0")
+        if limits.max_processes:
+            (path / "pids.max").write_text(str(limits.max_processes))
+        (path / "cgroup.procs").write_text(str(os.getpid()))
+    except OSError:
+        pass
+
+def release_cgroup(limits: ResourceLimits, pid: int) -> int | None:
+    """子行程結束後由父行程呼叫：讀取 memory.peak 並移除 cgroup。Returns: peak bytes (讀不到時為 None)"""
+    if not limits.cgroup_root:
+        return None
+    path = _cgroup_dir(limits, pid)
+    peak = None
+    try:
+        peak = int((path / "memory.peak").read_text().strip())
+    except (OSError, ValueError):
+        pass
+    try:
+        path.rmdir()
+    except OSError:
+        pass
+    return peak
+
+def describe_exit(returncode: int | None, limits: ResourceLimits) -> str | None:
+    """被資源上限砍掉的子行程 (以 signal 結束) 給一個看得懂的說明"""
+    if returncode is None or returncode >= 0:
+        return None
+    if returncode == -signal.SIGXCPU:
+        return f"超過 CPU 時間上限 ({limits.cpu_seconds}s)，程式可能有無窮迴圈"
+    if returncode == -signal.SIGKILL:
+        return "被強制終止 (超過 CPU / 記憶體上限)，程式可能有無窮迴圈或記憶體爆量"
+    return f"被 signal {-returncode} 終止"
+
+def timeout_plugin(seconds: float):
+    """
+    單一測試的逾時 (不需要 pytest-timeout)：用 SIGALRM 打斷超時的測試並判定失敗
+    只在 main thread 有效；整體的 timeout 仍由 TestRunner 負責
+    """
+    import pytest
+
+    class _TestTimeout:
+        @pytest.hookimpl(hookwrapper=True)
+        def pytest_runtest_call(self, item):
+            def on_timeout(signum, frame):
+                pytest.fail(f"⏱️ 單一測試執行超過 {seconds}s (可能有無窮迴圈)", pytrace=False)
+
+            previous = signal.signal(signal.SIGALRM, on_timeout)
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+            try:
+                yield
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+
+    return _TestTimeout()
+
+def run_pytest(args: list[str], limits: ResourceLimits) -> int:
+    """在目前的 (子) 行程中套用上限後執行 pytest"""
+    apply_limits(limits)
+    import pytest
+    plugins = [timeout_plugin(limits.test_timeout)] if limits.test_timeout and hasattr(signal, "SIGALRM") else []
+    return int(pytest.main(args, plugins=plugins))
+
+def main() -> None:
+    """
+    冷啟動用的入口：python sandbox.py <limits JSON> <usage 輸出檔> <pytest 參數...>
+    結束時把自己 (含子行程) 的 CPU 時間與 peak RSS 寫到 usage 輸出檔
+    """
+    limits = ResourceLimits(**json.loads(sys.argv[1]))
+    usage_path = sys.argv[2]
+    # 以檔案路徑執行時 sys.path[0] 是本目錄，改成跟 `python -m pytest` 一樣的 cwd
+    sys.path[0] = os.getcwd()
+    code = run_pytest(sys.argv[3:], limits)
+    usage = ResourceUsage.from_rusage(
+        resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    )
+    Path(usage_path).write_text(json.dumps(usage.to_dict()), encoding="utf-8")
+    sys.exit(code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# traceback 中的位置行，例如 "test_calc.py:4: AssertionError"
+_FRAME_RE = re.compile(r"^(?P<file>[^\s:]+\.py):(?P<line>\d+):")
+
+@dataclass
+class TestCaseResult:
+    """單一測試的結果"""
+    nodeid: str
+    outcome: str  # "passed" | "failed" | "error" | "skipped"
+    duration: float = 0.0
+    message: str = ""  # assertion / exception 訊息
+    frame: str = ""  # 出錯的位置 (file:line)，優先取 playground 內的檔案
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome in ("passed", "skipped")
+
+@dataclass
+class TestReport:
+    """一次 pytest 執行的結構化結果 (由 JUnit XML 解析而來)"""
+    cases: list[TestCaseResult] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def failed(self) -> list[TestCaseResult]:
+        return [c for c in self.cases if not c.ok]
+
+    @property
+    def passed(self) -> list[TestCaseResult]:
+        return [c for c in self.cases if c.outcome == "passed"]
+
+    def outcomes(self) -> dict[str, str]:
+        return {c.nodeid: c.outcome for c in self.cases}
+
+    def digest(self, max_cases: int = 10, max_message_lines: int = 6) -> str:
+        """給 Agent 看的精簡失敗摘要 (只列失敗的測試、訊息與出錯位置)"""
+        lines = [f"{len(self.failed)} failed / {len(self.passed)} passed ({self.duration:.2f}s)"]
+        for case in self.failed[:max_cases]:
+            location = f" @ {case.frame}" if case.frame else ""
+            lines.append(f"✗ [{case.outcome}] {case.nodeid}{location}")
+            message_lines = case.message.strip().splitlines()
+            for line in message_lines[:max_message_lines]:
+                lines.append(f"    {line}")
+            if len(message_lines) > max_message_lines:
+                lines.append(f"    ... (略去 {len(message_lines) - max_message_lines} 行)")
+        if len(self.failed) > max_cases:
+            lines.append(f"... 另有 {len(self.failed) - max_cases} 個失敗的測試")
+        return "\n".join(lines)
+
+    @classmethod
+    def from_junit_xml(cls, xml_path: Path, test_filename: str, playground_dir: Path) -> "TestReport | None":
+        """解析 pytest --junitxml 的輸出；檔案不存在或壞掉時回傳 None"""
+        try:
+            root = ET.parse(xml_path).getroot()
+        except (OSError, ET.ParseError):
+            return None
+
+        report = cls()
+        suites = [root] if root.tag == "testsuite" else root.findall("testsuite")
+        for suite in suites:
+            report.duration += float(suite.get("time") or 0)
+            for testcase in suite.iter("testcase"):
+                report.cases.append(_parse_testcase(testcase, test_filename, playground_dir))
+        return report
+
+def _parse_testcase(testcase: ET.Element, test_filename: str, playground_dir: Path) -> TestCaseResult:
+    nodeid = _nodeid(testcase.get("classname", ""), testcase.get("name", ""), test_filename)
+    duration = float(testcase.get("time") or 0)
+
+    for tag, outcome in (("failure", "failed"), ("error", "error"), ("skipped", "skipped")):
+        element = testcase.find(tag)
+        if element is None:
+            continue
+        text = element.text or ""
+        message = element.get("message") or ""
+        # message 屬性有時只是 "collection failure" 之類的概要，補上 traceback 中的 E 行
+        error_lines = [line[1:].strip() for line in text.splitlines() if line.startswith("E ")]
+        if error_lines and (not message or len(message) < 40):
+            message = "\n".join(error_lines)
+        return TestCaseResult(
+            nodeid=nodeid,
+            outcome=outcome,
+            duration=duration,
+            message=message,
+            frame=_relevant_frame(text, playground_dir)
+        )
+
+    return TestCaseResult(nodeid=nodeid, outcome="passed", duration=duration)
+
+def _nodeid(classname: str, name: str, test_filename: str) -> str:
+    """把 JUnit 的 classname (e.g. "test_calc.TestCart") 轉回 pytest nodeid"""
+    module = Path(test_filename).stem
+    parts = classname.split(".") if classname else []
+    if module in parts:
+        parts = parts[parts.index(module) + 1:]
+    return "::".join([test_filename, *parts, name])
+
+def _relevant_frame(text: str, playground_dir: Path) -> str:
+    """從 traceback 中找出最相關的位置：最後一個位於 playground 的 frame"""
+    frames = []
+    for line in text.splitlines():
+        match = _FRAME_RE.match(line.strip())
+        if match:
+            frames.append((match.group("file"), match.group("line")))
+    if not frames:
+        return ""
+
+    playground = str(playground_dir)
+    local = [f for f in frames if "site-packages" not in f[0] and
+             (not Path(f[0]).is_absolute() or f[0].startswith(playground))]
+    file, line = (local or frames)[-1]
+    return f"{Path(file).name}:{line}"
@@ -1,32 +1,231 @@
+import ast
+import asyncio
+import hashlib
+import json
 import subprocess
 import sys
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from pathlib import Path
+from src.tools.preflight import PreflightChecker
+from src.tools import perf, sandbox
+from src.tools.perf import PerfReport
+from src.tools.pytest_pool import PytestWorkerPool, WorkerUnavailable
+from src.tools.sandbox import ResourceLimits, ResourceUsage
+from src.tools.test_report import TestReport
+
+@dataclass
+class TestRunResult:
+    """TestRunner.run_detailed 的回傳值"""
+    status: str  # "PASS" | "FAIL" | "ERROR"
+    message: str
+    report: TestReport | None = None
+    returncode: int | None = None
+    stdout: str = ""
+    stderr: str = ""
+    # pytest 子行程的 CPU 時間與 peak RSS (無法量測時為 None)
+    usage: ResourceUsage | None = None
+    # 效能關卡的計時結果 (只有 run_perf 才有)
+    perf: PerfReport | None = None
 
 class TestRunner:
     """負責執行 playground 中的測試程式"""
 
-    def __init__(self, playground_dir: str = "playground", source_dirs: list[str] = None):
+    # 各種結論的訊息開頭
+    _MESSAGE_PREFIX = {
+        "FAIL": "🔴 測試邏輯失敗 (Assertion Error):",
+        "ERROR": "💥 測試碼本身有錯 (Syntax/Import Error):",
+    }
+
+    def __init__(self, playground_dir: str = "playground", source_dirs: list[str] = None,
+                 pool: PytestWorkerPool | None = None, timeout: float = 30,
+                 failing_first: bool = False, preflight: bool = False,
+                 shards: int = 1, shard_min_tests: int = 8, limits: ResourceLimits | None = None):
         self.playground_path = Path(playground_dir).resolve()
         # 如果沒傳，預設 source code 也在 playground (為了相容舊邏輯)
         self.source_paths = [Path(p).resolve() for p in (source_dirs or [playground_dir])]
+        # 預熱的 pytest worker pool (None 代表每次都冷啟動 subprocess)
+        self.pool = pool if pool is not None and PytestWorkerPool.supported() else None
+        self.timeout = timeout
+        # 最近一次的結構化結果
+        self.last_result: TestRunResult | None = None
+        # 優先重跑上次失敗的測試；_outcomes: {測試檔: (內容 hash, {nodeid: outcome})}
+        self.failing_first = failing_first
+        self._outcomes: dict[str, tuple[str, dict[str, str]]] = {}
+        # 啟動 pytest 前先做靜態檢查 (語法、import、名稱)，明顯會 ERROR 的就不必開 subprocess
+        self.preflight = None
+        if preflight:
+            search_paths = list(dict.fromkeys([self.playground_path, *self.source_paths]))
+            self.preflight = PreflightChecker(search_paths)
+        # 測試數量夠多時，把整份測試檔拆成 shards 個 pytest 平行執行 (timeout 以 shard 為單位)
+        self.shards = shards
+        self.shard_min_tests = shard_min_tests
+        # pytest 子行程的資源上限 (CPU 時間、記憶體、行程數、單一測試逾時)，避免一個失控的 run 拖垮整台機器
+        self.limits = limits if limits is not None and sandbox.supported() else None
 
     def run(self, test_filename: str) -> tuple[str, str]:
         """
         Returns:
             status: "PASS" | "FAIL" (AssertionError) | "ERROR" (Syntax/System Error)
-            message: 詳細訊息
+            message: 詳細訊息 (失敗時為精簡的失敗摘要)
+        """
+        result = self.run_detailed(test_filename)
+        return result.status, result.message
+
+    async def arun(self, test_filename: str) -> tuple[str, str]:
+        """run 的 async 版本 (pytest 在背景執行，不會卡住 event loop)"""
+        result = await self.arun_detailed(test_filename)
+        return result.status, result.message
+
+    def run_detailed(self, test_filename: str) -> TestRunResult:
+        """
+        執行測試並回傳結構化結果 (逐一測試的 outcome、耗時、訊息與出錯位置)
+        failing_first 開啟時，若同一份測試檔上一輪有失敗的測試，先只重跑那些測試：
+        仍然失敗就直接回報 FAIL (完整執行的結論也必定是 FAIL)；全部通過才跑完整個檔案。
         """
         target_file = self.playground_path / test_filename
         
         if not target_file.exists():
-            return "ERROR", f"❌ 找不到測試檔案: {target_file}"
+            return self._remember(TestRunResult("ERROR", f"❌ 找不到測試檔案: {target_file}"))
+
+        rejected = self._preflight(test_filename)
+        if rejected:
+            return self._remember(rejected)
+
+        test_hash = hashlib.sha256(target_file.read_bytes()).hexdigest()
+        failing = self._previously_failing(test_filename, test_hash) if self.failing_first else []
+
+        if failing:
+            print(f"    ...優先重跑上次失敗的 {len(failing)} 個測試: {test_filename}")
+            targets = [str(target_file) + nodeid[len(test_filename):] for nodeid in failing]
+            result = self._run_pytest(test_filename, targets)
+            if result.status != "PASS":
+                self._record_outcomes(test_filename, test_hash, result)
+                result.message += f"\n(僅重跑上次失敗的 {len(failing)} 個測試，其餘測試本輪未執行)"
+                return self._remember(result)
+
+        shards = self._shard(target_file)
+        if shards is None:
+            print(f"    ...執行 Pytest: {test_filename}")
+            result = self._run_pytest(test_filename, [str(target_file)])
+        else:
+            print(f"    ...執行 Pytest: {test_filename} (分成 {len(shards)} 個 shard 平行執行)")
+            with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="pytest-shard") as executor:
+                results = list(executor.map(lambda targets: self._run_pytest(test_filename, targets), shards))
+            result = self._merge(results)
+        self._record_outcomes(test_filename, test_hash, result)
+        return self._remember(result)
+
+    async def arun_detailed(self, test_filename: str) -> TestRunResult:
+        """run_detailed 的 async 版本 (流程相同，pytest 改用 non-blocking 的方式執行)"""
+        target_file = self.playground_path / test_filename
+
+        if not target_file.exists():
+            return self._remember(TestRunResult("ERROR", f"❌ 找不到測試檔案: {target_file}"))
+
+        rejected = self._preflight(test_filename)
+        if rejected:
+            return self._remember(rejected)
+
+        test_hash = hashlib.sha256(target_file.read_bytes()).hexdigest()
+        failing = self._previously_failing(test_filename, test_hash) if self.failing_first else []
+
+        if failing:
+            print(f"    ...優先重跑上次失敗的 {len(failing)} 個測試: {test_filename}")
+            targets = [str(target_file) + nodeid[len(test_filename):] for nodeid in failing]
+            result = await self._arun_pytest(test_filename, targets)
+            if result.status != "PASS":
+                self._record_outcomes(test_filename, test_hash, result)
+                result.message += f"\n(僅重跑上次失敗的 {len(failing)} 個測試，其餘測試本輪未執行)"
+                return self._remember(result)
 
-        print(f"    ...執行 Pytest: {test_filename}")
+        shards = self._shard(target_file)
+        if shards is None:
+            print(f"    ...執行 Pytest: {test_filename}")
+            result = await self._arun_pytest(test_filename, [str(target_file)])
+        else:
+            print(f"    ...執行 Pytest: {test_filename} (分成 {len(shards)} 個 shard 平行執行)")
+            results = await asyncio.gather(*(self._arun_pytest(test_filename, targets) for targets in shards))
+            result = self._merge(list(results))
+        self._record_outcomes(test_filename, test_hash, result)
+        return self._remember(result)
 
+    def _preflight(self, test_filename: str) -> TestRunResult | None:
+        """靜態檢查沒過時，直接回傳與 pytest 收集錯誤相同格式的 ERROR"""
+        if self.preflight is None:
+            return None
+        detail = self.preflight.check(test_filename)
+        if detail is None:
+            return None
+        print(f"    ...Pre-flight 靜態檢查未通過，略過 Pytest: {test_filename}")
+        self._outcomes.pop(test_filename, None)
+        return TestRunResult(
+            "ERROR", f"💥 測試碼本身有錯 (Syntax/Import Error):\n{detail}\n(pre-flight 靜態檢查，未執行 pytest)"
+        )
+
+    def _previously_failing(self, test_filename: str, test_hash: str) -> list[str]:
+        """
+        上一輪失敗的測試 nodeid；測試檔內容改變 (例如 QA 重寫) 或上一輪不是乾淨的 FAIL 時為空
+        (ERROR 可能是收集階段就壞掉，nodeid 不可靠，直接跑完整檔案)
+        """
+        previous = self._outcomes.get(test_filename)
+        if previous is None or previous[0] != test_hash:
+            return []
+        return [nodeid for nodeid, outcome in previous[1].items() if outcome == "failed"]
+
+    def _record_outcomes(self, test_filename: str, test_hash: str, result: TestRunResult) -> None:
+        """記住每個測試的 outcome (跨輪次)；只有乾淨的 FAIL/PASS 才值得記"""
+        if result.report is None or result.status == "ERROR":
+            self._outcomes.pop(test_filename, None)
+            return
+
+        previous = self._outcomes.get(test_filename)
+        outcomes = dict(previous[1]) if previous and previous[0] == test_hash else {}
+        outcomes.update(result.report.outcomes())
+        self._outcomes[test_filename] = (test_hash, outcomes)
+
+    def _run_pytest(self, test_filename: str, targets: list[str]) -> TestRunResult:
+        """對指定的檔案 / nodeid 執行一次 pytest，並把 exit code 轉成 PASS/FAIL/ERROR"""
+        with tempfile.TemporaryDirectory(prefix="pytest_report_") as report_dir:
+            junit_path = Path(report_dir) / "report.xml"
+            args = self._pytest_args(targets, junit_path)
+            try:
+                returncode, stdout, stderr, usage = self._execute(args, self._pythonpath())
+            except subprocess.TimeoutExpired:
+                return TestRunResult("ERROR", "❌ 測試執行逾時 (Timeout)")
+            except Exception as e:
+                return TestRunResult("ERROR", f"❌ 執行發生例外錯誤: {str(e)}")
+            return self._interpret(test_filename, junit_path, returncode, stdout, stderr, usage)
+
+    async def _arun_pytest(self, test_filename: str, targets: list[str]) -> TestRunResult:
+        """_run_pytest 的 async 版本"""
+        with tempfile.TemporaryDirectory(prefix="pytest_report_") as report_dir:
+            junit_path = Path(report_dir) / "report.xml"
+            args = self._pytest_args(targets, junit_path)
+            try:
+                returncode, stdout, stderr, usage = await self._aexecute(args, self._pythonpath())
+            except subprocess.TimeoutExpired:
+                return TestRunResult("ERROR", "❌ 測試執行逾時 (Timeout)")
+            except Exception as e:
+                return TestRunResult("ERROR", f"❌ 執行發生例外錯誤: {str(e)}")
+            return self._interpret(test_filename, junit_path, returncode, stdout, stderr, usage)
+
+    def _pytest_args(self, targets: list[str], junit_path: Path) -> list[str]:
+        """
+        pytest 參數：playground 放在專案底下，不指定的話 pytest 會往上找到專案自己的 pyproject.toml，
+        把專案根目錄加進 sys.path (src.* 可能蓋掉產生的 module)，還會在專案根目錄寫 .pytest_cache
+        """
+        return [
+            "-c", os.devnull, f"--rootdir={self.playground_path}", "-p", "no:cacheprovider",
+            *targets, f"--junitxml={junit_path}"
+        ]
+
+    def _pythonpath(self) -> str:
+        """pytest 子行程的 PYTHONPATH"""
         # ✅ 關鍵修改：設定 PYTHONPATH
-        env = os.environ.copy()
-        current_pythonpath = env.get("PYTHONPATH", "")
+        current_pythonpath = os.environ.get("PYTHONPATH", "")
         
         # 把所有的 source_dirs 都加入 PYTHONPATH
         # 這樣 Python 就會去這些資料夾找 import
@@ -35,34 +234,246 @@ class TestRunner:
         additional_paths.append(str(self.playground_path))
         
         # 組合路徑 (Windows 用 ; 分隔)
-        env["PYTHONPATH"] = os.pathsep.join(additional_paths) + os.pathsep + current_pythonpath
+        return os.pathsep.join(additional_paths) + os.pathsep + current_pythonpath
+
+    def _interpret(self, test_filename: str, junit_path: Path, returncode: int,
+                   stdout: str, stderr: str, usage: ResourceUsage | None = None) -> TestRunResult:
+        """讀取 JUnit XML，並把 exit code 轉成 PASS/FAIL/ERROR"""
+        report = TestReport.from_junit_xml(junit_path, test_filename, self.playground_path)
+
+        # 除錯用輸出
+        # print(stdout) 
+        # print(stderr)
+
+        if returncode == 0:
+            status, message = "PASS", "✅ 測試通過"
+        elif returncode == 1:
+            # Exit Code 1 代表測試有跑完，但 Assertion Failed
+            # 這在 TDD 階段是正確的「紅燈」
+            detail = report.digest() if report and report.failed else stdout
+            status, message = "FAIL", f"{self._MESSAGE_PREFIX['FAIL']}\n{detail}"
+        else:
+            # 其他 Exit Code (2, 3, 4, 5) 代表語法錯誤、Import 錯誤等
+            detail = report.digest() if report and report.failed else f"{stderr}\n{stdout}"
+            status, message = "ERROR", f"{self._MESSAGE_PREFIX['ERROR']}\n{detail}"
+            # 被資源上限砍掉的 (以 signal 結束)，直接說明原因
+            killed = sandbox.describe_exit(returncode, self.limits) if self.limits else None
+            if killed:
+                message = f"❌ 測試子行程{killed}\n{detail}".rstrip()
+
+        return TestRunResult(
+            status, message, report=report, returncode=returncode, stdout=stdout, stderr=stderr, usage=usage
+        )
 
+    # --- 效能關卡 (Perf Gate) ---
+    def run_perf(self, bench_filename: str, repeats: int = 5, max_exponent: float = 1.5,
+                 tolerance: float = 0.4, min_seconds: float = 1e-4, timeout: float = 60) -> TestRunResult:
+        """
+        在子行程中執行 benchmark 檔 (格式見 perf.py)，依輸入規模的成長次方判定：
+            PASS: 所有 benchmark 都在預算內
+            FAIL: 有 benchmark 的成長次方超過預算 (message 附上量測數字)
+            ERROR: benchmark 本身跑不起來
+        """
+        target_file = self.playground_path / bench_filename
+        if not target_file.exists():
+            return self._remember(TestRunResult("ERROR", f"❌ 找不到 benchmark 檔案: {target_file}"))
+
+        print(f"    ...執行 Benchmark: {bench_filename} (每個規模重複 {repeats} 次)")
+        # 單一測試的逾時不適用於 benchmark，整體時間由 timeout 控制
+        limits = replace(self.limits, test_timeout=0, cgroup_root="") if self.limits else ResourceLimits()
+        env = os.environ.copy()
+        env["PYTHONPATH"] = self._pythonpath()
+        with tempfile.TemporaryDirectory(prefix="perf_") as output_dir:
+            output_path = Path(output_dir) / "perf.json"
+            command = [sys.executable, perf.__file__, json.dumps(limits.to_dict()), str(output_path),
+                       Path(bench_filename).stem, str(repeats)]
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, timeout=timeout, env=env)
+            except subprocess.TimeoutExpired:
+                return self._remember(TestRunResult("ERROR", f"❌ Benchmark 執行逾時 ({timeout}s)，程式可能太慢或有無窮迴圈"))
+            if result.returncode != 0 or not output_path.exists():
+                detail = sandbox.describe_exit(result.returncode, limits) or result.stderr.strip()[-2000:]
+                return self._remember(TestRunResult(
+                    "ERROR", f"💥 Benchmark 本身有錯:\n{detail}", returncode=result.returncode,
+                    stdout=result.stdout, stderr=result.stderr
+                ))
+            report = PerfReport.from_dict(json.loads(output_path.read_text(encoding="utf-8")))
+
+        measured = "\n".join(bench.describe() for bench in report.benchmarks)
+        slow = report.regressions(max_exponent, tolerance, min_seconds)
+        if slow:
+            names = ", ".join(bench.name for bench in slow)
+            message = (f"🐢 效能未達標 ({names} 的執行時間隨輸入規模成長太快，預算：成長次方 ≤ "
+                       f"{max_exponent} 或宣告的預期次方 + {tolerance}):\n{measured}")
+            return self._remember(TestRunResult("FAIL", message, returncode=result.returncode, perf=report))
+        return self._remember(TestRunResult(
+            "PASS", f"⚡ 效能在預算內:\n{measured}", returncode=result.returncode, perf=report
+        ))
+
+    async def arun_perf(self, bench_filename: str, **kwargs) -> TestRunResult:
+        """run_perf 的 async 版本 (benchmark 在 thread 中等待，不佔用 event loop)"""
+        return await asyncio.to_thread(self.run_perf, bench_filename, **kwargs)
+
+    # --- 平行分片 (Sharding) ---
+    def _shard(self, target_file: Path) -> list[list[str]] | None:
+        """把測試檔拆成 pytest 的 nodeid 清單 (round-robin 分配)；不值得或無法拆分時回傳 None"""
+        if self.shards <= 1:
+            return None
+        tests = self._collect(target_file)
+        if tests is None or len(tests) < max(self.shard_min_tests, 2):
+            return None
+        count = min(self.shards, len(tests))
+        return [[f"{target_file}::{name}" for name in tests[i::count]] for i in range(count)]
+
+    @staticmethod
+    def _collect(target_file: Path) -> list[str] | None:
+        """
+        靜態收集模組層級的測試函式與 Test 類別 (類別整個分在同一個 shard，class fixture 不會被拆開)
+        測試是動態產生 (指派、條件式定義) 的話無法靜態判斷，回傳 None 交給單一 pytest 處理
+        """
         try:
+            tree = ast.parse(target_file.read_text(encoding="utf-8"))
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+        def is_test(name: str) -> bool:
+            return name.startswith("test") or name.startswith("Test")
+
+        tests = []
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+                tests.append(node.name)
+            elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+                tests.append(node.name)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                if any(isinstance(n, ast.Name) and is_test(n.id) for t in targets for n in ast.walk(t)):
+                    return None
+            elif not isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                defined = [n.name for n in ast.walk(node)
+                           if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+                if any(is_test(name) for name in defined):
+                    return None
+        # 重複定義的同名測試，pytest 只會收集最後一個
+        return list(dict.fromkeys(tests))
+
+    def _merge(self, results: list[TestRunResult]) -> TestRunResult:
+        """合併各 shard 的結果：任何 ERROR → ERROR，否則任何 FAIL → FAIL，全部通過才是 PASS"""
+        report = None
+        if all(r.report is not None for r in results):
+            # 收集錯誤會在每個 shard 各出現一次，同一個 nodeid 只留一筆
+            cases = {}
+            for r in results:
+                for case in r.report.cases:
+                    cases.setdefault(case.nodeid, case)
+            report = TestReport(cases=list(cases.values()), duration=max(r.report.duration for r in results))
+
+        returncodes = [r.returncode for r in results if r.returncode is not None]
+        merged = dict(
+            report=report,
+            returncode=max(returncodes) if returncodes else None,
+            stdout="\n".join(r.stdout for r in results if r.stdout),
+            stderr="\n".join(r.stderr for r in results if r.stderr),
+            usage=ResourceUsage.merge([r.usage for r in results]),
+        )
+        for status in ("ERROR", "FAIL"):
+            worst = [r for r in results if r.status == status]
+            if not worst:
+                continue
+            if report is not None and report.failed:
+                message = f"{self._MESSAGE_PREFIX[status]}\n{report.digest()}"
+            else:
+                # 逾時 / 例外沒有 JUnit 報告，直接列出各 shard 的訊息
+                message = "\n".join(dict.fromkeys(r.message for r in worst))
+            return TestRunResult(status, message, **merged)
+        return TestRunResult("PASS", "✅ 測試通過", **merged)
+
+    def _remember(self, result: TestRunResult) -> TestRunResult:
+        if result.usage is not None:
+            print(f"    ...資源用量: {result.usage.describe()}")
+        self.last_result = result
+        return result
+
+    def _execute(self, args: list[str], pythonpath: str) -> tuple[int, str, str, ResourceUsage | None]:
+        """
+        執行 pytest，優先使用預熱的 worker pool，不可用時退回冷啟動 subprocess
+        逾時一律丟出 subprocess.TimeoutExpired
+        """
+        if self.pool is not None:
+            try:
+                returncode, stdout, stderr, usage = self.pool.run(
+                    args, pythonpath, cwd=os.getcwd(), timeout=self.timeout, limits=self.limits
+                )
+                if returncode is None:
+                    raise subprocess.TimeoutExpired(args, self.timeout, stdout, stderr)
+                return returncode, stdout, stderr, usage
+            except WorkerUnavailable as e:
+                print(f"    ⚠️ pytest worker 無法使用，改用冷啟動: {e}")
+
+        env = os.environ.copy()
+        env["PYTHONPATH"] = pythonpath
+        with tempfile.TemporaryDirectory(prefix="pytest_usage_") as usage_dir:
+            usage_path = Path(usage_dir) / "usage.json"
             result = subprocess.run(
-                [sys.executable, "-m", "pytest", str(target_file)],
+                self._command(args, usage_path),
                 capture_output=True,
                 text=True,
-                timeout=30,
+                timeout=self.timeout,
                 env=env
             )
-            
-            # 除錯用輸出
-            # print(result.stdout) 
-            # print(result.stderr)
-
-            if result.returncode == 0:
-                return "PASS", "✅ 測試通過"
-            
-            elif result.returncode == 1:
-                # Exit Code 1 代表測試有跑完，但 Assertion Failed
-                # 這在 TDD 階段是正確的「紅燈」
-                return "FAIL", f"🔴 測試邏輯失敗 (Assertion Error):\n{result.stdout}"
-            
-            else:
-                # 其他 Exit Code (2, 3, 4, 5) 代表語法錯誤、Import 錯誤等
-                return "ERROR", f"💥 測試碼本身有錯 (Syntax/Import Error):\n{result.stderr}\n{result.stdout}"
+            return result.returncode, result.stdout, result.stderr, self._read_usage(usage_path)
+
+    async def _aexecute(self, args: list[str], pythonpath: str) -> tuple[int, str, str]:
+        """
+        _execute 的 async 版本：worker pool 的請求交給 thread 等待，
+        冷啟動則用 asyncio subprocess，逾時一樣丟出 subprocess.TimeoutExpired
+        """
+        if self.pool is not None:
+            try:
+                returncode, stdout, stderr, usage = await asyncio.to_thread(
+                    self.pool.run, args, pythonpath, cwd=os.getcwd(), timeout=self.timeout, limits=self.limits
+                )
+                if returncode is None:
+                    raise subprocess.TimeoutExpired(args, self.timeout, stdout, stderr)
+                return returncode, stdout, stderr, usage
+            except WorkerUnavailable as e:
+                print(f"    ⚠️ pytest worker 無法使用，改用冷啟動: {e}")
+
+        env = os.environ.copy()
+        env["PYTHONPATH"] = pythonpath
+        with tempfile.TemporaryDirectory(prefix="pytest_usage_") as usage_dir:
+            usage_path = Path(usage_dir) / "usage.json"
+            proc = await asyncio.create_subprocess_exec(
+                *self._command(args, usage_path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise subprocess.TimeoutExpired(args, self.timeout)
+            except asyncio.CancelledError:
+                # 整個 run 被取消：不留下孤兒 pytest
+                proc.kill()
+                await proc.wait()
+                raise
+            return (proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace"),
+                    self._read_usage(usage_path))
 
-        except subprocess.TimeoutExpired:
-            return "ERROR", "❌ 測試執行逾時 (Timeout)"
-        except Exception as e:
-            return "ERROR", f"❌ 執行發生例外錯誤: {str(e)}"
\ No newline at end of file
+    def _command(self, args: list[str], usage_path: Path) -> list[str]:
+        """冷啟動的指令：有資源上限時經過 sandbox 入口 (套用上限並回報用量)"""
+        if self.limits is None:
+            return [sys.executable, "-m", "pytest", *args]
+        # cgroup 要由父行程在結束後清掉，只有 worker pool (自己 fork、拿得到 pid) 才用
+        limits = replace(self.limits, cgroup_root="")
+        return [sys.executable, sandbox.__file__, json.dumps(limits.to_dict()), str(usage_path), *args]
+
+    def _read_usage(self, usage_path: Path) -> ResourceUsage | None:
+        """sandbox 入口寫出的用量 (被 signal 砍掉時沒有)"""
+        try:
+            return ResourceUsage(**json.loads(usage_path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError):
+            return None
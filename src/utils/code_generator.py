@@ -1,14 +1,62 @@
 import ast
-import black
+import hashlib
+import json
+import threading
+from collections import OrderedDict
 from typing import List, Optional
+from pydantic import BaseModel
 from src.utils.schema import FileSchema, ClassSchema, FunctionSchema
 
+class _LRUCache:
+    """有上限的 LRU 快取 (thread-safe；Best-of-N / 批次模式會從多個 thread 呼叫)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._items),
+                "maxsize": self.maxsize,
+            }
+
 class CodeGenerator:
     """
     使用 Python AST (抽象語法樹) 來生成程式碼。
     保證產出的程式碼 100% 符合 Python 語法結構。
+    生成結果會快取：整份檔案以 FileSchema 的 hash 為 key，
+    個別的 class / function 區塊也各自快取，schema 只改一部分時其餘區塊不必重新 unparse 與排版。
     """
 
+    # 整份檔案 / 單一區塊的快取 (process 內共用，批次模式的 job 之間也能命中)
+    _file_cache = _LRUCache(maxsize=128)
+    _snippet_cache = _LRUCache(maxsize=1024)
+
     @staticmethod
     def _parse_annotation(type_str: str) -> Optional[ast.AST]:
         """
@@ -99,85 +147,128 @@ class CodeGenerator:
         )
 
     @staticmethod
-    def generate_product_code(schema: FileSchema) -> str:
-        """生成產品程式碼"""
-        module_body = []
+    def _format(code_str: str) -> str:
+        """用 black 排版 (第一次排版時才載入 black；沒裝就原樣回傳)"""
+        try:
+            import black
+        except ImportError:
+            return code_str
+
+        try:
+            return black.format_str(code_str, mode=black.Mode())
+        except Exception as e:
+            print(f"⚠️ Formatting failed: {e}")
+            return code_str
+
+    @staticmethod
+    def _create_test_function_node(func: FunctionSchema) -> ast.FunctionDef:
+        """建立測試函式節點 (內容只有 assert True)"""
+        body_nodes = []
+        if func.docstring:
+            body_nodes.append(ast.Expr(value=ast.Constant(value=func.docstring)))
+        
+        # ✅ assert True
+        assert_node = ast.Assert(
+            test=ast.Constant(value=True),
+            msg=None
+        )
+        body_nodes.append(assert_node)
+
+        return ast.FunctionDef(
+            name=func.name,
+            args=ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=body_nodes,
+            decorator_list=[]
+        )
+
+    @staticmethod
+    def _schema_key(kind: str, schema: BaseModel) -> str:
+        """schema 內容的穩定 hash (欄位順序固定，與物件身分無關)"""
+        raw = json.dumps(schema.model_dump(mode="json"), ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(f"{kind}:{raw}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _snippet(kind: str, schema: BaseModel, build) -> str:
+        """
+        一個頂層區塊 (class / function) 排版後的程式碼，以區塊內容為 key 快取
+        build: 回傳該區塊 AST 節點的函式 (只有 cache miss 才會呼叫)
+        """
+        key = CodeGenerator._schema_key(kind, schema)
+        cached = CodeGenerator._snippet_cache.get(key)
+        if cached is not None:
+            return cached
+        snippet = CodeGenerator._render([build(schema)])
+        CodeGenerator._snippet_cache.put(key, snippet)
+        return snippet
 
-        # 1. Imports
-        for imp in schema.imports:
+    @staticmethod
+    def _import_snippet(imports: list[str]) -> str:
+        """import 區塊 (解析失敗的 import 直接略過)"""
+        nodes = []
+        for imp in imports:
             try:
-                import_node = ast.parse(imp).body[0]
-                module_body.append(import_node)
+                nodes.append(ast.parse(imp).body[0])
             except SyntaxError:
-                pass 
+                pass
+        return CodeGenerator._render(nodes) if nodes else ""
 
-        # 2. Classes
-        for cls in schema.classes:
-            module_body.append(CodeGenerator._create_class_node(cls))
+    @staticmethod
+    def _render(nodes: list[ast.stmt]) -> str:
+        """把幾個頂層節點 unparse 並排版"""
+        module = ast.fix_missing_locations(ast.Module(body=nodes, type_ignores=[]))
+        return CodeGenerator._format(ast.unparse(module))
 
-        # 3. Global Functions
-        for func in schema.functions:
-            module_body.append(CodeGenerator._create_function_node(func))
+    @staticmethod
+    def _assemble(kind: str, schema: FileSchema, snippets) -> str:
+        """
+        整份檔案的快取：同一份 schema 直接回傳上次的結果；
+        否則把各區塊 (各自快取) 依 black 的頂層間距 (兩個空行) 接起來
+        """
+        key = CodeGenerator._schema_key(kind, schema)
+        cached = CodeGenerator._file_cache.get(key)
+        if cached is not None:
+            return cached
 
-        module = ast.Module(body=module_body, type_ignores=[])
-        
-        # 4. Unparse & Format
         try:
-            code_str = ast.unparse(module)
+            blocks = [block for block in snippets() if block]
         except Exception as e:
             return f"# Error generating code: {e}"
 
-        if black:
-            try:
-                code_str = black.format_str(code_str, mode=black.Mode())
-            except Exception as e:
-                print(f"⚠️ Formatting failed: {e}")
-
+        code_str = "\n\n".join(block if block.endswith("\n") else block + "\n" for block in blocks)
+        CodeGenerator._file_cache.put(key, code_str)
         return code_str
 
+    @staticmethod
+    def generate_product_code(schema: FileSchema) -> str:
+        """生成產品程式碼"""
+        def snippets():
+            # 1. Imports
+            yield CodeGenerator._import_snippet(schema.imports)
+            # 2. Classes
+            for cls in schema.classes:
+                yield CodeGenerator._snippet("class", cls, CodeGenerator._create_class_node)
+            # 3. Global Functions
+            for func in schema.functions:
+                yield CodeGenerator._snippet("function", func, CodeGenerator._create_function_node)
+
+        return CodeGenerator._assemble("product", schema, snippets)
+
     @staticmethod
     def generate_test_code(schema: FileSchema) -> str:
         """生成測試程式碼"""
-        module_body = []
-
-        # 1. Imports
-        for imp in schema.imports:
-            try:
-                module_body.append(ast.parse(imp).body[0])
-            except: pass
-
-        # 2. Test Functions
-        for func in schema.functions:
-            body_nodes = []
-            if func.docstring:
-                body_nodes.append(ast.Expr(value=ast.Constant(value=func.docstring)))
-            
-            # ✅ assert True
-            assert_node = ast.Assert(
-                test=ast.Constant(value=True),
-                msg=None
-            )
-            body_nodes.append(assert_node)
-
-            func_node = ast.FunctionDef(
-                name=func.name,
-                args=ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[]),
-                body=body_nodes,
-                decorator_list=[]
-            )
-            module_body.append(func_node)
-
-        module = ast.Module(body=module_body, type_ignores=[])
-        
-        try:
-            code_str = ast.unparse(module)
-        except Exception as e:
-            return f"# Error generating code: {e}"
+        def snippets():
+            # 1. Imports
+            yield CodeGenerator._import_snippet(schema.imports)
+            # 2. Test Functions
+            for func in schema.functions:
+                yield CodeGenerator._snippet("test", func, CodeGenerator._create_test_function_node)
 
-        if black:
-            try:
-                code_str = black.format_str(code_str, mode=black.Mode())
-            except Exception as e:
-                print(f"⚠️ Formatting failed: {e}")
+        return CodeGenerator._assemble("test", schema, snippets)
 
-        return code_str
\ No newline at end of file
+    @staticmethod
+    def cache_stats() -> dict:
+        """整份檔案與各區塊快取的命中統計"""
+        return {
+            "files": CodeGenerator._file_cache.stats(),
+            "snippets": CodeGenerator._snippet_cache.stats(),
+        }
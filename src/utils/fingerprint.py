@@ -0,0 +1,35 @@
+import ast
+import hashlib
+import re
+from src.utils.parsers import clean_code_block
+
+# 失敗訊息中每一輪都會變、但不代表「不同失敗」的部分
+_VOLATILE_PATTERNS = [
+    (re.compile(r"\(\d+(\.\d+)?s\)|\bin \d+(\.\d+)?s\b"), "<time>"),     # 耗時
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),                          # 物件位址
+    (re.compile(r"(\.py):\d+"), r"\1:<line>"),                          # 行號 (程式改動會位移)
+    (re.compile(r"\bline \d+\b"), "line <line>"),
+    (re.compile(r"(/tmp|/var/folders)/\S+?/"), "<tmp>/"),               # 暫存目錄
+    (re.compile(r"[ \t]+"), " "),
+]
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def code_fingerprint(code: str) -> str:
+    """
+    產出的程式碼指紋：能 parse 時以 AST 比對 (忽略註解、空白與排版)，否則以去掉行尾空白的原文比對
+    """
+    code = clean_code_block(code or "")
+    try:
+        normalized = ast.dump(ast.parse(code))
+    except SyntaxError:
+        normalized = "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
+    return _digest(normalized)
+
+def failure_fingerprint(status: str, message: str) -> str:
+    """失敗訊號指紋：status + 去掉耗時、行號、位址等易變資訊後的訊息"""
+    normalized = message or ""
+    for pattern, replacement in _VOLATILE_PATTERNS:
+        normalized = pattern.sub(replacement, normalized)
+    return _digest(f"{status}\n{normalized.strip()}")
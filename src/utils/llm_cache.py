@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from pydantic import BaseModel
+import dspy
+
+class LLMCache:
+    """
+    LLM 回應的磁碟快取 (Content-Addressed)
+    以 model + signature + 正規化後的 inputs 算出 key，存放在 SQLite，
+    因此同一份需求重跑時可以跨 process 直接命中，不必再付一次 LLM 延遲。
+    """
+
+    def __init__(self, cache_dir: str = ".cache/llm", ttl_seconds: int = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.db_path = Path(cache_dir) / "responses.sqlite3"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        # 統計 (只計算本 process)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作開新連線，SQLite 自己處理跨 thread / process 的鎖
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _normalize(value):
+        """正規化輸入：統一換行、去掉行尾空白，避免無意義的差異造成 cache miss"""
+        if isinstance(value, str):
+            lines = value.replace("\r\n", "\n").split("\n")
+            return "\n".join(line.rstrip() for line in lines).strip()
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json")
+        if value is None:
+            return ""
+        return value
+
+    @staticmethod
+    def make_key(model: str, signature: type[dspy.Signature], inputs: dict) -> str:
+        """model + signature (含 instructions 與欄位) + inputs → sha256"""
+        payload = {
+            "model": model,
+            "signature": signature.__name__,
+            "instructions": signature.instructions,
+            "fields": list(signature.fields.keys()),
+            "inputs": {k: LLMCache._normalize(v) for k, v in sorted(inputs.items())},
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                # 過期：順手刪掉
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        self.hits += 1
+        return json.loads(value)
+
+    def put(self, key: str, agent: str, value: dict) -> None:
+        now = time.time()
+        raw = json.dumps(value, ensure_ascii=False)
+        size = len(raw.encode("utf-8"))
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, agent, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, raw, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.evictions += cursor.rowcount
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """先清掉過期的，再依 LRU (accessed_at) 清到總大小低於上限"""
+        cursor = conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self.evictions += cursor.rowcount
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+def dump_prediction(prediction: dspy.Prediction) -> dict:
+    """把 dspy.Prediction 轉成可 JSON 序列化的 dict (Pydantic 欄位會轉成 dict)"""
+    data = {}
+    for name in prediction.keys():
+        value = prediction[name]
+        if isinstance(value, BaseModel):
+            value = value.model_dump(mode="json")
+        data[name] = value
+    return data
+
+def load_prediction(signature: type[dspy.Signature], data: dict) -> dspy.Prediction:
+    """依 signature 的 OutputField 型別，把快取資料還原成 dspy.Prediction"""
+    restored = {}
+    for name, value in data.items():
+        field = signature.output_fields.get(name)
+        annotation = field.annotation if field else None
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            value = annotation.model_validate(value)
+        restored[name] = value
+    return dspy.Prediction(**restored)
@@ -0,0 +1,250 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+# 目前正在執行的 node 紀錄 (ContextVar：並行的辦公室 / 候選 thread 各自獨立)
+_active_record: ContextVar["NodeMetrics | None"] = ContextVar("active_node_metrics", default=None)
+
+@dataclass
+class NodeMetrics:
+    """一次 graph node 執行 (某個 round) 的用量與耗時"""
+    node: str
+    round: int = 0
+    started_at: float = field(default_factory=time.time)
+    wall_seconds: float = 0.0
+    llm_calls: int = 0
+    cache_hits: int = 0
+    stream_aborts: int = 0
+    # Coder patch 模式：成功套用 / 套不上改為整檔重寫的次數
+    patches_applied: int = 0
+    patch_fallbacks: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    server_cost: float = 0.0
+    estimated_cost: float = 0.0
+    llm_seconds: float = 0.0
+    # 等待 LLM 額度 (RPM / TPM / 同時請求數) 與限流退避的時間、限流重試次數
+    llm_queue_seconds: float = 0.0
+    rate_limit_retries: int = 0
+    test_runs: int = 0
+    test_seconds: float = 0.0
+    # pytest 子行程的 CPU 時間 (累加) 與 peak RSS (取最大)
+    test_cpu_seconds: float = 0.0
+    test_peak_rss_mb: float = 0.0
+    file_io_seconds: float = 0.0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def add(self, **amounts) -> None:
+        """累加欄位 (Best-of-N 會有多個 thread 同時寫入同一個 node)"""
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def peak(self, **values) -> None:
+        """更新取最大值的欄位"""
+        with self._lock:
+            for name, value in values.items():
+                setattr(self, name, max(getattr(self, name), value))
+
+    def merge(self, other: "NodeMetrics") -> None:
+        """把另一份紀錄 (例如 Best-of-N 候選) 併進來"""
+        with self._lock:
+            for name in MetricsCollector.SUMMARY_FIELDS:
+                if name == "wall_seconds":
+                    continue
+                if name in MetricsCollector.PEAK_FIELDS:
+                    setattr(self, name, max(getattr(self, name), getattr(other, name)))
+                else:
+                    setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+class MetricsCollector:
+    """
+    記錄每個 graph node / round 的 token、成本與延遲
+    - 每筆紀錄即時寫入 JSONL (方便事後分析)
+    - 記憶體只保留最近 history_limit 筆，長時間執行不會無限成長
+    - 另外維護每個 node 的累計值，用來印出結束時的摘要表
+    """
+
+    SUMMARY_FIELDS = [
+        "llm_calls", "cache_hits", "stream_aborts", "patches_applied", "patch_fallbacks", "prompt_tokens",
+        "completion_tokens", "server_cost", "estimated_cost", "llm_seconds", "llm_queue_seconds",
+        "rate_limit_retries", "test_runs", "test_seconds", "test_cpu_seconds", "test_peak_rss_mb",
+        "file_io_seconds", "wall_seconds",
+    ]
+    # 彙總時取最大值而不是加總的欄位
+    PEAK_FIELDS = {"test_peak_rss_mb"}
+
+    def __init__(self, output_path: str | None = None, input_price_per_m: float = 0.0,
+                 output_price_per_m: float = 0.0, history_limit: int = 200):
+        self.output_path = Path(output_path) if output_path else None
+        self.input_price_per_m = input_price_per_m
+        self.output_price_per_m = output_price_per_m
+        self.records: deque[NodeMetrics] = deque(maxlen=history_limit)
+        self.totals: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current() -> NodeMetrics | None:
+        """取得目前 node 的紀錄 (不在 node 內時為 None)"""
+        return _active_record.get()
+
+    @contextmanager
+    def node(self, name: str):
+        """包住一次 node 執行，結束時寫出紀錄"""
+        record = NodeMetrics(node=name)
+        token = _active_record.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            _active_record.reset(token)
+            record.wall_seconds = time.perf_counter() - started
+            self._finish(record)
+
+    @contextmanager
+    def isolated(self, discard: threading.Event | None = None):
+        """
+        在獨立的紀錄中執行，結束時併回目前 node
+        discard 已觸發時丟掉 (例如 Best-of-N 已選出勝者，node 的紀錄可能已經寫出)
+        """
+        parent = self.current()
+        record = NodeMetrics(node="")
+        token = _active_record.set(record)
+        try:
+            yield record
+        finally:
+            _active_record.reset(token)
+            if parent is not None and not (discard and discard.is_set()):
+                parent.merge(record)
+
+    @contextmanager
+    def timed(self, field_name: str, count_field: str | None = None):
+        """量測一段程式的耗時，累加到目前 node 的指定欄位"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.current()
+            if record is not None:
+                amounts = {field_name: time.perf_counter() - started}
+                if count_field:
+                    amounts[count_field] = 1
+                record.add(**amounts)
+
+    def record_llm_call(self, history_entries: list[dict], seconds: float) -> dict:
+        """
+        把一次 agent 呼叫新增的 lm.history 紀錄累加到目前 node
+        Returns: 這次呼叫的用量摘要 (方便印出)
+        """
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "server_cost": 0.0}
+        for entry in history_entries:
+            entry_usage = entry.get("usage") or {}
+            usage["prompt_tokens"] += entry_usage.get("prompt_tokens") or 0
+            usage["completion_tokens"] += entry_usage.get("completion_tokens") or 0
+            usage["server_cost"] += entry.get("cost") or 0.0
+
+        usage["estimated_cost"] = (
+            usage["prompt_tokens"] * self.input_price_per_m
+            + usage["completion_tokens"] * self.output_price_per_m
+        ) / 1_000_000
+        usage["llm_seconds"] = seconds
+
+        record = self.current()
+        if record is not None:
+            record.add(llm_calls=1, **usage)
+        return usage
+
+    def record_llm_queue(self, seconds: float, retries: int) -> None:
+        record = self.current()
+        if record is not None and (seconds or retries):
+            record.add(llm_queue_seconds=seconds, rate_limit_retries=retries)
+
+    def record_cache_hit(self) -> None:
+        record = self.current()
+        if record is not None:
+            record.add(cache_hits=1)
+
+    def record_stream_abort(self) -> None:
+        record = self.current()
+        if record is not None:
+            record.add(stream_aborts=1)
+
+    def record_patch(self, applied: bool) -> None:
+        record = self.current()
+        if record is not None:
+            record.add(**{"patches_applied" if applied else "patch_fallbacks": 1})
+
+    def record_test_usage(self, usage) -> None:
+        """一次 pytest 執行的資源用量 (sandbox.ResourceUsage；量不到時為 None)"""
+        record = self.current()
+        if record is not None and usage is not None:
+            record.add(test_cpu_seconds=usage.cpu_seconds)
+            record.peak(test_peak_rss_mb=usage.peak_rss_bytes / 2**20)
+
+    def _finish(self, record: NodeMetrics) -> None:
+        with self._lock:
+            self.records.append(record)
+
+            totals = self.totals.setdefault(record.node, {"runs": 0, **{f: 0 for f in self.SUMMARY_FIELDS}})
+            totals["runs"] += 1
+            for f in self.SUMMARY_FIELDS:
+                if f in self.PEAK_FIELDS:
+                    totals[f] = max(totals[f], getattr(record, f))
+                else:
+                    totals[f] += getattr(record, f)
+
+            if self.output_path:
+                self.output_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.output_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+
+    def summary(self) -> dict:
+        """每個 node 的累計值 + 全體合計"""
+        with self._lock:
+            rows = {node: dict(values) for node, values in self.totals.items()}
+        total = {"runs": 0, **{f: 0 for f in self.SUMMARY_FIELDS}}
+        for values in rows.values():
+            for key in total:
+                if key in self.PEAK_FIELDS:
+                    total[key] = max(total[key], values[key])
+                else:
+                    total[key] += values[key]
+        rows["TOTAL"] = total
+        return rows
+
+    def print_summary(self) -> None:
+        rows = self.summary()
+        header = f"{'node':<12}{'runs':>6}{'calls':>7}{'in_tok':>10}{'out_tok':>10}" \
+                 f"{'cost$':>10}{'llm_s':>9}{'queue_s':>9}{'test_s':>9}{'cpu_s':>8}{'rss_mb':>8}{'io_s':>8}{'wall_s':>9}"
+        print("\n📊 執行統計 (per node)")
+        print(header)
+        print("-" * len(header))
+        for node, v in rows.items():
+            cost = v["server_cost"] or v["estimated_cost"]
+            print(f"{node:<12}{v['runs']:>6}{v['llm_calls']:>7}{v['prompt_tokens']:>10}"
+                  f"{v['completion_tokens']:>10}{cost:>10.4f}{v['llm_seconds']:>9.2f}{v['llm_queue_seconds']:>9.2f}"
+                  f"{v['test_seconds']:>9.2f}{v['test_cpu_seconds']:>8.2f}{v['test_peak_rss_mb']:>8.1f}"
+                  f"{v['file_io_seconds']:>8.3f}{v['wall_seconds']:>9.2f}")
+
+def new_history_entries(history: list, last_seen) -> list:
+    """
+    取出 last_seen 之後新增的 history 紀錄
+    (以物件比對而非索引，因為 history 可能被截斷)
+    """
+    new_entries = []
+    for entry in reversed(history):
+        if entry is last_seen:
+            break
+        new_entries.append(entry)
+    new_entries.reverse()
+    return new_entries
@@ -0,0 +1,161 @@
+import difflib
+import re
+from dataclasses import dataclass
+
+# Coder 的 patch 輸出支援兩種格式：
+# 1. search / replace 區塊 (可以有多個，依序套用)
+#    <<<<<<< SEARCH
+#    原本的程式碼 (要逐字複製)
+#    =======
+#    修改後的程式碼
+#    >>>>>>> REPLACE
+# 2. unified diff (@@ -行號,行數 +行號,行數 @@ 開頭的 hunk；---/+++ 檔頭可有可無)
+
+_BLOCK_RE = re.compile(r"^<{5,9} SEARCH[ \t]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[ \t]*$", re.DOTALL | re.MULTILINE)
+_HUNK_RE = re.compile(r"^@@\s*-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?\s*@@")
+_FILE_HEADER = ("--- ", "+++ ", "diff ", "index ", "```")
+
+class PatchError(ValueError):
+    """patch 無法套用 (格式看不懂、找不到要修改的位置、有多處符合)"""
+
+@dataclass
+class Edit:
+    """一處修改：把 search 換成 replace"""
+    search: str
+    replace: str
+    # unified diff hunk 標示的原始行號 (0-based)；有多個候選位置時挑最近的
+    hint: int | None = None
+
+def parse_edits(patch: str) -> list[Edit]:
+    blocks = _BLOCK_RE.findall(patch)
+    if blocks:
+        return [Edit(search, replace) for search, replace in blocks]
+    if any(line.startswith("@@") for line in patch.splitlines()):
+        return _parse_unified(patch)
+    raise PatchError("看不懂的 patch 格式 (需要 SEARCH/REPLACE 區塊或 unified diff)")
+
+def _parse_unified(patch: str) -> list[Edit]:
+    edits = []
+    old, new, hint = None, None, None
+
+    def flush():
+        if old is not None and (old != new):
+            edits.append(Edit("\n".join(old), "\n".join(new), hint))
+
+    for line in patch.splitlines():
+        if line.startswith("@@"):
+            flush()
+            match = _HUNK_RE.match(line)
+            old, new = [], []
+            hint = max(int(match.group(1)) - 1, 0) if match else None
+        elif old is None or line.startswith(_FILE_HEADER) or line.startswith("\\"):
+            # 第一個 hunk 之前的說明文字、檔頭、"\ No newline at end of file"
+            continue
+        elif line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith("+"):
+            new.append(line[1:])
+        else:
+            # context 行 (空白行常被 LLM 省略開頭的空格)
+            old.append(line[1:] if line.startswith(" ") else line)
+            new.append(line[1:] if line.startswith(" ") else line)
+    flush()
+    if not edits:
+        raise PatchError("unified diff 裡沒有任何修改")
+    return edits
+
+def apply_patch(original: str, patch: str, fuzzy_threshold: float = 0.85) -> str:
+    """
+    把 patch 套用到 original，回傳修改後的內容
+    找位置時依序嘗試：逐字相同 → 忽略行尾空白 → 忽略縮排 → 相似度 >= fuzzy_threshold 的最佳位置
+    任何一處無法套用就丟出 PatchError (不回傳套用一半的結果)
+    """
+    # 統一用 \n 比對，原檔是 CRLF 的話結果也換回 CRLF
+    newline = "\r\n" if "\r\n" in original else "\n"
+    original, patch = original.replace("\r\n", "\n"), patch.replace("\r\n", "\n")
+    lines = original.splitlines()
+    # unified diff 的行號以原檔為準，前面的修改改變了行數就要跟著位移
+    offset = 0
+    for edit in parse_edits(patch):
+        search, replace = edit.search.splitlines(), edit.replace.splitlines()
+        hint = edit.hint + offset if edit.hint is not None else None
+        if not any(line.strip() for line in search):
+            # 沒有 context 的純新增：插在標示的行號，沒有行號就加在檔尾
+            start = end = min(hint, len(lines)) if hint is not None else len(lines)
+        else:
+            start, end, indent = _locate(lines, search, hint, fuzzy_threshold)
+            replace = _reindent(replace, *indent)
+        lines[start:end] = replace
+        offset += len(replace) - (end - start)
+    result = "\n".join(lines) + ("\n" if original.endswith("\n") or not original else "")
+    return result.replace("\n", newline)
+
+def _locate(lines: list[str], search: list[str], hint: int | None,
+            fuzzy_threshold: float) -> tuple[int, int, tuple[str, str]]:
+    """Returns: (起始行, 結束行, (要補上的縮排, 要去掉的縮排))"""
+    n = len(search)
+    windows = range(len(lines) - n + 1)
+
+    for normalize in (lambda s: s, str.rstrip):
+        starts = [i for i in windows if [normalize(l) for l in lines[i:i + n]] == [normalize(l) for l in search]]
+        if starts:
+            start = _pick(starts, hint)
+            return start, start + n, ("", "")
+
+    stripped = [l.strip() for l in search]
+    starts = [i for i in windows if [l.strip() for l in lines[i:i + n]] == stripped]
+    if starts:
+        start = _pick(starts, hint)
+        return start, start + n, _indent_delta(lines[start:start + n], search)
+
+    # 相似度比對 (LLM 抄錯幾個字、漏掉註解)：只比較去掉縮排後的內容
+    target = "\n".join(stripped)
+    best, best_ratio = [], fuzzy_threshold
+    for i in windows:
+        matcher = difflib.SequenceMatcher(None, "\n".join(l.strip() for l in lines[i:i + n]), target, autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = [i], ratio
+        elif ratio == best_ratio:
+            best.append(i)
+    if not best:
+        preview = next((l.strip() for l in search if l.strip()), "")
+        raise PatchError(f"找不到要修改的位置 (開頭為 {preview!r})")
+    start = _pick(best, hint)
+    return start, start + n, _indent_delta(lines[start:start + n], search)
+
+def _pick(starts: list[int], hint: int | None) -> int:
+    """多個候選位置：有行號時挑最近的，沒有行號就無法判斷"""
+    if len(starts) == 1:
+        return starts[0]
+    if hint is None:
+        raise PatchError(f"要修改的程式碼有 {len(starts)} 處符合，請附上更多前後文")
+    return min(starts, key=lambda i: abs(i - hint))
+
+def _indentation(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+def _indent_delta(found: list[str], search: list[str]) -> tuple[str, str]:
+    """比較實際位置與 patch 第一個非空白行的縮排，算出 replace 需要補上 / 去掉的縮排"""
+    pairs = [(f, s) for f, s in zip(found, search) if f.strip() and s.strip()]
+    if not pairs:
+        return "", ""
+    actual, expected = _indentation(pairs[0][0]), _indentation(pairs[0][1])
+    if actual.startswith(expected):
+        return actual[len(expected):], ""
+    if expected.startswith(actual):
+        return "", expected[len(actual):]
+    return "", ""
+
+def _reindent(lines: list[str], add: str, remove: str) -> list[str]:
+    result = []
+    for line in lines:
+        if not line.strip():
+            result.append(line)
+            continue
+        if remove and line.startswith(remove):
+            line = line[len(remove):]
+        result.append(add + line)
+    return result
@@ -0,0 +1,138 @@
+import difflib
+import re
+
+class ContextAssembler:
+    """
+    組裝 QA / Coder 的 prompt 輸入，並控制在 token 預算內
+    - 上次的嘗試若與目前檔案相同就不重送；不同則改送 diff
+    - pytest 輸出只保留失敗測試的段落
+    - 仍超過預算時，依優先順序從最不重要的欄位開始截斷
+    """
+
+    # pytest 輸出中，各段落的分隔線 (e.g. "===== FAILURES =====", "_____ test_x _____")
+    _SECTION_RE = re.compile(r"^={3,} (.+?) ={3,}$")
+    _TEST_HEADER_RE = re.compile(r"^_{3,} (.+?) _{3,}$")
+
+    def __init__(self, token_budget: int = 12000, feedback_max_lines: int = 40):
+        self.token_budget = token_budget
+        self.feedback_max_lines = feedback_max_lines
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """粗估 token 數：ASCII 約 4 字元一個 token，中文等非 ASCII 約一字一個"""
+        if not text:
+            return 0
+        non_ascii = sum(1 for ch in text if ord(ch) > 127)
+        return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+    @staticmethod
+    def collapse_previous(previous: str, current: str) -> str:
+        """把上次的嘗試改寫成相對於目前檔案的 diff (相同則只留一句說明)"""
+        if not previous:
+            return previous
+        if previous.strip() == (current or "").strip():
+            return "(與目前的檔案內容相同)"
+
+        diff = "\n".join(difflib.unified_diff(
+            (current or "").splitlines(), previous.splitlines(),
+            fromfile="current", tofile="last_attempt", lineterm=""
+        ))
+        # diff 反而比較長時 (幾乎整份重寫)，直接送原文
+        if len(diff) >= len(previous):
+            return previous
+        return "(以下為上次嘗試相對於目前檔案的 unified diff)\n" + diff
+
+    def trim_feedback(self, message: str) -> str:
+        """只保留 pytest 輸出中失敗/錯誤測試的段落，去掉 session header、進度點等雜訊"""
+        if not message:
+            return message
+
+        lines = message.splitlines()
+        kept = [lines[0]]  # 第一行是 TestRunner 的狀態說明
+        section = None
+        current_test = []
+
+        def flush():
+            if current_test:
+                kept.extend(self._shorten(current_test))
+                current_test.clear()
+
+        for line in lines[1:]:
+            match = self._SECTION_RE.match(line.strip())
+            if match:
+                flush()
+                title = match.group(1)
+                section = "failures" if title in ("FAILURES", "ERRORS") else \
+                          "summary" if title == "short test summary info" else None
+                if section:
+                    kept.append(line)
+                continue
+
+            if section == "failures":
+                if self._TEST_HEADER_RE.match(line.strip()):
+                    flush()
+                current_test.append(line)
+            elif section == "summary":
+                kept.append(line)
+        flush()
+
+        # 找不到任何 pytest 段落 (例如 import 錯誤只有 traceback)，保留尾端
+        if len(kept) == 1:
+            kept.extend(self._shorten(lines[1:]))
+        return "\n".join(kept)
+
+    def _shorten(self, lines: list[str]) -> list[str]:
+        """過長的段落只留開頭 (測試本體) 與結尾 (錯誤訊息與位置)"""
+        if len(lines) <= self.feedback_max_lines:
+            return lines
+        head = self.feedback_max_lines // 2
+        tail = self.feedback_max_lines - head
+        return lines[:head] + [f"... (略去 {len(lines) - head - tail} 行) ..."] + lines[-tail:]
+
+    def fit_budget(self, fields: dict, trim_order: list[str]) -> dict:
+        """超過預算時，依 trim_order (最不重要的在前) 逐一截斷欄位"""
+        fields = dict(fields)
+        total = sum(self.estimate_tokens(v) for v in fields.values() if isinstance(v, str))
+
+        for key in trim_order:
+            if total <= self.token_budget:
+                break
+            text = fields.get(key)
+            if not isinstance(text, str) or not text:
+                continue
+
+            tokens = self.estimate_tokens(text)
+            allowed = max(tokens - (total - self.token_budget), 0)
+            keep_chars = int(len(text) * allowed / tokens)
+            if keep_chars < len(text):
+                head = keep_chars // 2
+                tail = keep_chars - head
+                omitted = len(text) - keep_chars
+                fields[key] = text[:head] + f"\n... (超過 prompt 預算，略去 {omitted} 字) ...\n" + \
+                    (text[-tail:] if tail else "")
+                total -= tokens - self.estimate_tokens(fields[key])
+        return fields
+
+    def assemble(self, fields: dict, previous: dict[str, str] | None = None,
+                 feedback: list[str] | None = None, trim_order: list[str] | None = None) -> dict:
+        """
+        Args:
+            fields: 原始 prompt 輸入
+            previous: {上次嘗試的欄位: 目前檔案的欄位}，例如 {"last_op_code": "ip_code"}
+            feedback: 存放 pytest 輸出的欄位
+            trim_order: 超過預算時的截斷順序 (最不重要的在前)
+        """
+        before = sum(self.estimate_tokens(v) for v in fields.values() if isinstance(v, str))
+        fields = dict(fields)
+
+        for prev_key, cur_key in (previous or {}).items():
+            fields[prev_key] = self.collapse_previous(fields.get(prev_key), fields.get(cur_key))
+        for key in feedback or []:
+            fields[key] = self.trim_feedback(fields.get(key))
+        if self.token_budget > 0:
+            fields = self.fit_budget(fields, trim_order or [])
+
+        after = sum(self.estimate_tokens(v) for v in fields.values() if isinstance(v, str))
+        if after < before:
+            print(f"    📉 [Context] prompt 約 {before} → {after} tokens")
+        return fields
@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+# 視為暫時性 (值得等一下再試) 的錯誤：litellm / openai 的例外類別名稱與 HTTP status
+_TRANSIENT_ERRORS = {
+    "RateLimitError", "ServiceUnavailableError", "APIConnectionError", "Timeout",
+    "APITimeoutError", "InternalServerError",
+}
+_TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+_WINDOW_SECONDS = 60.0
+
+def is_transient(error: BaseException) -> bool:
+    """沿著 __cause__ / __context__ 找 (dspy 的 adapter 可能把原本的例外包起來)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in _TRANSIENT_ERRORS or getattr(error, "status_code", None) in _TRANSIENT_STATUS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+@dataclass(order=True)
+class _Ticket:
+    """排隊中的一次 LLM 呼叫 (priority 小的先；同優先權先來先服務)"""
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+class LLMGovernor:
+    """
+    整個 process 共用的 LLM 呼叫排程器：多個辦公室 (batch / project / Best-of-N) 共用同一把 API key 時，
+    在送出請求前統一控管每分鐘請求數 (RPM)、每分鐘 token 數 (TPM) 與同時進行的請求數。
+    - 額度不夠時依優先權排隊 (先把進行中的 Coder 修完，再開新的 Architect)
+    - 遇到 429 / 5xx 等暫時性錯誤，整個 process 一起退避 (jitter)，再重新排隊重試
+    - 同步 (thread) 與 async (ainvoke) 的呼叫共用同一份額度
+    """
+
+    _shared: "LLMGovernor | None" = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_in_flight: int = 0, max_retries: int = 4,
+                 backoff_base: float = 2.0, backoff_max: float = 60.0):
+        # 0 = 不限制
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Condition()
+        self._queue: list[_Ticket] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        # 最近一分鐘送出的請求: (時間, token 數)
+        self._window: deque[list] = deque()
+        # 收到限流錯誤後，所有呼叫都等到這個時間點
+        self._cooldown_until = 0.0
+        self._stats = {"calls": 0, "retries": 0, "wait_seconds": 0.0, "max_queue_depth": 0}
+
+    @classmethod
+    def shared(cls, **kwargs) -> "LLMGovernor":
+        """process 內共用的 governor (第一次呼叫時的參數生效)"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**kwargs)
+            return cls._shared
+
+    # --- 額度 ---
+    def _delay(self, ticket: _Ticket, now: float) -> float | None:
+        """ticket 現在可以送出時回傳 None，否則回傳建議等待的秒數 (呼叫時需持有 lock)"""
+        while self._window and now - self._window[0][0] >= _WINDOW_SECONDS:
+            self._window.popleft()
+
+        if self._queue[0] is not ticket:
+            return 0.05
+        if now < self._cooldown_until:
+            return self._cooldown_until - now
+        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+            return 0.05
+        if self.rpm and len(self._window) >= self.rpm:
+            return self._window[0][0] + _WINDOW_SECONDS - now
+        if self.tpm and self._window:
+            used = sum(tokens for _, tokens in self._window)
+            # 單次就超過 TPM 的請求只要求視窗淨空，否則永遠排不到
+            if used + ticket.tokens > self.tpm:
+                expired, freed = now, used + ticket.tokens - self.tpm
+                for sent_at, tokens in self._window:
+                    freed -= tokens
+                    expired = sent_at
+                    if freed <= 0:
+                        break
+                return max(expired + _WINDOW_SECONDS - now, 0.05)
+        return None
+
+    def _enqueue(self, priority: int, tokens: int) -> _Ticket:
+        with self._lock:
+            ticket = _Ticket(priority, next(self._seq), tokens)
+            heapq.heappush(self._queue, ticket)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+            return ticket
+
+    def _admit(self, ticket: _Ticket, now: float) -> list:
+        """送出：離開佇列、佔用額度 (呼叫時需持有 lock)。Returns: 視窗中的紀錄 (之後用實際 token 數更新)"""
+        heapq.heappop(self._queue)
+        self._in_flight += 1
+        entry = [now, ticket.tokens]
+        self._window.append(entry)
+        self._stats["calls"] += 1
+        self._stats["wait_seconds"] += now - ticket.enqueued_at
+        self._lock.notify_all()
+        return entry
+
+    def _acquire(self, priority: int, tokens: int) -> tuple[list, float]:
+        ticket = self._enqueue(priority, tokens)
+        try:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(ticket, now)
+                    if delay is None:
+                        return self._admit(ticket, now), now - ticket.enqueued_at
+                    self._lock.wait(timeout=delay)
+        except BaseException:
+            # 等待中被中斷 (KeyboardInterrupt、thread 被收掉)：ticket 留在佇列最前面會卡住所有人
+            self._abandon(ticket)
+            raise
+
+    async def _aacquire(self, priority: int, tokens: int) -> tuple[list, float]:
+        ticket = self._enqueue(priority, tokens)
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    delay = self._delay(ticket, now)
+                    if delay is None:
+                        return self._admit(ticket, now), now - ticket.enqueued_at
+                # event loop 上不能 block：短暫讓出後再檢查
+                await asyncio.sleep(min(delay, 0.05))
+        except BaseException:
+            # task 被取消：同樣要把 ticket 移出佇列
+            self._abandon(ticket)
+            raise
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._lock.notify_all()
+
+    def _release(self, entry: list, actual_tokens: int | None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if actual_tokens is not None:
+                entry[1] = actual_tokens
+            self._lock.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        """指數退避 + jitter；同時讓其他呼叫一起暫停 (伺服器端的額度已經用完)"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+            self._stats["retries"] += 1
+        return delay
+
+    # --- 對外介面 ---
+    def call(self, fn, priority: int = 0, tokens: int = 0, usage=None):
+        """
+        排隊取得額度後執行 fn()；暫時性錯誤退避後重試 (最多 max_retries 次)
+        usage: 呼叫完成後回傳實際 token 數的函式 (用來校正 TPM 的預估值)
+        Returns: (fn 的結果, 排隊等待的秒數 (含退避), 重試次數)
+        """
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            entry, queued = self._acquire(priority, tokens)
+            waited += queued
+            actual = None
+            try:
+                result = fn()
+                actual = usage() if usage else None
+                return result, waited, attempt
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+                print(f"    ⏳ [RateLimit] {type(e).__name__}，{self._backoff(attempt):.1f}s 後重試...")
+            finally:
+                self._release(entry, actual)
+
+    async def acall(self, fn, priority: int = 0, tokens: int = 0, usage=None):
+        """call 的 async 版本 (fn 回傳 coroutine)"""
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            entry, queued = await self._aacquire(priority, tokens)
+            waited += queued
+            actual = None
+            try:
+                result = await fn()
+                actual = usage() if usage else None
+                return result, waited, attempt
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+                print(f"    ⏳ [RateLimit] {type(e).__name__}，{self._backoff(attempt):.1f}s 後重試...")
+            finally:
+                self._release(entry, actual)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "queue_depth": len(self._queue), "in_flight": self._in_flight}
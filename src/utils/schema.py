@@ -18,4 +18,9 @@ class FileSchema(BaseModel):
     filename: str
     imports: List[str] = Field(description="需要的 import 語句列表", default=[])
     classes: List[ClassSchema] = []
-    functions: List[FunctionSchema] = [] # 支援全域函式
\ No newline at end of file
+    functions: List[FunctionSchema] = [] # 支援全域函式
+
+class ModuleSpec(BaseModel):
+    filepath: str = Field(description="模組檔案名稱，例如 'order_service.py'")
+    requirement: str = Field(description="這個模組要負責的功能與對外介面")
+    depends_on: List[str] = Field(description="會 import 的其他模組檔案名稱 (只列專案內的模組)", default=[])
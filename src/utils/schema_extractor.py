@@ -0,0 +1,272 @@
+import ast
+import builtins
+import re
+from pathlib import Path
+from src.utils.schema import FileSchema, ClassSchema, FunctionSchema
+
+class SchemaExtractor:
+    """
+    不經過 LLM，直接從已經結構化的設計 (規格書中的 Python 簽章、augment_context 的 Class Diagram)
+    組出 Scaffolder 需要的 FileSchema。
+    只要有任何一處看不懂或不完整就回傳 None，交回給 ScaffolderAgent 處理。
+    """
+
+    _CODE_BLOCK_RE = re.compile(r"```(?:python|py)\s*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+    # e.g. "- Interface: DiscountStrategy (method: apply_discount(original_price: float) -> float)"
+    _DIAGRAM_LINE_RE = re.compile(
+        r"^\s*(?:[-*+]\s*)?(?P<kind>[A-Za-z][A-Za-z ]*?)\s*:\s*(?P<name>[A-Za-z_]\w*)\s*(?:\((?P<detail>.*)\))?\s*$"
+    )
+    _METHODS_RE = re.compile(r"^\s*(?:methods?|functions?)\s*:\s*(?P<signatures>.*)$", re.IGNORECASE)
+    _SIGNATURE_RE = re.compile(r"^\s*(?P<name>[A-Za-z_]\w*)\s*\((?P<args>.*)\)\s*(?:->\s*(?P<returns>.+?))?\s*$")
+
+    # Diagram 中代表「介面 / 抽象類別」的種類，之後的 Concrete 類別預設繼承它
+    _INTERFACE_KINDS = {"interface", "abstract", "abstract class", "base", "base class", "protocol"}
+    _CLASS_KINDS = _INTERFACE_KINDS | {"concrete", "class", "context", "concrete class", "implementation", "model"}
+    _FUNCTION_KINDS = {"function", "func"}
+    # 生成的骨架不帶 decorator，只接受不影響呼叫方式的
+    _ALLOWED_DECORATORS = {"abstractmethod"}
+
+    @staticmethod
+    def extract(p_filepath: str, technical_spec: str | None,
+                augment_context: str | None) -> tuple[FileSchema, FileSchema] | None:
+        """
+        依序嘗試規格書的 Python code block、augment_context 的 Class Diagram
+        Returns: (product_structure, test_structure)；萃取不完整時回傳 None
+        """
+        for parse in (SchemaExtractor._from_code_blocks, SchemaExtractor._from_diagram):
+            for text in (technical_spec, augment_context):
+                if not text:
+                    continue
+                parsed = parse(text)
+                if parsed is None:
+                    continue
+                classes, functions, imports = parsed
+                product = FileSchema(
+                    filename=Path(p_filepath).name,
+                    # 型別標註延後求值：不必為標註補 import，也不怕類別之間互相引用的順序
+                    imports=["from __future__ import annotations", *imports],
+                    classes=classes,
+                    functions=functions,
+                )
+                if SchemaExtractor._is_complete(product):
+                    return product, SchemaExtractor._test_schema(product)
+        return None
+
+    # --- 規格書中的 Python 簽章 ---
+    @staticmethod
+    def _from_code_blocks(text: str):
+        classes, functions, imports = [], [], []
+        for block in SchemaExtractor._CODE_BLOCK_RE.findall(text):
+            try:
+                tree = ast.parse(block)
+            except SyntaxError:
+                continue
+            for node in tree.body:
+                if isinstance(node, (ast.Import, ast.ImportFrom)):
+                    if not (isinstance(node, ast.ImportFrom) and node.module == "__future__"):
+                        imports.append(ast.unparse(node))
+                elif isinstance(node, ast.ClassDef):
+                    # 規格書裡的測試類別 (pytest 的 Test* 慣例) 不屬於產品程式碼
+                    if node.name.startswith("Test"):
+                        continue
+                    cls = SchemaExtractor._class_from_ast(node)
+                    if cls is None:
+                        return None
+                    classes.append(cls)
+                elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    # 規格書裡的測試範例不屬於產品程式碼
+                    if node.name.startswith("test_"):
+                        continue
+                    func = SchemaExtractor._function_from_ast(node)
+                    if func is None:
+                        return None
+                    functions.append(func)
+        if not classes and not functions:
+            return None
+        return SchemaExtractor._dedupe(classes), SchemaExtractor._dedupe(functions), list(dict.fromkeys(imports))
+
+    @staticmethod
+    def _class_from_ast(node: ast.ClassDef) -> ClassSchema | None:
+        if node.decorator_list or node.keywords or len(node.bases) > 1:
+            return None
+        methods = []
+        for item in node.body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                method = SchemaExtractor._function_from_ast(item)
+                if method is None:
+                    return None
+                methods.append(method)
+        return ClassSchema(
+            name=node.name,
+            parent_class=ast.unparse(node.bases[0]) if node.bases else None,
+            methods=methods,
+            docstring=ast.get_docstring(node) or "",
+        )
+
+    @staticmethod
+    def _function_from_ast(node: ast.FunctionDef | ast.AsyncFunctionDef) -> FunctionSchema | None:
+        decorators = {ast.unparse(d).split(".")[-1] for d in node.decorator_list}
+        if decorators - SchemaExtractor._ALLOWED_DECORATORS:
+            return None
+        # FunctionSchema 只表達得了一般的位置參數
+        a = node.args
+        if a.posonlyargs or a.vararg or a.kwonlyargs or a.kwarg:
+            return None
+        args = [f"{arg.arg}: {ast.unparse(arg.annotation)}" if arg.annotation else arg.arg for arg in a.args]
+        return FunctionSchema(
+            name=node.name,
+            args=args,
+            return_type=ast.unparse(node.returns) if node.returns else "None",
+            docstring=ast.get_docstring(node) or "",
+            is_async=isinstance(node, ast.AsyncFunctionDef),
+        )
+
+    # --- augment_context 的 Class Diagram ---
+    @staticmethod
+    def _from_diagram(text: str):
+        classes, functions = [], []
+        interface = None
+        for line in text.splitlines():
+            match = SchemaExtractor._DIAGRAM_LINE_RE.match(line)
+            if not match:
+                continue
+            kind = match.group("kind").strip().lower()
+            name = match.group("name")
+            detail = match.group("detail") or ""
+
+            if kind in SchemaExtractor._FUNCTION_KINDS:
+                func = SchemaExtractor._parse_signature(f"{name}({detail})", is_method=False)
+                if func is None:
+                    return None
+                functions.append(func)
+                continue
+            if kind not in SchemaExtractor._CLASS_KINDS:
+                continue
+
+            methods, docstring = [], detail.strip()
+            methods_match = SchemaExtractor._METHODS_RE.match(detail)
+            if methods_match:
+                docstring = ""
+                for signature in SchemaExtractor._split_top_level(methods_match.group("signatures")):
+                    method = SchemaExtractor._parse_signature(signature, is_method=True)
+                    if method is None:
+                        return None
+                    methods.append(method)
+
+            cls = ClassSchema(name=name, methods=methods, docstring=docstring)
+            if kind in SchemaExtractor._INTERFACE_KINDS:
+                interface = cls
+            elif kind.startswith("concrete") or kind == "implementation":
+                # Strategy 類的圖：Concrete 實作前面宣告的介面，補上介面的方法
+                if interface is None:
+                    return None
+                cls.parent_class = interface.name
+                own = {m.name for m in cls.methods}
+                cls.methods = cls.methods + [m.model_copy() for m in interface.methods if m.name not in own]
+            classes.append(cls)
+
+        if not classes and not functions:
+            return None
+        return classes, functions, []
+
+    @staticmethod
+    def _parse_signature(signature: str, is_method: bool) -> FunctionSchema | None:
+        """'apply_discount(original_price: float) -> float' → FunctionSchema"""
+        match = SchemaExtractor._SIGNATURE_RE.match(signature)
+        if not match:
+            return None
+        args = []
+        for arg in SchemaExtractor._split_top_level(match.group("args")):
+            # 預設值不在 FunctionSchema 的表達範圍內，骨架只保留名稱與型別
+            arg = arg.split("=", 1)[0].strip()
+            name = arg.split(":", 1)[0].strip()
+            if not name.isidentifier():
+                return None
+            args.append(arg)
+        if is_method and (not args or args[0].split(":")[0].strip() != "self"):
+            args.insert(0, "self")
+        return FunctionSchema(
+            name=match.group("name"),
+            args=args,
+            return_type=(match.group("returns") or "None").strip(),
+        )
+
+    @staticmethod
+    def _split_top_level(text: str) -> list[str]:
+        """以逗號 / 分號切開，但不切括號裡的 (e.g. 'a(x: int, y: int), b()')"""
+        parts, depth, current = [], 0, ""
+        for ch in text:
+            if ch in "([{":
+                depth += 1
+            elif ch in ")]}":
+                depth -= 1
+            if ch in ",;" and depth == 0:
+                parts.append(current)
+                current = ""
+            else:
+                current += ch
+        parts.append(current)
+        return [p.strip() for p in parts if p.strip()]
+
+    # --- 驗證與測試骨架 ---
+    @staticmethod
+    def _dedupe(items: list) -> list:
+        """同名的定義只留最後一個 (規格書可能先給草稿、後給完整版)"""
+        return list({item.name: item for item in items}.values())
+
+    @staticmethod
+    def _is_complete(schema: FileSchema) -> bool:
+        """每個類別都要有方法、父類別要找得到、所有型別標註都要是合法的 Python 表達式"""
+        defined = {c.name for c in schema.classes}
+        imported = set()
+        for imp in schema.imports:
+            for node in ast.walk(ast.parse(imp)):
+                if isinstance(node, ast.alias):
+                    imported.add((node.asname or node.name).split(".")[0])
+
+        for cls in schema.classes:
+            if not cls.methods:
+                return False
+            parent = cls.parent_class
+            if parent and parent.split(".")[0] not in defined | imported and not hasattr(builtins, parent):
+                return False
+            # 父類別必須先定義
+            if parent in defined and [c.name for c in schema.classes].index(parent) > \
+                    [c.name for c in schema.classes].index(cls.name):
+                return False
+
+        functions = schema.functions + [m for c in schema.classes for m in c.methods]
+        for func in functions:
+            annotations = [a.split(":", 1)[1] for a in func.args if ":" in a] + [func.return_type]
+            for annotation in annotations:
+                try:
+                    ast.parse(annotation.strip(), mode="eval")
+                except SyntaxError:
+                    return False
+        return True
+
+    @staticmethod
+    def _test_schema(product: FileSchema) -> FileSchema:
+        """每個公開的方法 / 函式一個 assert True 的測試 (QA 之後會填上真正的斷言)"""
+        module = Path(product.filename).stem
+        exports = [c.name for c in product.classes] + [f.name for f in product.functions]
+        tests = []
+        for cls in product.classes:
+            prefix = re.sub(r"(?<!^)(?=[A-Z])", "_", cls.name).lower()
+            for method in cls.methods:
+                if method.name.startswith("_") and method.name != "__init__":
+                    continue
+                tests.append(FunctionSchema(
+                    name=f"test_{prefix}_{method.name.strip('_')}",
+                    args=[],
+                    docstring=f"測試 {cls.name}.{method.name}",
+                ))
+        for func in product.functions:
+            if not func.name.startswith("_"):
+                tests.append(FunctionSchema(name=f"test_{func.name}", args=[], docstring=f"測試 {func.name}"))
+
+        return FileSchema(
+            filename=f"test_{product.filename}",
+            imports=["import pytest", f"from {module} import {', '.join(exports)}"],
+            functions=tests,
+        )
@@ -0,0 +1,124 @@
+import ast
+import asyncio
+import re
+import dspy
+
+class StreamGuard:
+    """
+    邊串流邊檢查 LLM 正在輸出的程式碼區塊，盡早決定要不要繼續等
+    - 第一個 code block 結束：已經拿到完整程式碼，後面多半是第二個檔案或廢話，直接收工
+    - 已完成的頂層語句無法 parse：這次生成注定跑不起來，中止並重試
+    - 輸出失控 (超過字數上限、同一行無限重複)：中止並重試
+    """
+
+    _FENCE_RE = re.compile(r"^\s*```")
+
+    # 這些 SyntaxError 只代表「還沒寫完」，不是真的寫錯
+    _INCOMPLETE_ERRORS = ("never closed", "unterminated", "unexpected EOF", "expected an indented block")
+
+    def __init__(self, max_chars: int = 24000, max_repeated_lines: int = 16):
+        self.max_chars = max_chars
+        self.max_repeated_lines = max_repeated_lines
+        self.reset()
+
+    def reset(self) -> None:
+        """清空已收到的輸出 (同一個 guard 重新串流時使用，例如限流重試)"""
+        self.text = ""
+        # 停止的原因，以及是否為「正常提早收工」(第一個 code block 已完整，text 只保留到該處)
+        self.reason = ""
+        self.complete = False
+        self._checked_lines = 0
+        self._parsed_statements = 0
+
+    def feed(self, chunk: str) -> bool:
+        """加入新的一段輸出；回傳 True 代表應該停止生成 (原因見 self.reason)"""
+        self.text += chunk
+        lines = self.text.split("\n")
+        # 最後一行可能還沒寫完，只檢查已經換行的部分
+        finished = lines[:-1]
+        if len(finished) == self._checked_lines:
+            return self._runaway()
+        self._checked_lines = len(finished)
+
+        fences = [i for i, line in enumerate(finished) if self._FENCE_RE.match(line)]
+        if len(fences) >= 2:
+            self.text = "\n".join(lines[:fences[1] + 1])
+            self.complete = True
+            self.reason = "第一個 code block 已完整"
+            return True
+
+        code_lines = finished[fences[0] + 1:] if fences else finished
+        return self._syntax_error(code_lines) or self._runaway()
+
+    def _syntax_error(self, code_lines: list[str]) -> bool:
+        """只 parse 已經結束的頂層語句 (最後一個從第 0 欄開始的語句之前)"""
+        top_level = [i for i, line in enumerate(code_lines)
+                     if line and not line[0].isspace() and not line.startswith("#")]
+        # 有新的頂層語句結束才需要重新 parse
+        if len(top_level) < 2 or len(top_level) == self._parsed_statements:
+            return False
+        self._parsed_statements = len(top_level)
+        prefix = code_lines[:top_level[-1]]
+        try:
+            ast.parse("\n".join(prefix))
+        except SyntaxError as e:
+            if any(marker in (e.msg or "") for marker in self._INCOMPLETE_ERRORS):
+                return False
+            # 錯在最後一行，可能只是語句被切在一半 (例如 decorator 後面的 def 還沒進來)
+            if e.lineno is None or e.lineno >= len(prefix):
+                return False
+            self.reason = f"第 {e.lineno} 行語法錯誤: {e.msg}"
+            return True
+        return False
+
+    def _runaway(self) -> bool:
+        if len(self.text) > self.max_chars:
+            self.reason = f"輸出超過 {self.max_chars} 字"
+            return True
+
+        lines = [line for line in self.text.split("\n")[:-1] if line.strip()]
+        tail = lines[-self.max_repeated_lines:]
+        if len(tail) == self.max_repeated_lines and len(set(tail)) == 1:
+            self.reason = f"同一行重複超過 {self.max_repeated_lines} 次"
+            return True
+        return False
+
+class _AsyncAgent(dspy.Module):
+    """讓 dspy.streamify 直接 await agent.acall (不經過 asyncify 的 worker thread)，中止時 LLM 請求才會一起被取消"""
+
+    def __init__(self, agent: dspy.Module):
+        super().__init__()
+        self.agent = agent
+
+    async def __call__(self, **inputs):
+        return await self.agent.acall(**inputs)
+
+def stream_prediction(agent: dspy.Module, inputs: dict, guard: StreamGuard) -> dspy.Prediction | None:
+    """同步版的 astream_prediction (在沒有 event loop 的 thread 中呼叫)"""
+    return asyncio.run(astream_prediction(agent, inputs, guard))
+
+async def astream_prediction(agent: dspy.Module, inputs: dict, guard: StreamGuard) -> dspy.Prediction | None:
+    """
+    串流呼叫 agent，把 agent.stream_field 的輸出逐段交給 guard 檢查
+    Returns: 完整的 Prediction；guard 提早收工時只含 stream_field；guard 要求中止時回傳 None
+    """
+    program = dspy.streamify(
+        _AsyncAgent(agent),
+        stream_listeners=[dspy.streaming.StreamListener(signature_field_name=agent.stream_field)],
+        is_async_program=True
+    )
+
+    guard.reset()
+    stream = program(**inputs)
+    try:
+        async for chunk in stream:
+            if isinstance(chunk, dspy.Prediction):
+                return chunk
+            if isinstance(chunk, dspy.streaming.StreamResponse) and guard.feed(chunk.chunk):
+                break
+    finally:
+        # 關閉 generator 會取消還在進行中的 LLM 請求
+        await stream.aclose()
+    if guard.complete:
+        return dspy.Prediction(**{agent.stream_field: guard.text})
+    return None
@@ -0,0 +1,57 @@
+import pytest
+from src.tools.file_ops import FileOps, MemoryFileOps
+
+@pytest.fixture(params=[FileOps, MemoryFileOps])
+def file_ops(request, tmp_path):
+    ops = request.param(str(tmp_path))
+    yield ops
+    ops.close()
+
+def test_stage_then_reject_restores_accepted(file_ops):
+    file_ops.save("calc.py", "accepted = True")
+    file_ops.save("calc.coder.py", "accepted = False")
+    has_backup = file_ops.stage("calc.coder.py", "calc.py")
+    file_ops.settle("calc.py", has_backup, accepted=False)
+    assert file_ops.read("calc.py") == "accepted = True"
+    assert not file_ops.exists("calc.py.bak")
+
+def test_stage_twice_then_reject_keeps_accepted(file_ops):
+    # 換上之後、驗收之前中斷，接續執行時再換上一次
+    file_ops.save("calc.py", "accepted = True")
+    file_ops.save("calc.coder.py", "accepted = False")
+    file_ops.stage("calc.coder.py", "calc.py")
+    has_backup = file_ops.stage("calc.coder.py", "calc.py")
+    assert has_backup
+    assert file_ops.read("calc.py.bak") == "accepted = True"
+    file_ops.settle("calc.py", has_backup, accepted=False)
+    assert file_ops.read("calc.py") == "accepted = True"
+
+def test_stage_then_accept_drops_backup(file_ops):
+    file_ops.save("calc.py", "old = 1")
+    file_ops.save("calc.coder.py", "new = 1")
+    has_backup = file_ops.stage("calc.coder.py", "calc.py")
+    file_ops.settle("calc.py", has_backup, accepted=True)
+    assert file_ops.read("calc.py") == "new = 1"
+    assert not file_ops.exists("calc.py.bak")
+
+def test_stage_new_file_then_reject_removes_it(file_ops):
+    file_ops.save("calc.scaffolder.py", "x = 1")
+    has_backup = file_ops.stage("calc.scaffolder.py", "calc.py")
+    assert not has_backup
+    file_ops.settle("calc.py", has_backup, accepted=False)
+    assert not file_ops.exists("calc.py")
+
+def test_memory_sync_includes_unread_playground_modules(tmp_path):
+    # 接續執行時，playground 裡的測試檔還沒被讀進記憶體
+    (tmp_path / "test_calc.py").write_text("from calc import x", encoding="utf-8")
+    (tmp_path / "conftest.py").write_text("", encoding="utf-8")
+    (tmp_path / "calc.py.bak").write_text("x = 0", encoding="utf-8")
+    (tmp_path / "stale.py").write_text("", encoding="utf-8")
+    file_ops = MemoryFileOps(str(tmp_path))
+    try:
+        file_ops.save("calc.py", "x = 1")
+        file_ops.unlink("stale.py")
+        workdir = file_ops.sync()
+        assert sorted(path.name for path in workdir.iterdir()) == ["calc.py", "conftest.py", "test_calc.py"]
+    finally:
+        file_ops.close()
@@ -0,0 +1,26 @@
+import threading
+from types import SimpleNamespace
+from src.utils.metrics import MetricsCollector
+
+LLM_CALL = [{"usage": {"prompt_tokens": 10, "completion_tokens": 5}}]
+
+def test_isolated_usage_is_merged_into_node():
+    metrics = MetricsCollector()
+    with metrics.node("coder") as record:
+        record.peak(test_peak_rss_mb=100.0)
+        with metrics.isolated():
+            metrics.record_llm_call(LLM_CALL, 1.0)
+            metrics.record_test_usage(SimpleNamespace(cpu_seconds=0.5, peak_rss_bytes=50 * 2**20))
+        assert (record.llm_calls, record.prompt_tokens, record.completion_tokens) == (1, 10, 5)
+        assert record.test_cpu_seconds == 0.5
+        assert record.test_peak_rss_mb == 100.0
+
+def test_isolated_usage_is_dropped_after_discard():
+    metrics = MetricsCollector()
+    stop = threading.Event()
+    with metrics.node("coder") as record:
+        with metrics.isolated(discard=stop):
+            metrics.record_llm_call(LLM_CALL, 1.0)
+            stop.set()
+        assert record.llm_calls == 0
+        assert record.prompt_tokens == 0
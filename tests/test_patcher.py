@@ -0,0 +1,86 @@
+import pytest
+from src.utils.patcher import PatchError, apply_patch
+
+ORIGINAL = """class Cart:
+    def __init__(self):
+        self.items = []
+
+    def total(self):
+        # sum prices
+        return sum(i.price for i in self.items)
+
+    def count(self):
+        return len(self.items)
+"""
+
+def block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE\n"
+
+def test_exact_match():
+    patch = block("        return len(self.items)", "        return sum(i.qty for i in self.items)")
+    result = apply_patch(ORIGINAL, patch)
+    assert "return sum(i.qty for i in self.items)" in result
+    assert "return len(self.items)" not in result
+
+def test_trailing_whitespace_is_ignored():
+    patch = block("    def count(self):   \n        return len(self.items)  ", "    def count(self):\n        return 0")
+    assert apply_patch(ORIGINAL, patch).endswith("    def count(self):\n        return 0\n")
+
+def test_missing_indentation_is_restored():
+    patch = block("def count(self):\n    return len(self.items)", "def count(self):\n    return 0")
+    assert apply_patch(ORIGINAL, patch).endswith("    def count(self):\n        return 0\n")
+
+def test_fuzzy_match_tolerates_small_differences():
+    search = "    def total(self):\n        # sum the prices\n        return sum(i.price for i in self.items)"
+    result = apply_patch(ORIGINAL, block(search, "    def total(self):\n        return 0"))
+    assert "# sum prices" not in result
+    assert "    def total(self):\n        return 0\n" in result
+
+def test_unrelated_search_is_rejected():
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, block("nothing like this\nat all", "x = 1"))
+
+def test_ambiguous_match_is_rejected():
+    code = "a = 1\nb = 2\na = 1\n"
+    with pytest.raises(PatchError):
+        apply_patch(code, block("a = 1", "a = 3"))
+
+def test_multiple_blocks_are_applied_in_order():
+    patch = block("        self.items = []", "        self.items = []\n        self.vip = False") + \
+            block("        return len(self.items)", "        return 0")
+    result = apply_patch(ORIGINAL, patch)
+    assert "self.vip = False" in result
+    assert "return 0" in result
+
+def test_unified_diff_hunks():
+    patch = """--- a/cart.py
++++ b/cart.py
+@@ -2,3 +2,4 @@
+     def __init__(self):
+         self.items = []
++        self.vip = False
+
+@@ -9,2 +10,2 @@ class Cart:
+     def count(self):
+-        return len(self.items)
++        return len(self.items) + 0
+"""
+    result = apply_patch(ORIGINAL, patch)
+    assert "        self.items = []\n        self.vip = False\n" in result
+    assert result.endswith("        return len(self.items) + 0\n")
+
+def test_unified_diff_line_hint_resolves_duplicates():
+    code = "a = 1\nb = 2\na = 1\n"
+    patch = "@@ -3,1 +3,1 @@\n-a = 1\n+a = 3\n"
+    assert apply_patch(code, patch) == "a = 1\nb = 2\na = 3\n"
+
+def test_crlf_input():
+    code = ORIGINAL.replace("\n", "\r\n")
+    patch = block("        return len(self.items)", "        return 0").replace("\n", "\r\n")
+    result = apply_patch(code, patch)
+    assert result.endswith("        return 0\r\n")
+    assert "\r\n" in result and "\n" not in result.replace("\r\n", "")
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, "just rewrite the whole thing")